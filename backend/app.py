@@ -1,12 +1,15 @@
 from flask import Flask
 from flask_cors import CORS
-from routes import tasks_bp, user_bp, meals_bp, plans_bp   # ← added missing imports
+import config
+import metrics
+import profiling
+from routes import db, tasks_bp, user_bp, meals_bp, plans_bp   # ← added missing imports
 
 def create_app():
     app = Flask(__name__)
     
     # Enable CORS for React[](http://localhost:3000) → Flask (5000)
-    CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
+    CORS(app, resources={r"/api/*": {"origins": config.CORS_ORIGIN}})
 
     # Register ALL blueprints from routes.py v1.1.0
     app.register_blueprint(tasks_bp)
@@ -14,6 +17,17 @@ def create_app():
     app.register_blueprint(meals_bp)
     app.register_blueprint(plans_bp)
 
+    # Request / DB latency histograms at /metrics (AMBLE_METRICS_ENABLED=0 to disable)
+    metrics.init_app(app)
+
+    # Per-request cProfile captures at /api/admin/profiles (off unless
+    # AMBLE_PROFILE_ADMIN_TOKEN or AMBLE_PROFILE_SAMPLE_RATE is set)
+    profiling.init_app(app)
+
+    # Resolve the ODBC driver and open pooled connections off the request path
+    if config.DB_WARMUP_ON_START:
+        db.warm_up(background=True)
+
     @app.route('/')
     def index():
         return "Amble API is Running. Use /api/health, /api/diet-plans, /api/meals/suggest, etc."
@@ -33,9 +47,9 @@ def create_app():
 if __name__ == "__main__":
     print("------------------------------------------")
     print("Amble Backend (Flask) Starting...")
-    print("Target Database: Amble on DESKTOP-G76966Q")
+    print(f"Target Database: {config.DB_DATABASE} on {config.DB_SERVER}")
     print("Policy: Procedure-Only (No Raw SQL)")
-    print("CORS enabled for http://localhost:3000")
+    print(f"CORS enabled for {config.CORS_ORIGIN}")
     print("Visit /debug/routes to verify endpoints")
     print("------------------------------------------")
     
@@ -0,0 +1,293 @@
+"""
+File: asgi.py
+Version: 1.4.0
+
+CHANGES FROM 1.3.0:
+- REMOVED: async_route(), AsyncRequest and DbExecutor.gather(). Nothing
+  used them once bootstrap went back to the Flask view
+
+CHANGES FROM 1.2.0:
+- A bridged response is always closed, including when the call building it
+  or pulling a chunk times out: the close waits for the still-running call
+  and then releases what the response holds (a streamed export's pooled
+  connection and admission slot)
+
+CHANGES FROM 1.1.0:
+- REMOVED: native async /api/bootstrap/<user_id>. It duplicated the Flask
+  view without its ETag / 304 handling, no-store on partial payloads,
+  admission gate, metrics or profiling; the bridged Flask view already
+  runs its three reads concurrently
+
+CHANGES FROM 1.0.0:
+- ADDED: native async /api/bootstrap/<user_id> - the three section reads are
+  gathered on the DbExecutor instead of tying up a bridged request thread
+
+Description:
+- ASGI entry point for the Amble backend: `uvicorn asgi:app`
+- Request bodies and responses are read/written on the event loop, so slow
+  clients cost a coroutine rather than an OS thread
+- The Flask app (and every blocking DatabaseManager call inside it) runs on
+  a bounded DbExecutor with per-call timeouts and a queue-depth limit; over
+  the limit a request gets an immediate 503 instead of queuing
+"""
+import asyncio
+import io
+import json
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from app import create_app
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(Exception):
+    """Raised when more than max_pending calls are queued or running."""
+
+
+class DbExecutor:
+    """
+    Bounded thread pool for blocking work (pyodbc, the WSGI app).
+
+    - max_workers threads, sized to the DB connection pool by default
+    - at most max_pending calls queued or running; beyond that run() raises
+      ExecutorSaturated immediately
+    - run() gives up waiting after `timeout` seconds. The worker thread is
+      not interrupted (pyodbc calls cannot be cancelled); it finishes in the
+      background and its slot is released then
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None):
+        self.max_workers = max_workers or config.ASYNC_DB_WORKERS
+        self.max_pending = max_pending or config.ASYNC_MAX_PENDING
+        self.timeout = config.ASYNC_CALL_TIMEOUT if timeout is None else timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="amble-db")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, timeout=None):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturated(f"{self._pending} calls pending (limit {self.max_pending})")
+            self._pending += 1
+
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def run_detached(self, fn, *args):
+        """Fire-and-forget cleanup work; ignores the pending limit."""
+        return self._pool.submit(fn, *args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+executor = DbExecutor()
+
+
+def _build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": str(client[0]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    headers.extend(extra_headers)
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class AmbleASGI:
+    """ASGI application serving the Flask app through the WSGI bridge."""
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            await _send_json(send, 413, {"error": "Request body too large"})
+            return
+
+        try:
+            await self._call_wsgi(scope, body, send)
+        except ExecutorSaturated:
+            await _send_json(
+                send, 503, {"error": "Server busy, retry shortly"},
+                [(b"retry-after", str(config.ASYNC_RETRY_AFTER).encode())]
+            )
+        except asyncio.TimeoutError:
+            await _send_json(send, 504, {"error": "Request timed out"})
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > config.ASYNC_MAX_BODY_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    async def _call_wsgi(self, scope, body, send):
+        environ = _build_environ(scope, body)
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+            return written.append
+
+        # The WSGI result is only touched under `lock`, so closing it waits
+        # for a call that timed out on the loop but is still running
+        lock = threading.Lock()
+        handoff = {"result": None, "abandoned": False}
+
+        def invoke():
+            with lock:
+                if handoff["abandoned"]:
+                    return None, None   # the request gave up before this ran
+                result = handoff["result"] = self.wsgi_app(environ, start_response)
+                iterator = iter(result)
+                # Pull the first chunk here so lazily-started responses have headers
+                return iterator, next(iterator, None)
+
+        def pull(iterator):
+            with lock:
+                return next(iterator, None)
+
+        def finish():
+            with lock:
+                handoff["abandoned"] = True
+                close = getattr(handoff["result"], "close", None)
+                if close is None:
+                    return
+                try:
+                    close()
+                except Exception as e:
+                    logger.error(f"[ASGI] Closing the response for {scope['path']} failed: {e!r}")
+
+        try:
+            iterator, chunk = await self.executor.run(invoke)
+            await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+            if written:
+                await send({"type": "http.response.body", "body": b"".join(written), "more_body": True})
+            # Streaming responses are pulled one chunk per executor call, so a
+            # slow client never holds a worker thread between chunks
+            try:
+                while chunk is not None:
+                    if chunk:
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    chunk = await self.executor.run(pull, iterator)
+            except (ExecutorSaturated, asyncio.TimeoutError) as e:
+                # Headers are already out; all we can do is end the body early
+                logger.error(f"[ASGI] Response aborted mid-stream for {scope['path']}: {e!r}")
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            # Also runs when the first call timed out (504) or was rejected
+            # (503): the response may still be built and must be closed
+            self.executor.run_detached(finish)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app():
+    return AmbleASGI(create_app(), executor)
+
+
+app = create_asgi_app()
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("uvicorn is required for async serving: pip install uvicorn")
+
+    print("------------------------------------------")
+    print("Amble Backend (ASGI) Starting...")
+    print(f"DB executor: {executor.max_workers} threads, {executor.max_pending} pending max")
+    print("------------------------------------------")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
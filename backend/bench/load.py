@@ -0,0 +1,264 @@
+"""
+File: bench/load.py
+Version: 1.2.0
+
+CHANGES FROM 1.1.0:
+- ADDED: "status" operation (POST /api/meal-plans/<id>/status on seeded
+  plans); not in the default mix
+
+CHANGES FROM 1.0.0:
+- ADDED: --replicas N - run against N more stand-ins seeded like the primary
+  as read replicas (writes are not copied to them, so the run also shows
+  read-your-writes pinning)
+
+Description:
+- Reproducible load benchmark: runs the real create_app() against the
+  SQLite stand-in (bench/standin_db.py), drives a weighted mix of
+  suggest / accept / daily-totals traffic at each concurrency level, and
+  writes p50/p95/p99 latency and throughput to a JSON baseline
+- --compare flags regressions against an earlier baseline (exit code 1)
+
+Usage (from backend/):
+    python -m bench.load --meals 5000 --concurrency 1,8,32 --duration 10 --out bench_baseline.json
+    python -m bench.load --concurrency 1,8,32 --duration 10 --compare bench_baseline.json
+    python -m bench.load --replicas 2 --statement-latency-ms 1 --out bench_replicas.json
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import config
+from bench.standin_db import DIETS, StandInDatabase
+from daily_totals import MEAL_PLAN_STATUSES
+
+OPERATIONS = ("suggest", "accept", "totals", "status")
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def _summarize(samples, elapsed):
+    latencies = sorted(s[1] for s in samples)
+    errors = sum(1 for s in samples if s[2] >= 500)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3) if latencies else None,
+    }
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}' (expected {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Workload:
+    """Issues one request of a given operation through a Flask test client."""
+
+    def __init__(self, client, rng, users, meals, plans=0):
+        self.client = client
+        self.rng = rng
+        self.users = users
+        self.meals = meals
+        self.plans = plans
+        self.today = date.today()
+
+    def suggest(self):
+        return self.client.get(f"/api/meals/suggest?diet={self.rng.choice(DIETS)}").status_code
+
+    def accept(self):
+        planned = self.today + timedelta(days=self.rng.randint(0, 6))
+        return self.client.post("/api/meal-plans/add", json={
+            "userId": self.rng.randint(1, self.users),
+            "mealId": self.rng.randint(1, self.meals),
+            "plannedDate": planned.isoformat(),
+            "mealTime": self.rng.choice(("Breakfast", "Lunch", "Dinner"))
+        }).status_code
+
+    def totals(self):
+        return self.client.get(f"/api/user/daily-totals/{self.rng.randint(1, self.users)}").status_code
+
+    def status(self):
+        # Seeded PlanIDs run from 1 to users * history_days * 3
+        plan_id = self.rng.randint(1, max(1, self.plans))
+        return self.client.post(f"/api/meal-plans/{plan_id}/status", json={
+            "status": self.rng.choice(MEAL_PLAN_STATUSES)
+        }).status_code
+
+
+def run_level(app, concurrency, duration, mix, users, meals, seed, plans=0):
+    """Run `concurrency` client threads for `duration` seconds; return samples."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples = []
+    samples_lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        workload = Workload(app.test_client(), rng, users, meals, plans)
+        local = []
+        while time.perf_counter() < stop_at:
+            op = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = getattr(workload, op)()
+            except Exception:
+                status = 599
+            local.append((op, time.perf_counter() - start, status))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - started
+
+
+def compare(baseline, current, threshold):
+    """Return a list of regression descriptions (empty when none)."""
+    regressions = []
+    base_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in current["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        for op, stats in [("overall", level["overall"])] + sorted(level["ops"].items()):
+            base_stats = base["overall"] if op == "overall" else base["ops"].get(op)
+            if not base_stats or not base_stats.get("p95_ms") or not stats.get("p95_ms"):
+                continue
+            where = f"c={level['concurrency']} {op}"
+            if stats["p95_ms"] > base_stats["p95_ms"] * (1 + threshold):
+                regressions.append(f"{where}: p95 {base_stats['p95_ms']}ms -> {stats['p95_ms']}ms")
+            if stats["throughput_rps"] < base_stats["throughput_rps"] * (1 - threshold):
+                regressions.append(
+                    f"{where}: throughput {base_stats['throughput_rps']} -> {stats['throughput_rps']} rps"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Amble backend load benchmark (SQLite stand-in)")
+    parser.add_argument("--meals", type=int, default=500, help="catalog size")
+    parser.add_argument("--ingredients-per-meal", type=int, default=6)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated levels")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per level")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of unmeasured traffic first")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("suggest=6,accept=1,totals=3"))
+    parser.add_argument("--connect-latency-ms", type=float, default=0.0, help="simulated connect cost")
+    parser.add_argument("--statement-latency-ms", type=float, default=0.0, help="simulated round trip per statement")
+    parser.add_argument("--replicas", type=int, default=0, help="stand-in read replicas")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression fraction")
+    args = parser.parse_args(argv)
+
+    config.DB_WARMUP_ON_START = False
+
+    from app import create_app
+    from routes import db
+
+    # database_manager configures INFO logging at import; per-request lines would dominate the run
+    logging.getLogger().setLevel(logging.WARNING)
+
+    standins = [
+        StandInDatabase(
+            connect_latency=args.connect_latency_ms / 1000.0,
+            statement_latency=args.statement_latency_ms / 1000.0
+        )
+        for _ in range(1 + max(0, args.replicas))
+    ]
+    standin, replicas = standins[0], standins[1:]
+    try:
+        for target in standins:
+            target.seed(
+                meals=args.meals, ingredients_per_meal=args.ingredients_per_meal,
+                users=args.users, history_days=args.history_days, seed=args.seed
+            )
+        db.use_connector(standin.connect)
+        db.use_replica_connectors([replica.connect for replica in replicas])
+        plans = args.users * args.history_days * 3
+        app = create_app()
+
+        if args.warmup:
+            run_level(app, 2, args.warmup, args.mix, args.users, args.meals, args.seed, plans)
+
+        levels = []
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            samples, elapsed = run_level(app, concurrency, args.duration, args.mix,
+                                         args.users, args.meals, args.seed, plans)
+            level = {
+                "concurrency": concurrency,
+                "elapsed_s": round(elapsed, 3),
+                "overall": _summarize(samples, elapsed),
+                "ops": {op: _summarize([s for s in samples if s[0] == op], elapsed) for op in args.mix}
+            }
+            levels.append(level)
+            overall = level["overall"]
+            print(
+                f"c={concurrency:<4} {overall['throughput_rps']:>9} rps  "
+                f"p50={overall['p50_ms']}ms p95={overall['p95_ms']}ms p99={overall['p99_ms']}ms  "
+                f"errors={overall['errors']}"
+            )
+
+        result = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+                "db_connects": standin.connects,
+                "pool": db.pool.stats() if db.pool else None,
+                "replication": db.replication_stats() if replicas else None,
+            },
+            "levels": levels
+        }
+
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+            print(f"Results written to {args.out}")
+
+        if args.compare:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare(baseline, result, args.threshold)
+            if regressions:
+                print(f"REGRESSIONS (threshold {args.threshold:.0%}):")
+                for line in regressions:
+                    print(f"  - {line}")
+                return 1
+            print(f"No regressions beyond {args.threshold:.0%}")
+        return 0
+    finally:
+        for target in standins:
+            target.remove()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
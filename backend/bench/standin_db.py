@@ -0,0 +1,466 @@
+"""
+File: bench/standin_db.py
+Version: 1.2.0
+
+CHANGES FROM 1.1.0:
+- Emulates the UPDATE ... OUTPUT deleted.*, inserted.* FROM ... JOIN batch of
+  DatabaseManager.update_meal_plan_status(), which SQLite cannot run
+
+CHANGES FROM 1.0.0:
+- Answers the sys.procedures catalog probe used by ProcedureRegistry
+
+Description:
+- SQLite-backed stand-in for the Amble SQL Server database
+- Exposes a pyodbc-shaped connect(); plug it in with
+  DatabaseManager.use_connector(standin.connect)
+- Implements the stored procedures DatabaseManager calls
+  (usp_GetRandomMealByDiet, usp_GetDietPlans, usp_GetUserDailyTotals,
+  usp_UpdateUserPreferences, sp_UpsertTask, sp_GetWeeklyPlan) in Python and
+  translates the T-SQL used by inline queries (dbo., ISNULL, CAST AS DATE,
+  SET NOCOUNT ON, multi-statement batches) to SQLite
+- Statements SQLite has no equivalent for (UPDATE ... OUTPUT) are matched
+  by pattern and emulated (STATEMENTS)
+- Optional per-connect / per-statement sleeps model network round trips
+"""
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import pyodbc
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS DietPlans (
+    DietPlanID   INTEGER PRIMARY KEY,
+    DietName     TEXT NOT NULL COLLATE NOCASE,
+    Description  TEXT
+);
+CREATE TABLE IF NOT EXISTS Meals (
+    MealID        INTEGER PRIMARY KEY,
+    MealName      TEXT NOT NULL,
+    ImageURL      TEXT,
+    ProteinGrams  REAL,
+    FatGrams      REAL,
+    CarbGrams     REAL,
+    Calories      INTEGER,
+    DietCategory  TEXT COLLATE NOCASE
+);
+CREATE TABLE IF NOT EXISTS Ingredients (
+    IngredientID    INTEGER PRIMARY KEY,
+    IngredientName  TEXT NOT NULL,
+    SmartGroup      TEXT
+);
+CREATE TABLE IF NOT EXISTS MealIngredients (
+    MealID        INTEGER NOT NULL REFERENCES Meals(MealID),
+    IngredientID  INTEGER NOT NULL REFERENCES Ingredients(IngredientID),
+    Quantity      TEXT
+);
+CREATE TABLE IF NOT EXISTS MealPlans (
+    PlanID       INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID       INTEGER NOT NULL,
+    MealID       INTEGER NOT NULL REFERENCES Meals(MealID),
+    PlannedDate  TEXT NOT NULL,
+    MealTime     TEXT,
+    Status       TEXT NOT NULL CHECK (Status IN ('Pending', 'Accepted', 'Skipped', 'Completed'))
+);
+CREATE TABLE IF NOT EXISTS UserPreferences (
+    UserID          INTEGER PRIMARY KEY,
+    ActiveDietName  TEXT,
+    CaloriesGoal    INTEGER,
+    Allergies       TEXT,
+    IsActive        INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS Tasks (
+    TaskID       TEXT PRIMARY KEY,
+    FilePath     TEXT,
+    FileName     TEXT,
+    Description  TEXT,
+    Status       TEXT,
+    UpdatedAt    TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_Meals_Diet ON Meals (DietCategory);
+CREATE INDEX IF NOT EXISTS IX_MealIngredients_Meal ON MealIngredients (MealID);
+CREATE INDEX IF NOT EXISTS IX_MealPlans_User_Date ON MealPlans (UserID, PlannedDate);
+"""
+
+DIETS = ["Keto", "Vegan", "Paleo", "Mediterranean", "Vegetarian", "Balanced"]
+SMART_GROUPS = ["Produce", "Meat", "Seafood", "Dairy", "Pantry", "Bakery", "Frozen", "Spices"]
+QUANTITIES = ["1 cup", "2 tbsp", "200g", "1/2 cup", "2 cloves", "1 lb", "3", "1 tsp", "250 ml", "to taste"]
+
+_CALL_RE = re.compile(r"^\s*\{\s*CALL\s+(?:\[?dbo\]?\.)?\[?(\w+)\]?\s*(?:\((.*)\))?\s*\}\s*$", re.IGNORECASE | re.DOTALL)
+
+
+def _translate(sql):
+    """Rewrite the T-SQL constructs DatabaseManager uses into SQLite."""
+    sql = re.sub(r"\bSET\s+NOCOUNT\s+ON\s*;?", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\[?dbo\]?\.", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\[(\w+)\]", r"\1", sql)
+    sql = re.sub(r"CAST\(\s*([^()]+?)\s+AS\s+DATE\s*\)", r"date(\1)", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bISNULL\(", "IFNULL(", sql, flags=re.IGNORECASE)
+    return sql
+
+
+def _split_statements(sql, params):
+    """Split a batch on ';' and hand each statement its share of the '?' params."""
+    statements = []
+    offset = 0
+    for statement in sql.split(";"):
+        if not statement.strip():
+            continue
+        count = statement.count("?")
+        statements.append((statement, tuple(params[offset:offset + count])))
+        offset += count
+    return statements
+
+
+def _convert_error(error):
+    if isinstance(error, sqlite3.IntegrityError):
+        return pyodbc.IntegrityError(str(error))
+    if isinstance(error, sqlite3.OperationalError):
+        return pyodbc.ProgrammingError(str(error))
+    return pyodbc.Error(str(error))
+
+
+class StandInCursor:
+    """pyodbc-shaped cursor: execute() may yield several result sets."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._sqlite = connection._sqlite
+        self._result_sets = []
+        self._rows = []
+        self.description = None
+        self.rowcount = -1
+        self.fast_executemany = False
+
+    def _sleep(self):
+        if self._connection.database.statement_latency:
+            time.sleep(self._connection.database.statement_latency)
+
+    def _load_sets(self, result_sets):
+        self._result_sets = list(result_sets)
+        self._next_set()
+
+    def _next_set(self):
+        if self._result_sets:
+            self.description, rows = self._result_sets.pop(0)
+            self._rows = list(rows)
+            return True
+        self.description, self._rows = None, []
+        return False
+
+    def _run(self, sql, params):
+        cursor = self._sqlite.cursor()
+        cursor.execute(sql, params)
+        self.rowcount = cursor.rowcount
+        if cursor.description is not None:
+            return (cursor.description, cursor.fetchall())
+        return None
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (tuple, list)):
+            params = tuple(params[0])
+        self._sleep()
+        try:
+            if "sys.procedures" in sql:
+                description = (("schema", None), ("name", None))
+                self._load_sets([(description, [("dbo", name) for name in PROCEDURES])])
+                return self
+
+            for pattern, handler in STATEMENTS:
+                if pattern.search(sql):
+                    self._load_sets(handler(self, *params))
+                    return self
+
+            match = _CALL_RE.match(sql)
+            if match:
+                procedure = PROCEDURES.get(match.group(1).lower())
+                if procedure is None:
+                    raise pyodbc.ProgrammingError(f"Could not find stored procedure '{match.group(1)}'")
+                self._load_sets(procedure(self, *params))
+                return self
+
+            result_sets = []
+            for statement, statement_params in _split_statements(_translate(sql), params):
+                result = self._run(statement, statement_params)
+                if result is not None:
+                    result_sets.append(result)
+            self._load_sets(result_sets)
+            return self
+        except sqlite3.Error as e:
+            raise _convert_error(e) from e
+
+    def executemany(self, sql, rows):
+        self._sleep()
+        try:
+            self._sqlite.executemany(_translate(sql).rstrip().rstrip(";"), [tuple(r) for r in rows])
+        except sqlite3.Error as e:
+            raise _convert_error(e) from e
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def nextset(self):
+        return self._next_set()
+
+    def close(self):
+        self._rows = []
+        self._result_sets = []
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+
+class StandInConnection:
+    def __init__(self, database):
+        self.database = database
+        self._sqlite = sqlite3.connect(database.path, timeout=30, check_same_thread=False)
+        self._sqlite.execute("PRAGMA busy_timeout = 30000")
+        self.closed = False
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        self._sqlite.commit()
+
+    def rollback(self):
+        self._sqlite.rollback()
+
+    def close(self):
+        if not self.closed:
+            self._sqlite.close()
+            self.closed = True
+
+
+class StandInDatabase:
+    """
+    One SQLite file standing in for the Amble database.
+
+        standin = StandInDatabase()
+        standin.seed(meals=5000)
+        db.use_connector(standin.connect)
+    """
+
+    def __init__(self, path=None, connect_latency=0.0, statement_latency=0.0):
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="amble_standin_", suffix=".db")
+            os.close(fd)
+            self._owns_file = True
+        else:
+            self._owns_file = False
+        self.path = path
+        self.connect_latency = connect_latency
+        self.statement_latency = statement_latency
+        self.connects = 0
+        self._lock = threading.Lock()
+
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+
+    def connect(self, conn_str=None, timeout=None, **kwargs):
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        with self._lock:
+            self.connects += 1
+        return StandInConnection(self)
+
+    def seed(self, meals=500, ingredients=300, ingredients_per_meal=6, users=50, history_days=30, seed=42):
+        """Fill the catalog and some meal-plan history deterministically."""
+        rng = random.Random(seed)
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT INTO DietPlans (DietPlanID, DietName, Description) VALUES (?, ?, ?)",
+                [(i + 1, diet, f"{diet} plan") for i, diet in enumerate(DIETS)]
+            )
+            conn.executemany(
+                "INSERT INTO Ingredients (IngredientID, IngredientName, SmartGroup) VALUES (?, ?, ?)",
+                [(i, f"Ingredient {i}", rng.choice(SMART_GROUPS)) for i in range(1, ingredients + 1)]
+            )
+            meal_rows = []
+            link_rows = []
+            for meal_id in range(1, meals + 1):
+                protein, fat, carbs = rng.randint(5, 60), rng.randint(2, 50), rng.randint(0, 90)
+                meal_rows.append((
+                    meal_id, f"Meal {meal_id}", f"https://img.example/{meal_id}.jpg",
+                    protein, fat, carbs, protein * 4 + fat * 9 + carbs * 4, rng.choice(DIETS)
+                ))
+                for ingredient_id in rng.sample(range(1, ingredients + 1), min(ingredients_per_meal, ingredients)):
+                    link_rows.append((meal_id, ingredient_id, rng.choice(QUANTITIES)))
+            conn.executemany(
+                "INSERT INTO Meals (MealID, MealName, ImageURL, ProteinGrams, FatGrams, CarbGrams, Calories, DietCategory) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", meal_rows
+            )
+            conn.executemany("INSERT INTO MealIngredients (MealID, IngredientID, Quantity) VALUES (?, ?, ?)", link_rows)
+            conn.executemany(
+                "INSERT INTO UserPreferences (UserID, ActiveDietName, CaloriesGoal, Allergies, IsActive) VALUES (?, ?, ?, ?, 1)",
+                [(user_id, rng.choice(DIETS), 2500, "") for user_id in range(1, users + 1)]
+            )
+            today = date.today()
+            plan_rows = []
+            for user_id in range(1, users + 1):
+                for day in range(history_days):
+                    for meal_time in ("Breakfast", "Lunch", "Dinner"):
+                        plan_rows.append((
+                            user_id, rng.randint(1, meals), (today - timedelta(days=day)).isoformat(),
+                            meal_time, rng.choice(("Pending", "Accepted"))
+                        ))
+            conn.executemany(
+                "INSERT INTO MealPlans (UserID, MealID, PlannedDate, MealTime, Status) VALUES (?, ?, ?, ?, ?)",
+                plan_rows
+            )
+
+    def remove(self):
+        if self._owns_file:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Stored Procedures
+# ────────────────────────────────────────────────────────────────────────────
+
+def _query(cursor, sql, params=()):
+    return cursor._run(sql, params)
+
+
+def usp_get_random_meal_by_diet(cursor, diet_category):
+    meal = _query(cursor, """
+        SELECT MealID, MealName, ImageURL, ProteinGrams, FatGrams, CarbGrams, Calories
+        FROM Meals
+        WHERE DietCategory = ?
+        ORDER BY RANDOM()
+        LIMIT 1
+    """, (diet_category,))
+    if not meal[1]:
+        return [meal]
+    ingredients = _query(cursor, """
+        SELECT i.IngredientName, mi.Quantity, i.SmartGroup
+        FROM MealIngredients mi
+        INNER JOIN Ingredients i ON mi.IngredientID = i.IngredientID
+        WHERE mi.MealID = ?
+    """, (meal[1][0][0],))
+    return [meal, ingredients]
+
+
+def usp_get_diet_plans(cursor):
+    return [_query(cursor, "SELECT DietPlanID, DietName, Description FROM DietPlans ORDER BY DietName")]
+
+
+def usp_get_user_daily_totals(cursor, user_id, target_date=None):
+    target_date = target_date or date.today().isoformat()
+    return [_query(cursor, """
+        SELECT
+            IFNULL(SUM(m.Calories), 0), IFNULL(SUM(m.ProteinGrams), 0),
+            IFNULL(SUM(m.FatGrams), 0), IFNULL(SUM(m.CarbGrams), 0),
+            COUNT(mp.PlanID)
+        FROM MealPlans mp
+        INNER JOIN Meals m ON mp.MealID = m.MealID
+        WHERE mp.UserID = ?
+          AND mp.PlannedDate = date(?)
+          AND mp.Status IN ('Pending', 'Accepted')
+    """, (user_id, target_date))]
+
+
+def usp_update_user_preferences(cursor, user_id, diet_type, calories_goal, allergies):
+    _query(cursor, """
+        INSERT INTO UserPreferences (UserID, ActiveDietName, CaloriesGoal, Allergies, IsActive)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (UserID) DO UPDATE SET
+            ActiveDietName = excluded.ActiveDietName,
+            CaloriesGoal = excluded.CaloriesGoal,
+            Allergies = excluded.Allergies,
+            IsActive = 1
+    """, (user_id, diet_type, calories_goal, allergies))
+    return []
+
+
+def sp_upsert_task(cursor, task_id, file_path, file_name, description, status):
+    _query(cursor, """
+        INSERT INTO Tasks (TaskID, FilePath, FileName, Description, Status, UpdatedAt)
+        VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT (TaskID) DO UPDATE SET
+            FilePath = excluded.FilePath,
+            FileName = excluded.FileName,
+            Description = excluded.Description,
+            Status = excluded.Status,
+            UpdatedAt = excluded.UpdatedAt
+    """, (task_id, file_path, file_name, description, status))
+    return []
+
+
+def sp_get_weekly_plan(cursor, user_id, start_date):
+    end_date = (date.fromisoformat(str(start_date)[:10]) + timedelta(days=6)).isoformat()
+    plans = _query(cursor, """
+        SELECT mp.PlanID, mp.PlannedDate, mp.MealTime, mp.Status,
+               m.MealID, m.MealName, m.ImageURL, m.Calories, m.ProteinGrams, m.FatGrams, m.CarbGrams
+        FROM MealPlans mp
+        INNER JOIN Meals m ON mp.MealID = m.MealID
+        WHERE mp.UserID = ? AND mp.PlannedDate BETWEEN date(?) AND date(?)
+        ORDER BY mp.PlannedDate, mp.PlanID
+    """, (user_id, start_date, end_date))
+    ingredients = _query(cursor, """
+        SELECT mi.MealID, i.IngredientName, mi.Quantity, i.SmartGroup
+        FROM MealIngredients mi
+        INNER JOIN Ingredients i ON mi.IngredientID = i.IngredientID
+        WHERE mi.MealID IN (
+            SELECT DISTINCT MealID FROM MealPlans
+            WHERE UserID = ? AND PlannedDate BETWEEN date(?) AND date(?)
+        )
+        ORDER BY mi.MealID
+    """, (user_id, start_date, end_date))
+    return [plans, ingredients]
+
+
+PROCEDURES = {
+    "usp_getrandommealbydiet": usp_get_random_meal_by_diet,
+    "usp_getdietplans": usp_get_diet_plans,
+    "usp_getuserdailytotals": usp_get_user_daily_totals,
+    "usp_updateuserpreferences": usp_update_user_preferences,
+    "sp_upserttask": sp_upsert_task,
+    "sp_getweeklyplan": sp_get_weekly_plan,
+}
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Emulated Statements
+# ────────────────────────────────────────────────────────────────────────────
+
+def update_meal_plan_status(cursor, status, plan_id):
+    """UPDATE mp SET mp.Status = ? OUTPUT deleted.Status, inserted.* ... FROM MealPlans mp JOIN Meals m"""
+    before = _query(cursor, """
+        SELECT mp.Status, mp.UserID, mp.PlannedDate, m.Calories, m.ProteinGrams, m.FatGrams, m.CarbGrams
+        FROM MealPlans mp
+        INNER JOIN Meals m ON mp.MealID = m.MealID
+        WHERE mp.PlanID = ?
+    """, (plan_id,))
+    description = (("Status", None), ("Status", None), ("UserID", None), ("PlannedDate", None),
+                   ("Calories", None), ("ProteinGrams", None), ("FatGrams", None), ("CarbGrams", None))
+    if not before[1]:
+        return [(description, [])]
+    _query(cursor, "UPDATE MealPlans SET Status = ? WHERE PlanID = ?", (status, plan_id))
+    old_status, user_id, planned, calories, protein, fat, carbs = before[1][0]
+    return [(description, [(old_status, status, user_id, planned, calories, protein, fat, carbs)])]
+
+
+# (pattern, handler(cursor, *params)) checked before procedure calls and plain SQL
+STATEMENTS = [
+    (re.compile(r"UPDATE\s+mp\s+SET\s+mp\.Status\s*=\s*\?\s+OUTPUT\b", re.IGNORECASE), update_meal_plan_status),
+]
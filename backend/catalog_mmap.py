@@ -0,0 +1,357 @@
+"""
+File: catalog_mmap.py
+Version: 1.0.0
+
+Description:
+- Shared, memory-mapped meal catalog for multi-process deployments
+  (config.MEAL_CATALOG_SHARED_DIR)
+- One worker loads the catalog from SQL Server and writes a compact columnar
+  snapshot file; every worker maps it read-only, so the OS page cache holds
+  one copy no matter how many workers run
+- Publishing writes catalog-<n>.bin, then atomically replaces the small
+  "current" pointer file; workers notice the new pointer and map the new
+  file. Old files are removed once they are two generations behind
+- A lock file lease makes sure only one worker at a time refreshes from the DB
+
+File layout (little-endian, every section 8-byte aligned):
+    header   magic, format version, created_at, counts, section offsets
+    meals    MealID i8, Calories/Protein/Fat/Carbs f8 (NaN = NULL),
+             name/image/diet string ids u4, ingredient start u4 (n + 1)
+    ingreds  name/quantity/smart-group string ids u4
+    diets    diet string id, first meal row, end row (u4 each); meals are
+             sorted by diet so each diet is one contiguous row range
+    strings  offsets u4 (count + 1) into a UTF-8 blob; id 0xFFFFFFFF = NULL
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from collections.abc import Sequence
+from sys import byteorder
+
+import config
+from meal_catalog import diet_key
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AMBLCAT\x00"
+FORMAT_VERSION = 1
+NULL_STRING = 0xFFFFFFFF
+POINTER_NAME = "current"
+LOCK_NAME = "refresh.lock"
+
+# magic, version, created_at, meals, ingredients, diets, strings, then 14 section offsets
+_HEADER = struct.Struct("<8sIdIIII14Q")
+_SECTIONS = (
+    "meal_id", "calories", "protein", "fat", "carbs",
+    "name", "image", "diet", "ing_start",
+    "ing_name", "ing_quantity", "ing_group",
+    "diets", "strings",
+)
+_MACRO_COLUMNS = {"Calories": "calories", "ProteinGrams": "protein", "FatGrams": "fat", "CarbGrams": "carbs"}
+
+
+class _StringTable:
+    def __init__(self):
+        self._ids = {}
+        self._values = []
+
+    def add(self, value):
+        if value is None:
+            return NULL_STRING
+        value = str(value)
+        index = self._ids.get(value)
+        if index is None:
+            index = self._ids[value] = len(self._values)
+            self._values.append(value)
+        return index
+
+    def encode(self):
+        blobs = [v.encode("utf-8") for v in self._values]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        return offsets, b"".join(blobs)
+
+
+def _number(value):
+    return float("nan") if value is None else float(value)
+
+
+def encode_snapshot(meals, created_at=None):
+    """
+    Serialise meal dicts (the MealCatalog loader shape, including
+    DietCategory and ingredients) to the snapshot format. Returns bytes.
+    """
+    meals = sorted(meals, key=lambda m: (diet_key(m.get("DietCategory")), m["MealID"]))
+    strings = _StringTable()
+    columns = {name: [] for name in _SECTIONS[:9]}
+    ingredients = {"ing_name": [], "ing_quantity": [], "ing_group": []}
+    diets = []
+
+    for row, meal in enumerate(meals):
+        key = diet_key(meal.get("DietCategory"))
+        if not diets or diets[-1][0] != key:
+            diets.append([key, row, row])
+        diets[-1][2] = row + 1
+
+        columns["meal_id"].append(int(meal["MealID"]))
+        for field, column in _MACRO_COLUMNS.items():
+            columns[column].append(_number(meal.get(field)))
+        columns["name"].append(strings.add(meal.get("MealName")))
+        columns["image"].append(strings.add(meal.get("ImageURL")))
+        columns["diet"].append(strings.add(meal.get("DietCategory")))
+        columns["ing_start"].append(len(ingredients["ing_name"]))
+        for ingredient in meal.get("ingredients", ()):
+            ingredients["ing_name"].append(strings.add(ingredient.get("IngredientName")))
+            ingredients["ing_quantity"].append(strings.add(ingredient.get("Quantity")))
+            ingredients["ing_group"].append(strings.add(ingredient.get("SmartGroup")))
+    columns["ing_start"].append(len(ingredients["ing_name"]))
+
+    diet_rows = []
+    for key, start, end in diets:
+        diet_rows.extend((strings.add(key), start, end))
+    string_offsets, blob = strings.encode()
+
+    typed = [
+        ("q", columns["meal_id"]),
+        ("d", columns["calories"]), ("d", columns["protein"]), ("d", columns["fat"]), ("d", columns["carbs"]),
+        ("I", columns["name"]), ("I", columns["image"]), ("I", columns["diet"]), ("I", columns["ing_start"]),
+        ("I", ingredients["ing_name"]), ("I", ingredients["ing_quantity"]), ("I", ingredients["ing_group"]),
+        ("I", diet_rows),
+    ]
+
+    body = bytearray()
+    offsets = []
+    position = _HEADER.size
+    pad = (-position) % 8
+    body += b"\0" * pad
+    position += pad
+    for code, values in typed:
+        offsets.append(position)
+        chunk = struct.pack(f"<{len(values)}{code}", *values)
+        chunk += b"\0" * ((-len(chunk)) % 8)
+        body += chunk
+        position += len(chunk)
+    offsets.append(position)
+    body += struct.pack(f"<{len(string_offsets)}I", *string_offsets) + blob
+
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, time.time() if created_at is None else created_at,
+        len(meals), len(ingredients["ing_name"]), len(diets), len(string_offsets) - 1,
+        *offsets
+    )
+    return header + bytes(body)
+
+
+class MealRows(Sequence):
+    """Lazy sequence of meal dicts for a row range; decodes on access."""
+
+    __slots__ = ("_snapshot", "_start", "_end")
+
+    def __init__(self, snapshot, start, end):
+        self._snapshot = snapshot
+        self._start = start
+        self._end = end
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._snapshot.meal(self._start + index)
+
+
+class MappedSnapshot:
+    """
+    Read-only view over a mapped snapshot file. Columns are memoryviews into
+    the mapping (zero-copy); meal(i) builds the usual meal dict on demand.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        view = memoryview(self._map)
+        (magic, version, created_at, meal_count, ingredient_count, diet_count,
+         string_count, *offsets) = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} catalog snapshot")
+        if byteorder != "little":
+            raise ValueError("Catalog snapshots are little-endian only")
+
+        def column(section, code, count):
+            start = offsets[_SECTIONS.index(section)]
+            size = struct.calcsize(code)
+            return view[start:start + count * size].cast(code)
+
+        self.created_at = created_at
+        # Monotonic-clock equivalent of created_at, for TTL checks
+        self.loaded_at = time.monotonic() - max(0.0, time.time() - created_at)
+        self.meal_count = meal_count
+        self.meal_ids = column("meal_id", "q", meal_count)
+        self.columns = {field: column(name, "d", meal_count) for field, name in _MACRO_COLUMNS.items()}
+        self._name = column("name", "I", meal_count)
+        self._image = column("image", "I", meal_count)
+        self._diet = column("diet", "I", meal_count)
+        self._ing_start = column("ing_start", "I", meal_count + 1)
+        self._ing_name = column("ing_name", "I", ingredient_count)
+        self._ing_quantity = column("ing_quantity", "I", ingredient_count)
+        self._ing_group = column("ing_group", "I", ingredient_count)
+        diet_rows = column("diets", "I", diet_count * 3)
+        strings_at = offsets[_SECTIONS.index("strings")]
+        self._string_offsets = view[strings_at:strings_at + (string_count + 1) * 4].cast("I")
+        self._blob_at = strings_at + (string_count + 1) * 4
+        self._view = view
+
+        self.diet_slices = {
+            self.string(diet_rows[i]): (diet_rows[i + 1], diet_rows[i + 2])
+            for i in range(0, len(diet_rows), 3)
+        }
+        self.by_diet = {diet: MealRows(self, start, end) for diet, (start, end) in self.diet_slices.items()}
+
+    def string(self, index):
+        if index == NULL_STRING:
+            return None
+        start = self._blob_at + self._string_offsets[index]
+        end = self._blob_at + self._string_offsets[index + 1]
+        return str(self._view[start:end], "utf-8")
+
+    def meal(self, row):
+        calories = self.columns["Calories"][row]
+        meal = {
+            "MealID": self.meal_ids[row],
+            "MealName": self.string(self._name[row]),
+            "ImageURL": self.string(self._image[row]),
+            "ProteinGrams": _restore(self.columns["ProteinGrams"][row]),
+            "FatGrams": _restore(self.columns["FatGrams"][row]),
+            "CarbGrams": _restore(self.columns["CarbGrams"][row]),
+            "Calories": None if math.isnan(calories) else (int(calories) if calories.is_integer() else calories),
+        }
+        meal["ingredients"] = [
+            {
+                "IngredientName": self.string(self._ing_name[i]),
+                "Quantity": self.string(self._ing_quantity[i]),
+                "SmartGroup": self.string(self._ing_group[i]),
+            }
+            for i in range(self._ing_start[row], self._ing_start[row + 1])
+        ]
+        return meal
+
+    def meals_for(self, diet_category):
+        return self.by_diet.get(diet_key(diet_category), ())
+
+    def all_meals(self):
+        return MealRows(self, 0, self.meal_count)
+
+
+def _restore(value):
+    return None if math.isnan(value) else value
+
+
+class SharedSnapshotFile:
+    """
+    Publishes and maps snapshots in `directory`, shared by every worker
+    process on the host.
+    """
+
+    def __init__(self, directory, poll_interval=None, lease_timeout=None):
+        self.directory = directory
+        self.poll_interval = config.MEAL_CATALOG_SHARED_POLL if poll_interval is None else poll_interval
+        self.lease_timeout = config.MEAL_CATALOG_SHARED_LEASE if lease_timeout is None else lease_timeout
+        os.makedirs(directory, exist_ok=True)
+        self._pointer = os.path.join(directory, POINTER_NAME)
+        self._lock_path = os.path.join(directory, LOCK_NAME)
+        self._mapped_name = None
+        self._mapped = None
+        self._next_poll = 0.0
+
+    def _read_pointer(self):
+        try:
+            with open(self._pointer, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def current(self, force=False):
+        """Latest published snapshot (re-mapped if another worker published), or None."""
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return self._mapped
+        self._next_poll = now + self.poll_interval
+        name = self._read_pointer()
+        if name and name != self._mapped_name:
+            try:
+                # The previous mapping is not closed: requests may still be
+                # reading from it; it is released when the last reference goes
+                self._mapped = MappedSnapshot(os.path.join(self.directory, name))
+                self._mapped_name = name
+            except (OSError, ValueError) as e:
+                logger.warning(f"[Catalog] Could not map shared snapshot {name}: {e}")
+        return self._mapped
+
+    def try_lease(self):
+        """Take the cross-process refresh lease; False if another worker holds it."""
+        for _ in range(2):
+            try:
+                fd = os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                with os.fdopen(fd, "w") as f:
+                    f.write(str(os.getpid()))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self._lock_path) < self.lease_timeout:
+                        return False
+                    # Holder died mid-refresh; break the lease and retry once
+                    os.remove(self._lock_path)
+                except OSError:
+                    return False
+        return False
+
+    def release_lease(self):
+        try:
+            os.remove(self._lock_path)
+        except OSError:
+            pass
+
+    def publish(self, meals):
+        """Write a new snapshot, swap the pointer to it and map it."""
+        data = encode_snapshot(meals)
+        name = f"catalog-{time.time_ns()}-{os.getpid()}.bin"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        pointer_tmp = f"{self._pointer}.{os.getpid()}.tmp"
+        with open(pointer_tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(pointer_tmp, self._pointer)
+
+        previous = self._mapped_name
+        mapped = self.current(force=True)
+        self._cleanup(keep={name, previous})
+        logger.info(f"[Catalog] Published shared snapshot {name} ({len(data)} bytes)")
+        return mapped
+
+    def _cleanup(self, keep):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith("catalog-") and name.endswith(".bin") and name not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass   # still mapped by a worker on Windows; removed on a later publish
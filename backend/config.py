@@ -0,0 +1,346 @@
+"""
+File: config.py
+Version: 1.27.0
+
+CHANGES FROM 1.26.0:
+- ADDED: DB_PROCEDURE_PROBE_TTL
+
+CHANGES FROM 1.25.0:
+- PREFERENCE_CACHE_TTL defaults to 5 s: it is how long another worker can
+  serve a preference after a write
+
+CHANGES FROM 1.24.0:
+- ADDED: DAILY_TOTALS_CACHE_ENABLED (off: running totals are per process)
+
+CHANGES FROM 1.23.0:
+- ADDED: TASK_FLUSH_MAX_ATTEMPTS
+
+CHANGES FROM 1.22.0:
+- HTTP_CACHE_VERSIONED_ETAGS defaults to off: version counters are per
+  process and give stale 304s with several workers
+
+CHANGES FROM 1.21.0:
+- ADDED: Meal catalog reload retry backoff
+
+CHANGES FROM 1.20.0:
+- ADDED: DAILY_TOTALS_MAX_ENTRIES
+
+CHANGES FROM 1.19.0:
+- ADDED: Read replica targets and the read-your-writes window
+
+CHANGES FROM 1.18.0:
+- ADDED: Request profiling settings
+
+CHANGES FROM 1.17.0:
+- ADDED: Meal search page size limits
+
+CHANGES FROM 1.16.0:
+- ADDED: Meal-plan export batch size and gzip level
+
+CHANGES FROM 1.15.0:
+- ADDED: Database circuit breaker and health probe settings
+
+CHANGES FROM 1.14.0:
+- ADDED: Single-flight read coalescing switch and admission control limits
+
+CHANGES FROM 1.13.0:
+- ADDED: Shared memory-mapped meal catalog settings
+
+CHANGES FROM 1.12.0:
+- ADDED: Preference cache size and TTL
+
+CHANGES FROM 1.11.0:
+- ADDED: Meal recommender defaults
+
+CHANGES FROM 1.10.0:
+- ADDED: Bootstrap fan-out worker count and timeout
+
+CHANGES FROM 1.9.0:
+- ADDED: Write-behind task queue settings
+
+CHANGES FROM 1.8.0:
+- ADDED: METRICS_ENABLED switch
+
+CHANGES FROM 1.7.0:
+- ADDED: Async serving executor limits, CORS_ORIGIN
+
+CHANGES FROM 1.6.0:
+- ADDED: Grocery list cache settings
+
+CHANGES FROM 1.5.0:
+- ADDED: Daily totals store TTL, range limit and rolling window
+
+CHANGES FROM 1.4.0:
+- ADDED: Bulk meal-plan insert limits
+
+CHANGES FROM 1.3.0:
+- ADDED: Batch suggestion limits
+
+CHANGES FROM 1.2.0:
+- ADDED: HTTP conditional caching settings and Cache-Control policies
+
+CHANGES FROM 1.1.0:
+- ADDED: Meal catalog cache settings
+
+CHANGES FROM 1.0.0:
+- ADDED: Server/database, ODBC driver override and driver cache settings
+
+Description:
+- Central tunables for the Amble backend
+- Every value can be overridden with an AMBLE_* environment variable
+"""
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CORS_ORIGIN = os.environ.get("AMBLE_CORS_ORIGIN", "http://localhost:3000")   # React dev server
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Database Target
+# ────────────────────────────────────────────────────────────────────────────
+
+DB_SERVER = os.environ.get("AMBLE_DB_SERVER", "DESKTOP-G76966Q")
+DB_DATABASE = os.environ.get("AMBLE_DB_DATABASE", "Amble")
+DB_DRIVER = os.environ.get("AMBLE_DB_DRIVER", "")                 # e.g. "ODBC Driver 18 for SQL Server"; empty = discover
+DB_DRIVER_CACHE_PATH = os.environ.get(
+    "AMBLE_DB_DRIVER_CACHE", os.path.join(BACKEND_DIR, ".odbc_driver_cache.json")
+)
+DB_DRIVER_PROBE_TIMEOUT = _env_int("AMBLE_DB_DRIVER_PROBE_TIMEOUT", 5)
+DB_WARMUP_ON_START = _env_bool("AMBLE_DB_WARMUP_ON_START", True)  # resolve driver + fill pool in a background thread
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Database Connection Pool
+# ────────────────────────────────────────────────────────────────────────────
+
+DB_POOL_MIN_SIZE = _env_int("AMBLE_DB_POOL_MIN_SIZE", 1)
+DB_POOL_MAX_SIZE = _env_int("AMBLE_DB_POOL_MAX_SIZE", 10)
+DB_POOL_IDLE_TIMEOUT = _env_float("AMBLE_DB_POOL_IDLE_TIMEOUT", 300.0)        # seconds before an idle connection is closed
+DB_POOL_CHECKOUT_TIMEOUT = _env_float("AMBLE_DB_POOL_CHECKOUT_TIMEOUT", 10.0)  # seconds to wait for a free connection
+DB_POOL_PING_INTERVAL = _env_float("AMBLE_DB_POOL_PING_INTERVAL", 30.0)      # idle seconds before a liveness ping on checkout
+DB_CONNECT_TIMEOUT = _env_int("AMBLE_DB_CONNECT_TIMEOUT", 10)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Database Circuit Breaker
+# ────────────────────────────────────────────────────────────────────────────
+
+# After this many consecutive connection failures DB calls fail fast instead
+# of each waiting out DB_CONNECT_TIMEOUT (0 = breaker off)
+DB_BREAKER_FAILURE_THRESHOLD = _env_int("AMBLE_DB_BREAKER_FAILURE_THRESHOLD", 5)
+DB_BREAKER_RESET_TIMEOUT = _env_float("AMBLE_DB_BREAKER_RESET_TIMEOUT", 15.0)   # seconds open before one probe is let through
+DB_HEALTH_PROBE_INTERVAL = _env_float("AMBLE_DB_HEALTH_PROBE_INTERVAL", 2.0)    # seconds /api/health reuses a probe result
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Read Replicas
+# ────────────────────────────────────────────────────────────────────────────
+
+# Comma separated read-only targets, each SERVER or SERVER/DATABASE (database
+# defaults to DB_DATABASE); empty sends every read to DB_SERVER
+DB_READ_REPLICAS = os.environ.get("AMBLE_DB_READ_REPLICAS", "")
+# Seconds a user's reads stay on the primary after they write, so they see
+# their own change however far the replicas lag (0 = no stickiness)
+DB_READ_YOUR_WRITES_WINDOW = _env_float("AMBLE_DB_READ_YOUR_WRITES_WINDOW", 5.0)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Stored Procedures
+# ────────────────────────────────────────────────────────────────────────────
+
+# Seconds before the sys.procedures probe is re-read, so a procedure deployed
+# (or dropped) while the app runs is picked up without a restart
+DB_PROCEDURE_PROBE_TTL = _env_float("AMBLE_DB_PROCEDURE_PROBE_TTL", 300.0)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Meal Catalog Cache
+# ────────────────────────────────────────────────────────────────────────────
+
+MEAL_CATALOG_ENABLED = _env_bool("AMBLE_MEAL_CATALOG_ENABLED", True)
+MEAL_CATALOG_TTL = _env_float("AMBLE_MEAL_CATALOG_TTL", 600.0)  # seconds between background reloads
+MEAL_CATALOG_RETRY_BACKOFF = _env_float("AMBLE_MEAL_CATALOG_RETRY_BACKOFF", 5.0)        # seconds before retrying a failed reload, doubling
+MEAL_CATALOG_RETRY_BACKOFF_MAX = _env_float("AMBLE_MEAL_CATALOG_RETRY_BACKOFF_MAX", 300.0)
+# Directory for the memory-mapped catalog shared by all worker processes on a
+# host; empty keeps a private in-process catalog per worker
+MEAL_CATALOG_SHARED_DIR = os.environ.get("AMBLE_MEAL_CATALOG_SHARED_DIR", "")
+MEAL_CATALOG_SHARED_POLL = _env_float("AMBLE_MEAL_CATALOG_SHARED_POLL", 1.0)    # seconds between checks for a newer file
+MEAL_CATALOG_SHARED_LEASE = _env_float("AMBLE_MEAL_CATALOG_SHARED_LEASE", 120.0)  # refresh lock expiry if a worker dies
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# HTTP Conditional Caching
+# ────────────────────────────────────────────────────────────────────────────
+
+HTTP_CACHE_ENABLED = _env_bool("AMBLE_HTTP_CACHE_ENABLED", True)
+# Version ETags / Last-Modified answer 304 without a DB read, but the version
+# counters live in each process: a write handled by one worker does not bump
+# another's, which would then answer 304 for stale data. Only enable with a
+# single worker process; the default is content-hash ETags (the view runs)
+HTTP_CACHE_VERSIONED_ETAGS = _env_bool("AMBLE_HTTP_CACHE_VERSIONED_ETAGS", False)
+CACHE_CONTROL_DIET_PLANS = os.environ.get("AMBLE_CACHE_CONTROL_DIET_PLANS", "public, max-age=300")
+CACHE_CONTROL_USER_DATA = os.environ.get("AMBLE_CACHE_CONTROL_USER_DATA", "private, no-cache")
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Batch Suggestions
+# ────────────────────────────────────────────────────────────────────────────
+
+SUGGEST_BATCH_MAX_DAYS = _env_int("AMBLE_SUGGEST_BATCH_MAX_DAYS", 14)
+SUGGEST_BATCH_DEFAULT_MEAL_TIMES = ["Breakfast", "Lunch", "Dinner"]
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Meal Search (/api/meals/search)
+# ────────────────────────────────────────────────────────────────────────────
+
+SEARCH_DEFAULT_PAGE_SIZE = _env_int("AMBLE_SEARCH_DEFAULT_PAGE_SIZE", 20)
+SEARCH_MAX_PAGE_SIZE = _env_int("AMBLE_SEARCH_MAX_PAGE_SIZE", 100)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Preference Cache
+# ────────────────────────────────────────────────────────────────────────────
+
+PREFERENCE_CACHE_MAX_ENTRIES = _env_int("AMBLE_PREFERENCE_CACHE_MAX_ENTRIES", 10000)
+# Cache entries are per process: a write made by another worker is only seen
+# once the entry expires. Raise it only for single-worker deployments
+PREFERENCE_CACHE_TTL = _env_float("AMBLE_PREFERENCE_CACHE_TTL", 5.0)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Meal Recommender (/api/meals/recommend, needs numpy)
+# ────────────────────────────────────────────────────────────────────────────
+
+RECOMMEND_DEFAULT_K = _env_int("AMBLE_RECOMMEND_DEFAULT_K", 5)
+RECOMMEND_MAX_K = _env_int("AMBLE_RECOMMEND_MAX_K", 50)
+RECOMMEND_DEFAULT_TEMPERATURE = _env_float("AMBLE_RECOMMEND_DEFAULT_TEMPERATURE", 0.5)  # 0 = strict ranking
+RECOMMEND_SAMPLE_POOL = _env_int("AMBLE_RECOMMEND_SAMPLE_POOL", 256)      # best fits that randomness picks among
+RECOMMEND_MEALS_PER_DAY = _env_int("AMBLE_RECOMMEND_MEALS_PER_DAY", 3)
+RECOMMEND_EXCLUDE_DAYS = _env_int("AMBLE_RECOMMEND_EXCLUDE_DAYS", 3)        # skip meals planned this recently
+RECOMMEND_DEFAULT_CALORIES_GOAL = _env_int("AMBLE_RECOMMEND_DEFAULT_CALORIES_GOAL", 2500)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Bulk Meal Plans
+# ────────────────────────────────────────────────────────────────────────────
+
+MEAL_PLAN_BULK_MAX_ROWS = _env_int("AMBLE_MEAL_PLAN_BULK_MAX_ROWS", 5000)
+MEAL_PLAN_BULK_BATCH_SIZE = _env_int("AMBLE_MEAL_PLAN_BULK_BATCH_SIZE", 1000)  # rows per executemany call
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Daily Totals
+# ────────────────────────────────────────────────────────────────────────────
+
+# Running totals live in each process: a meal-plan write handled by one worker
+# does not update another's, which keeps serving the old totals until the TTL.
+# Only enable with a single worker process; off, every read aggregates in SQL
+DAILY_TOTALS_CACHE_ENABLED = _env_bool("AMBLE_DAILY_TOTALS_CACHE_ENABLED", False)
+DAILY_TOTALS_TTL = _env_float("AMBLE_DAILY_TOTALS_TTL", 300.0)         # safety net for writes made outside this process
+DAILY_TOTALS_MAX_ENTRIES = _env_int("AMBLE_DAILY_TOTALS_MAX_ENTRIES", 50000)  # (user, date) totals kept per process
+DAILY_TOTALS_MAX_RANGE_DAYS = _env_int("AMBLE_DAILY_TOTALS_MAX_RANGE_DAYS", 366)
+DAILY_TOTALS_ROLLING_WINDOW = _env_int("AMBLE_DAILY_TOTALS_ROLLING_WINDOW", 7)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Grocery List
+# ────────────────────────────────────────────────────────────────────────────
+
+GROCERY_CACHE_MAX_ENTRIES = _env_int("AMBLE_GROCERY_CACHE_MAX_ENTRIES", 1024)
+GROCERY_CACHE_TTL = _env_float("AMBLE_GROCERY_CACHE_TTL", 300.0)
+GROCERY_MAX_RANGE_DAYS = _env_int("AMBLE_GROCERY_MAX_RANGE_DAYS", 62)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Load Control (load_control.py)
+# ────────────────────────────────────────────────────────────────────────────
+
+# Concurrent identical DatabaseManager reads share one query
+SINGLE_FLIGHT_ENABLED = _env_bool("AMBLE_SINGLE_FLIGHT_ENABLED", True)
+# DB-bound requests allowed at once per process (0 = no limit); keep it a
+# small multiple of the pool so excess load is shed instead of queued
+ADMISSION_MAX_CONCURRENT = _env_int("AMBLE_ADMISSION_MAX_CONCURRENT", DB_POOL_MAX_SIZE * 2)
+ADMISSION_QUEUE_WAIT = _env_float("AMBLE_ADMISSION_QUEUE_WAIT", 0.05)   # seconds to wait for a slot before 503
+ADMISSION_RETRY_AFTER = _env_int("AMBLE_ADMISSION_RETRY_AFTER", 1)      # Retry-After seconds on 503
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Meal Plan Export (/api/meal-plans/export)
+# ────────────────────────────────────────────────────────────────────────────
+
+EXPORT_FETCH_BATCH_SIZE = _env_int("AMBLE_EXPORT_FETCH_BATCH_SIZE", 1000)   # rows per fetchmany / response chunk
+EXPORT_GZIP_LEVEL = _env_int("AMBLE_EXPORT_GZIP_LEVEL", 6)                  # 1 (fast) .. 9 (small)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Async Serving (asgi.py)
+# ────────────────────────────────────────────────────────────────────────────
+
+ASYNC_DB_WORKERS = _env_int("AMBLE_ASYNC_DB_WORKERS", DB_POOL_MAX_SIZE)      # threads for blocking work; match the pool
+ASYNC_MAX_PENDING = _env_int("AMBLE_ASYNC_MAX_PENDING", 200)                 # queued + running calls before 503
+ASYNC_CALL_TIMEOUT = _env_float("AMBLE_ASYNC_CALL_TIMEOUT", 15.0)            # seconds per executor call
+ASYNC_RETRY_AFTER = _env_int("AMBLE_ASYNC_RETRY_AFTER", 1)                   # Retry-After seconds on 503
+ASYNC_MAX_BODY_BYTES = _env_int("AMBLE_ASYNC_MAX_BODY_BYTES", 10 * 1024 * 1024)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Bootstrap (/api/bootstrap)
+# ────────────────────────────────────────────────────────────────────────────
+
+BOOTSTRAP_WORKERS = _env_int("AMBLE_BOOTSTRAP_WORKERS", 6)          # shared threads for concurrent section reads
+BOOTSTRAP_TIMEOUT = _env_float("AMBLE_BOOTSTRAP_TIMEOUT", 10.0)     # seconds before a section is reported as timed out
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Task Write-Behind (task_queue.py)
+# ────────────────────────────────────────────────────────────────────────────
+
+# Off by default: /api/tasks then writes synchronously and reports DB failures.
+# When on, a 202 means "queued" - updates still pending at a hard crash are lost
+TASK_WRITE_BEHIND_ENABLED = _env_bool("AMBLE_TASK_WRITE_BEHIND_ENABLED", False)
+TASK_FLUSH_WINDOW = _env_float("AMBLE_TASK_FLUSH_WINDOW", 0.5)          # seconds to collect updates before a flush
+TASK_FLUSH_BATCH_SIZE = _env_int("AMBLE_TASK_FLUSH_BATCH_SIZE", 500)    # tasks per transaction
+TASK_QUEUE_MAX_PENDING = _env_int("AMBLE_TASK_QUEUE_MAX_PENDING", 10000)  # distinct task_ids before 503
+TASK_FLUSH_RETRY_DELAY = _env_float("AMBLE_TASK_FLUSH_RETRY_DELAY", 2.0)  # seconds between failed flush retries
+TASK_FLUSH_MAX_ATTEMPTS = _env_int("AMBLE_TASK_FLUSH_MAX_ATTEMPTS", 5)  # solo rejections before a task is dead-lettered
+TASK_QUEUE_RETRY_AFTER = _env_int("AMBLE_TASK_QUEUE_RETRY_AFTER", 1)    # Retry-After seconds when full
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Metrics
+# ────────────────────────────────────────────────────────────────────────────
+
+METRICS_ENABLED = _env_bool("AMBLE_METRICS_ENABLED", True)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Request Profiling (profiling.py)
+# ────────────────────────────────────────────────────────────────────────────
+
+# Requests with X-Amble-Profile: 1 and this token in X-Amble-Admin-Token are
+# profiled; the token also guards /api/admin/profiles. Empty = header trigger off
+PROFILE_ADMIN_TOKEN = os.environ.get("AMBLE_PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = _env_float("AMBLE_PROFILE_SAMPLE_RATE", 0.0)     # fraction of all requests profiled
+PROFILE_DIR = os.environ.get("AMBLE_PROFILE_DIR", os.path.join(BACKEND_DIR, ".profiles"))
+PROFILE_MAX_ENTRIES = _env_int("AMBLE_PROFILE_MAX_ENTRIES", 50)        # oldest captures are deleted beyond this
+PROFILE_MAX_DB_CALLS = _env_int("AMBLE_PROFILE_MAX_DB_CALLS", 2000)    # timeline entries kept per request
@@ -0,0 +1,227 @@
+"""
+File: daily_totals.py
+Version: 1.4.0
+
+CHANGES FROM 1.3.0:
+- DailyTotalsStore only serves entries when DAILY_TOTALS_CACHE_ENABLED is
+  on; the totals are per process, so with several workers they go stale
+  after another worker's write
+
+CHANGES FROM 1.2.0:
+- parse_iso_date() accepts exactly YYYY-MM-DD. date.fromisoformat() on
+  3.11+ also takes week dates (2026-W05-1) and the basic format (20260130),
+  and the old [:10] slice let trailing text through
+
+CHANGES FROM 1.1.0:
+- ADDED: MEAL_PLAN_STATUSES - every status MealPlans.Status accepts
+
+CHANGES FROM 1.0.0:
+- DailyTotalsStore is an LRU capped at DAILY_TOTALS_MAX_ENTRIES (generations
+  included); expired entries are dropped when read
+
+Description:
+- In-process running nutrition totals per (user, date)
+- Filled from one aggregate (or one grouped range query) on a miss, then
+  kept current by meal-plan writes instead of re-aggregating on every read
+- Entries expire after DAILY_TOTALS_TTL as a safety net for writes made
+  outside this process
+- Off unless config.DAILY_TOTALS_CACHE_ENABLED (single worker only); while
+  off nothing is stored and every read goes to the database
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import config
+
+TOTAL_FIELDS = ("TotalCalories", "TotalProtein", "TotalFat", "TotalCarbs")
+
+# Every value MealPlans.Status accepts (its CHECK constraint)
+MEAL_PLAN_STATUSES = ("Pending", "Accepted", "Skipped", "Completed")
+
+# MealPlans statuses that count towards the day's totals
+COUNTED_STATUSES = ("Pending", "Accepted")
+
+# [0-9], not \d: \d also matches non-ASCII digits
+_ISO_DATE_RE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+
+
+def empty_totals(for_date):
+    totals = {field: 0 for field in TOTAL_FIELDS}
+    totals["MealCount"] = 0
+    totals["ForDate"] = for_date
+    return totals
+
+
+def _user_key(user_id):
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return user_id
+
+
+class DailyTotalsStore:
+    """
+    Thread-safe (user, date) -> totals LRU, capped at max_entries.
+
+    Every write bumps a per-key generation. A loader captures the generation
+    before querying and put() discards its result if a write landed in
+    between, so a slow aggregate can never overwrite a newer increment.
+    Generations come from one store-wide counter and are capped too: a key
+    whose generation was evicted reads as the highest evicted value, which a
+    load that started before the eviction can no longer match.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, enabled=None):
+        self.enabled = config.DAILY_TOTALS_CACHE_ENABLED if enabled is None else enabled
+        self.ttl = config.DAILY_TOTALS_TTL if ttl is None else ttl
+        self.max_entries = config.DAILY_TOTALS_MAX_ENTRIES if max_entries is None else max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()      # (user, iso_date) -> (totals, stored_at)
+        self._generations = OrderedDict()  # (user, iso_date) -> last write sequence
+        self._sequence = 0
+        self._evicted_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _generation_locked(self, key):
+        return self._generations.get(key, self._evicted_generation)
+
+    def _bump_locked(self, key):
+        self._sequence += 1
+        self._generations[key] = self._sequence
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.max_entries:
+            _, evicted = self._generations.popitem(last=False)
+            self._evicted_generation = max(self._evicted_generation, evicted)
+
+    def _live_locked(self, key, now):
+        """The entry for key if present and fresh; expired entries are dropped."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[1] >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def generation(self, user_id, for_date):
+        with self._lock:
+            return self._generation_locked((_user_key(user_id), for_date))
+
+    def get(self, user_id, for_date):
+        if not self.enabled:
+            return None
+        key = (_user_key(user_id), for_date)
+        with self._lock:
+            entry = self._live_locked(key, time.monotonic())
+            if entry is not None:
+                self.hits += 1
+                return dict(entry[0])
+            self.misses += 1
+            return None
+
+    def get_range(self, user_id, dates):
+        """Totals for every date, or None if any of them is missing/expired."""
+        if not self.enabled:
+            return None
+        user = _user_key(user_id)
+        now = time.monotonic()
+        with self._lock:
+            found = []
+            for for_date in dates:
+                entry = self._live_locked((user, for_date), now)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                found.append(dict(entry[0]))
+            self.hits += 1
+            return found
+
+    def put(self, user_id, for_date, totals, generation):
+        if not self.enabled:
+            return False
+        key = (_user_key(user_id), for_date)
+        with self._lock:
+            if self._generation_locked(key) != generation:
+                return False
+            self._entries[key] = (dict(totals), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def apply_delta(self, user_id, for_date, calories=0, protein=0, fat=0, carbs=0, meals=0):
+        """Add one meal's macros (negative values remove it)."""
+        key = (_user_key(user_id), for_date)
+        with self._lock:
+            self._bump_locked(key)
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            totals = dict(entry[0])
+            for field, delta in zip(TOTAL_FIELDS, (calories, protein, fat, carbs)):
+                totals[field] = (totals[field] or 0) + (delta or 0)
+            totals["MealCount"] = (totals["MealCount"] or 0) + meals
+            self._entries[key] = (totals, entry[1])
+
+    def invalidate(self, user_id, for_date=None):
+        """Drop one day, or every day for the user when for_date is None."""
+        user = _user_key(user_id)
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == user and (for_date is None or k[1] == for_date)]
+            if for_date is not None:
+                keys.append((user, for_date))
+            for key in keys:
+                self._entries.pop(key, None)
+                self._bump_locked(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def date_range(start, end):
+    """Inclusive list of ISO date strings from start to end (date objects)."""
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+def with_rolling_averages(days, window):
+    """
+    Annotate each day with trailing `window`-day averages. `days` must be in
+    date order; the first window-1 entries are lead-in days and are dropped.
+    """
+    annotated = []
+    for index in range(window - 1, len(days)):
+        span = days[index - window + 1:index + 1]
+        day = dict(days[index])
+        day["Rolling"] = {
+            field: round(sum(d[field] or 0 for d in span) / window, 1)
+            for field in TOTAL_FIELDS
+        }
+        annotated.append(day)
+    return annotated
+
+
+def parse_iso_date(value, default=None):
+    """
+    date for a YYYY-MM-DD string, default when value is empty. Anything
+    else - another format, a time part, trailing text - raises ValueError.
+    """
+    if not value:
+        return default
+    if not isinstance(value, str) or not _ISO_DATE_RE.fullmatch(value):
+        raise ValueError(f"Not a YYYY-MM-DD date: {value!r}")
+    return date.fromisoformat(value)
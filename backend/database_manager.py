@@ -1,10 +1,151 @@
 """
 File: database_manager.py
-Version: 1.3.0
+Version: 1.32.0
 
-CHANGES FROM 1.2.2:
-- ADDED: get_daily_totals() method for VitalsBar persistence
-- Fixed Status constraint ('Pending' instead of 'Planned')
+CHANGES FROM 1.31.0:
+- CircuitBreaker takes a `clock` (default time.monotonic) so its timing can
+  be driven by tests
+
+CHANGES FROM 1.30.0:
+- ProcedureRegistry re-reads sys.procedures after DB_PROCEDURE_PROBE_TTL, so
+  a procedure deployed while the app runs is used without a restart
+- A "could not find stored procedure" error re-reads the catalog at once
+  (other procedures may be gone too) before falling back
+
+CHANGES FROM 1.29.0:
+- A replica read is only retried on the primary after a connection error
+  (OperationalError / InterfaceError / SQLSTATE 08xxx). ProgrammingErrors -
+  a missing procedure, an unknown column - reach the caller's own fallback
+  instead of counting as replica failures and doubling primary load
+- A replica connection that fails in cursor() is reported like a failed
+  statement
+
+CHANGES FROM 1.28.0:
+- insert_meal_plan() and insert_meal_plans_bulk() parse string dates with
+  the strict parse_iso_date() (YYYY-MM-DD only) like get_daily_totals()
+
+CHANGES FROM 1.27.0:
+- ADDED: get_meal_plan_version() - fingerprint of the counted meal plans in
+  a user's date range, read from the database so every worker agrees on it
+
+CHANGES FROM 1.26.0:
+- get_diet_plans(strict=True) returns None when the read fails instead of
+  [], so /api/bootstrap can report the section as failed
+
+CHANGES FROM 1.25.0:
+- upsert_tasks() returns None when the database cannot be reached and
+  False only when it rejected the batch, so the write-behind queue can
+  tell an outage from a bad task
+
+CHANGES FROM 1.24.0:
+- Replicas no longer need the primary's pool: their driver is the primary's
+  when known, else chosen locally (config / cache / installed drivers), so a
+  down primary cannot make every read re-probe ODBC drivers
+- A replica read whose statement fails after checkout is retried once on
+  the primary instead of returning None / []
+
+CHANGES FROM 1.23.0:
+- update_meal_plan_status() only accepts MEAL_PLAN_STATUSES and tells a
+  missing plan (False) apart from a failed update (None)
+
+CHANGES FROM 1.22.0:
+- get_daily_totals() and insert_meal_plan() normalize dates to ISO before
+  touching totals_store, so a non-ISO date can no longer update the wrong
+  day; unparseable dates are rejected
+
+CHANGES FROM 1.21.0:
+- ADDED: ReadReplica - read-only targets from config.DB_READ_REPLICAS, each
+  with its own pool and circuit breaker
+- get_diet_plans(), get_random_meal_by_diet(), get_user_preference() and
+  get_daily_totals() read from the replicas (round robin); writes and every
+  other query stay on the primary
+- Read-your-writes: for DB_READ_YOUR_WRITES_WINDOW seconds after a user's
+  meal-plan or preference write, that user's reads go to the primary
+- Reads fall back to the primary when no replica is healthy
+- ADDED: use_replica_connectors() - stand-in replicas for local testing;
+  replication_stats()
+
+CHANGES FROM 1.20.0:
+- Connections are instrumented while a request is being profiled, even with
+  metrics disabled, so the profile gets its DB call timeline
+
+CHANGES FROM 1.19.0:
+- ADDED: iter_meal_plan_history() - a user's MealPlans joined with Meals macros,
+  streamed in fetchmany batches for the export endpoint
+
+CHANGES FROM 1.18.0:
+- ADDED: CircuitBreaker - after DB_BREAKER_FAILURE_THRESHOLD consecutive
+  connection failures _get_connection() fails fast instead of waiting out
+  the connect timeout; after DB_BREAKER_RESET_TIMEOUT one caller probes
+  with SELECT 1 and a success closes the breaker again
+- The pool reports connect / ping / rollback outcomes to the breaker, and
+  idle connections are dropped when it opens
+- ADDED: health_check() - real SELECT 1 probe (rate limited) plus breaker state
+
+CHANGES FROM 1.17.0:
+- Concurrent identical reads (diet plans, preference, totals, weekly plan,
+  ingredients, meals by diet) share one in-flight query (load_control.SingleFlight)
+- Meal-plan and preference writes detach the user's in-flight reads so
+  later readers see the write
+
+CHANGES FROM 1.16.0:
+- ADDED: preference_cache - get_user_preference() is served from a bounded LRU,
+  kept current write-through by update_user_preferences()
+- get_user_preference() also returns CaloriesGoal / Allergies when the table has them
+- update_user_diet_preference() keeps the user's goal and allergies instead of
+  resetting them to defaults
+- get_recommendation_context() reads the preference from the cache; ADDED get_recent_meal_ids()
+
+CHANGES FROM 1.15.0:
+- ADDED: get_recommendation_context() - diet, calorie goal and recent meals for the recommender
+
+CHANGES FROM 1.14.0:
+- ADDED: upsert_tasks() - many sp_UpsertTask calls in one transaction
+
+CHANGES FROM 1.13.0:
+- ADDED: ProcedureRegistry - which stored procedures exist is probed once from
+  sys.procedures; calls go straight to the procedure or its inline fallback
+- Procedure calls use pre-built {CALL} strings and typed parameter bindings
+- get_daily_totals() no longer pays a failed round trip per request when
+  usp_GetUserDailyTotals is missing
+- ADDED: refresh_procedures() - re-probe after deploying procedures
+
+CHANGES FROM 1.12.0:
+- ADDED: use_connector() - plug in a pyodbc-compatible stand-in (benchmarks, local testing)
+
+CHANGES FROM 1.11.0:
+- Connect / execute / fetch timings recorded per procedure or query (metrics.py)
+
+CHANGES FROM 1.10.0:
+- ADDED: get_planned_ingredients() - every ingredient row for a user's date range
+
+CHANGES FROM 1.9.0:
+- ADDED: get_weekly_plan() - a user's week from dbo.sp_GetWeeklyPlan, nested in one pass
+
+CHANGES FROM 1.8.0:
+- ADDED: totals_store - running per-user/per-date totals kept current by meal-plan writes
+- get_daily_totals() reads from totals_store and only aggregates on a miss
+- ADDED: get_daily_totals_range() - every day in a range from one grouped query
+- ADDED: update_meal_plan_status() - status changes adjust the running totals
+- insert_meal_plan() validates the date before borrowing a connection
+
+CHANGES FROM 1.7.0:
+- ADDED: insert_meal_plans_bulk() - batched fast_executemany inserts in one transaction
+
+CHANGES FROM 1.6.0:
+- ADDED: get_meals_by_diet() - all meals for one diet in a single round trip
+
+CHANGES FROM 1.5.0:
+- ADDED: get_meal_catalog() - bulk meal + ingredient load for MealCatalog
+
+CHANGES FROM 1.4.0:
+- Driver discovery is lazy: no connection is opened until first use or warm_up()
+- Chosen driver is cached on disk per server/database (config.DB_DRIVER_CACHE_PATH)
+- config.DB_DRIVER skips discovery entirely
+
+CHANGES FROM 1.3.0:
+- ADDED: ConnectionPool - thread-safe pool of reusable ODBC connections
+- _get_connection() now borrows from the pool; conn.close() returns it
 
 Description: 
 - Modern ODBC driver + connection test
@@ -12,55 +153,1212 @@ Description:
 - All methods for Amble dashboard functionality
 """
 import pyodbc
-from datetime import date, datetime
+from collections import deque
+from datetime import date, datetime, timedelta
+import functools
+import json
 import logging
+import os
+import sys
+import threading
+import time
+
+import config
+import metrics
+import profiling
+from load_control import SingleFlight
+from daily_totals import COUNTED_STATUSES, MEAL_PLAN_STATUSES, DailyTotalsStore, date_range, empty_totals, parse_iso_date
+from preferences import MISSING, PreferenceCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+# ────────────────────────────────────────────────────────────────────────────
+# Circuit Breaker
+# ────────────────────────────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker in front of the database.
+
+    - closed: calls go through; failure_threshold failures in a row open it
+    - open: calls fail fast for reset_timeout seconds
+    - half_open: one caller is admitted as a probe; its success closes the
+      breaker, its failure opens it for another reset_timeout
+
+    on_open() is called (outside the lock) each time the breaker opens.
+    clock() returns the monotonic time in seconds (time.monotonic by default).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=None, reset_timeout=None, on_open=None, clock=None):
+        self.failure_threshold = (config.DB_BREAKER_FAILURE_THRESHOLD
+                                  if failure_threshold is None else failure_threshold)
+        self.reset_timeout = config.DB_BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        self.on_open = on_open
+        self.clock = clock or time.monotonic
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+        self.opens = 0
+        self.rejected = 0
+        self.last_success_at = None
+        self.last_failure_at = None
+        self.last_error = None
+        self.last_probe_ms = None
+
+    def admit(self):
+        """
+        "call" to go ahead, "probe" when this caller is the half-open probe,
+        or None to fail fast.
+        """
+        if self.failure_threshold <= 0:
+            return "call"
+        with self._lock:
+            if self.state == self.CLOSED:
+                return "call"
+            now = self.clock()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_started_at = now
+                return "probe"
+            # A probe that never reported back does not block recovery forever
+            if self.state == self.HALF_OPEN and now - self._probe_started_at >= self.reset_timeout:
+                self._probe_started_at = now
+                return "probe"
+            self.rejected += 1
+            return None
+
+    def record_success(self, probe_ms=None):
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.last_success_at = datetime.now().isoformat(timespec="seconds")
+            if probe_ms is not None:
+                self.last_probe_ms = probe_ms
+        if recovered:
+            logger.info("[Breaker] Database reachable again; circuit closed")
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_failure_at = datetime.now().isoformat(timespec="seconds")
+            self.last_error = str(error) if error is not None else None
+            opened = self.failure_threshold > 0 and (
+                self.state == self.HALF_OPEN or
+                (self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold)
+            )
+            if opened:
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+                self.opens += 1
+        if opened:
+            logger.warning(
+                f"[Breaker] Circuit open after {self.consecutive_failures} consecutive failure(s); "
+                f"failing fast for {self.reset_timeout}s"
+            )
+            if self.on_open is not None:
+                try:
+                    self.on_open()
+                except Exception as e:
+                    logger.warning(f"[Breaker] on_open hook failed: {e}")
+
+    def retry_after(self):
+        """Seconds until the next probe is admitted (0 unless open)."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self.clock() - self._opened_at))
+
+    def stats(self):
+        retry_in = self.retry_after()
+        with self._lock:
+            return {
+                "state": self.state if self.failure_threshold > 0 else "disabled",
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_s": self.reset_timeout,
+                "retry_in_s": round(retry_in, 1),
+                "opens": self.opens,
+                "rejected": self.rejected,
+                "last_success_at": self.last_success_at,
+                "last_failure_at": self.last_failure_at,
+                "last_error": self.last_error,
+                "last_probe_ms": self.last_probe_ms,
+            }
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Connection Pool
+# ────────────────────────────────────────────────────────────────────────────
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within checkout_timeout."""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a driver connection handed out by ConnectionPool.
+    close() returns the connection to the pool instead of closing it, so
+    existing `finally: conn.close()` blocks keep working unchanged.
+    """
+
+    def __init__(self, pool, raw, label=None):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+        self._label = label
+        self._on_error = None           # set for replica reads: on_error(exception)
+
+    def cursor(self):
+        try:
+            cursor = self._raw.cursor()
+        except Exception as e:
+            if self._on_error is not None:
+                self._on_error(e)
+            raise
+        if self._label is not None:
+            cursor = metrics.InstrumentedCursor(cursor, self._label)
+        if self._on_error is not None:
+            cursor = _ErrorReportingCursor(cursor, self._on_error)
+        return cursor
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def invalidate(self):
+        """Drop the underlying connection instead of returning it to the pool."""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw, discard=True)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._raw.commit()
+        self.close()
+
+
+class _ErrorReportingCursor:
+    """
+    Cursor proxy that reports failing calls to on_error(exception) before
+    re-raising; on_error decides which errors matter.
+    """
+
+    def __init__(self, cursor, on_error):
+        self._cursor = cursor
+        self._on_error = on_error
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                self._on_error(e)
+                raise
+        return call
+
+    def __setattr__(self, name, value):
+        if name in ("_cursor", "_on_error"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of ODBC connections.
+
+    - min_size connections are kept open even when idle
+    - connections idle longer than idle_timeout are closed (down to min_size)
+    - a connection idle longer than ping_interval is pinged before checkout
+    - callers block up to checkout_timeout once max_size is reached
+
+    `connect` defaults to pyodbc.connect; pass a fake module's connect to
+    exercise the pool without SQL Server. With a `breaker`, connect, ping
+    and release-rollback outcomes are reported to it.
+    """
+
+    def __init__(self, conn_str, connect=None, min_size=None, max_size=None,
+                 idle_timeout=None, checkout_timeout=None, ping_interval=None,
+                 connect_timeout=None, breaker=None):
+        self.conn_str = conn_str
+        self.breaker = breaker
+        self._connect = connect or pyodbc.connect
+        self.min_size = config.DB_POOL_MIN_SIZE if min_size is None else min_size
+        self.max_size = config.DB_POOL_MAX_SIZE if max_size is None else max_size
+        self.idle_timeout = config.DB_POOL_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.checkout_timeout = config.DB_POOL_CHECKOUT_TIMEOUT if checkout_timeout is None else checkout_timeout
+        self.ping_interval = config.DB_POOL_PING_INTERVAL if ping_interval is None else ping_interval
+        self.connect_timeout = config.DB_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+
+        if self.max_size < 1 or self.min_size > self.max_size:
+            raise ValueError(f"Invalid pool size: min={self.min_size} max={self.max_size}")
+
+        self._idle = deque()            # (raw_connection, last_used_monotonic)
+        self._cond = threading.Condition()
+        self._size = 0                  # open connections, idle + checked out
+        self._checked_out = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+
+    def _report(self, ok, error=None):
+        if self.breaker is not None:
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure(error)
+
+    def _open(self):
+        try:
+            raw = self._connect(self.conn_str, timeout=self.connect_timeout)
+        except Exception as e:
+            self._report(False, e)
+            raise
+        self._report(True)
+        with self._cond:
+            self._created += 1
+        return raw
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, raw, idle_for):
+        if getattr(raw, "closed", False):
+            return False
+        if idle_for < self.ping_interval:
+            return True
+        try:
+            cursor = raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+        except Exception as e:
+            self._report(False, e)
+            return False
+        self._report(True)
+        return True
+
+    def _evict_idle_locked(self, now):
+        """Close connections idle past idle_timeout. Caller holds the lock."""
+        expired = []
+        while self._idle and self._size > self.min_size:
+            raw, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._recycled += 1
+            expired.append(raw)
+        return expired
+
+    def acquire(self):
+        """Check out a live connection, opening a new one if under max_size."""
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            raw = None
+            idle_for = 0.0
+            expired = []
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    expired.extend(self._evict_idle_locked(now))
+                    if self._idle:
+                        # LIFO keeps the hottest connections in use and lets
+                        # the cold end age out through idle eviction
+                        raw, last_used = self._idle.pop()
+                        idle_for = now - last_used
+                        self._checked_out += 1
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        self._checked_out += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No connection available within {self.checkout_timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            for stale in expired:
+                self._discard(stale)
+
+            if raw is None:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._checked_out -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_alive(raw, idle_for):
+                return raw
+
+            logger.warning("[Pool] Dropping dead connection on checkout")
+            self._discard(raw)
+            with self._cond:
+                self._size -= 1
+                self._checked_out -= 1
+                self._recycled += 1
+                self._cond.notify()
+
+    def release(self, raw, discard=False):
+        """Return a connection to the pool (or close it when discard=True)."""
+        if not discard:
+            try:
+                # Clear any transaction a failed caller left open
+                raw.rollback()
+            except Exception as e:
+                # A connection that cannot even roll back is broken
+                self._report(False, e)
+                discard = True
+
+        if discard or getattr(raw, "closed", False):
+            self._discard(raw)
+            with self._cond:
+                self._size -= 1
+                self._checked_out -= 1
+                self._recycled += 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._checked_out -= 1
+            self._cond.notify()
+
+    def adopt(self, raw):
+        """Add an already-open connection (e.g. a driver probe) to the idle set."""
+        with self._cond:
+            if self._size >= self.max_size:
+                adopted = False
+            else:
+                self._size += 1
+                self._created += 1
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+                adopted = True
+        if not adopted:
+            self._discard(raw)
+
+    def connection(self, label=None):
+        """
+        Check out a connection wrapped so close() returns it to the pool.
+        With a label its cursors record timings under that name.
+        """
+        return PooledConnection(self, self.acquire(), label)
+
+    def warm(self):
+        """Open connections until min_size are available."""
+        opened = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size:
+                        break
+                    self._size += 1
+                try:
+                    raw = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                    raise
+                opened.append(raw)
+        finally:
+            now = time.monotonic()
+            with self._cond:
+                self._idle.extend((raw, now) for raw in opened)
+                self._cond.notify_all()
+
+    def close_all(self):
+        """Close every idle connection; checked-out ones close on release."""
+        with self._cond:
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._recycled += len(idle)
+        for raw in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "checked_out": self._checked_out,
+                "waiting": self._waiting,
+                "created": self._created,
+                "recycled": self._recycled,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+
+SUPPORTED_DRIVERS = [
+    "ODBC Driver 18 for SQL Server",
+    "ODBC Driver 17 for SQL Server",
+    "SQL Server Native Client 11.0",
+    "SQL Server",
+]
+
+
+def _load_driver_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_driver_cache(path, key, driver):
+    cache = _load_driver_cache(path)
+    cache[key] = driver
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write ODBC driver cache {path}: {e}")
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Read Replicas
+# ────────────────────────────────────────────────────────────────────────────
+
+def _parse_replica_targets(text, default_database):
+    """"srv-a, srv-b/AmbleRead" -> [("srv-a", default_database), ("srv-b", "AmbleRead")]"""
+    targets = []
+    for part in text.split(","):
+        server, _, database = part.strip().partition("/")
+        if server:
+            targets.append((server, database or default_database))
+    return targets
+
+
+class ReadReplica:
+    """
+    One read-only target with its own pool and circuit breaker, so a replica
+    that is down is skipped without a connect timeout while the primary and
+    the other replicas keep serving.
+    """
+
+    def __init__(self, name, conn_str, connect=None):
+        self.name = name
+        self.breaker = CircuitBreaker(on_open=self._drop_idle_connections)
+        self.pool = ConnectionPool(conn_str, connect=connect, breaker=self.breaker)
+        self.reads = 0
+
+    def _drop_idle_connections(self):
+        self.pool.close_all()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "reads": self.reads,
+            "breaker": self.breaker.stats(),
+            "pool": self.pool.stats(),
+        }
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Stored Procedure Registry
+# ────────────────────────────────────────────────────────────────────────────
+
+class ProcedureUnavailable(Exception):
+    """Raised when a procedure is known to be missing and the call has no fallback."""
+
+
+# Parameter type hint -> (pyodbc SQL type constant name, column size, decimal digits)
+_PARAM_TYPES = {
+    "int": ("SQL_INTEGER", 0, 0),
+    "date": ("SQL_TYPE_DATE", 0, 0),
+    "nvarchar": ("SQL_WVARCHAR", 4000, 0),
+}
+
+# SQL Server error 2812: "Could not find stored procedure"
+_MISSING_PROCEDURE_MARKERS = ("2812", "could not find stored procedure")
+
+
+def _is_missing_procedure(error):
+    text = str(error).lower()
+    return any(marker in text for marker in _MISSING_PROCEDURE_MARKERS)
+
+
+def _is_connection_error(error):
+    """A dropped or unreachable connection rather than a rejected statement (SQLSTATE 08xxx)."""
+    if isinstance(error, (pyodbc.OperationalError, pyodbc.InterfaceError)):
+        return True
+    sqlstate = error.args[0] if getattr(error, "args", None) else None
+    return isinstance(sqlstate, str) and sqlstate.startswith("08")
+
+
+class StoredProcedure:
+    """
+    One registered procedure: pre-built {CALL} strings per arity and the
+    parameter types to bind with, so pyodbc does not re-describe the
+    parameters on every call.
+    """
+
+    def __init__(self, name, param_types=()):
+        schema, _, proc = name.rpartition(".")
+        self.schema = schema or "dbo"
+        self.name = proc
+        self.qualified_name = f"{self.schema}.{self.name}"
+        self.key = self.qualified_name.lower()
+        self.param_types = tuple(param_types)
+        self._calls = {}
+        self._input_sizes = {}
+
+    def call_string(self, arity):
+        call = self._calls.get(arity)
+        if call is None:
+            placeholders = f" ({', '.join('?' * arity)})" if arity else ""
+            call = self._calls[arity] = f"{{CALL {self.schema}.{self.name}{placeholders}}}"
+        return call
+
+    def input_sizes(self, arity):
+        """setinputsizes() list for the first `arity` params, or None when untyped."""
+        if arity not in self._input_sizes:
+            sizes = []
+            for hint in self.param_types[:arity]:
+                spec = _PARAM_TYPES.get(hint)
+                sql_type = getattr(pyodbc, spec[0], None) if spec else None
+                if sql_type is None:
+                    sizes = None
+                    break
+                sizes.append((sql_type, spec[1], spec[2]))
+            self._input_sizes[arity] = sizes if sizes and len(sizes) == arity else None
+        return self._input_sizes[arity]
+
+    def coerce(self, params):
+        """Strings bound to int / date parameters are converted to match the declared type."""
+        values = list(params)
+        for i, hint in enumerate(self.param_types[:len(values)]):
+            if not isinstance(values[i], str):
+                continue
+            if hint == "date":
+                values[i] = date.fromisoformat(values[i][:10])
+            elif hint == "int":
+                values[i] = int(values[i])
+        return tuple(values)
+
+
+class ProcedureRegistry:
+    """
+    Which stored procedures exist, probed from sys.procedures every `ttl`
+    seconds (DB_PROCEDURE_PROBE_TTL).
+
+    - execute() routes a call straight to the procedure, or to its inline SQL
+      fallback when the procedure is known to be missing - no failed round
+      trip per request
+    - When the catalog cannot be read, every procedure is assumed present
+    - A "could not find stored procedure" error re-reads the catalog and
+      marks that procedure missing until the next probe
+    - refresh() forgets the probe result; the next call re-reads the catalog
+    """
+
+    PROBE_SQL = "SELECT SCHEMA_NAME(schema_id), name FROM sys.procedures"
+
+    def __init__(self, procedures=(), ttl=None):
+        self.ttl = config.DB_PROCEDURE_PROBE_TTL if ttl is None else ttl
+        self._procedures = {}
+        self._lock = threading.Lock()
+        self._available = None      # set of "schema.name" keys, None = not probed
+        self._catalog_readable = True
+        self._missing = set()
+        self._expires = 0.0         # time.monotonic() after which the probe is re-read
+        self.probed_at = None
+        self.probes = 0
+        for procedure in procedures:
+            self.register(procedure)
+
+    def register(self, procedure):
+        self._procedures[procedure.key] = procedure
+        return procedure
+
+    def get(self, name):
+        key = name.lower() if "." in name else f"dbo.{name}".lower()
+        return self._procedures[key]
+
+    def probe(self, cursor):
+        """Read the procedure catalog through `cursor` and cache the result."""
+        try:
+            cursor.execute(self.PROBE_SQL)
+            available = {f"{row[0]}.{row[1]}".lower() for row in cursor.fetchall()}
+            readable = True
+        except Exception as e:
+            logger.warning(f"[Procedures] Catalog probe failed, assuming procedures exist: {e}")
+            available = set()
+            readable = False
+
+        with self._lock:
+            self._available = available
+            self._catalog_readable = readable
+            self._missing = set()
+            self._expires = time.monotonic() + self.ttl
+            self.probed_at = datetime.now().isoformat(timespec="seconds")
+            self.probes += 1
+        missing = [p.qualified_name for p in self._procedures.values() if not self._is_available_locked(p.key)]
+        if missing:
+            logger.warning(f"[Procedures] Not deployed, using inline SQL fallbacks: {', '.join(missing)}")
+
+    def _is_available_locked(self, key):
+        if key in self._missing:
+            return False
+        return key in self._available if self._catalog_readable else True
+
+    def is_available(self, name, cursor=None):
+        procedure = self.get(name)
+        if cursor is not None and (self._available is None or time.monotonic() >= self._expires):
+            self.probe(cursor)
+        with self._lock:
+            if self._available is None:
+                return True
+            return self._is_available_locked(procedure.key)
+
+    def mark_missing(self, name):
+        with self._lock:
+            self._missing.add(self.get(name).key)
+
+    def refresh(self):
+        with self._lock:
+            self._available = None
+            self._missing = set()
+            self.probed_at = None
+
+    def execute(self, cursor, name, params=(), fallback=None):
+        """
+        Call procedure `name` on `cursor`.
+
+        fallback: (sql, params) run instead when the procedure is missing.
+        Raises ProcedureUnavailable when it is missing and there is no fallback.
+        """
+        procedure = self.get(name)
+        if self.is_available(name, cursor):
+            arity = len(params)
+            sizes = procedure.input_sizes(arity)
+            if sizes is not None and hasattr(cursor, "setinputsizes"):
+                cursor.setinputsizes(sizes)
+            try:
+                cursor.execute(procedure.call_string(arity), procedure.coerce(params) if arity else ())
+                return
+            except pyodbc.ProgrammingError as e:
+                if not _is_missing_procedure(e):
+                    raise
+            finally:
+                if sizes is not None and hasattr(cursor, "setinputsizes"):
+                    cursor.setinputsizes(None)
+            # The deployment changed under us: re-read the catalog, but trust
+            # the failed call over it for this procedure
+            self.probe(cursor)
+            self.mark_missing(name)
+            logger.warning(f"[Procedures] {procedure.qualified_name} not found, using inline SQL fallback")
+
+        if fallback is None:
+            raise ProcedureUnavailable(f"Stored procedure {procedure.qualified_name} is not deployed")
+        cursor.execute(*fallback)
+
+    def stats(self):
+        with self._lock:
+            probed = self._available is not None
+            return {
+                "probed_at": self.probed_at,
+                "probes": self.probes,
+                "ttl_seconds": self.ttl,
+                "catalog_readable": self._catalog_readable if probed else None,
+                "procedures": {
+                    p.qualified_name: (self._is_available_locked(p.key) if probed else None)
+                    for p in sorted(self._procedures.values(), key=lambda p: p.key)
+                }
+            }
+
+
+def default_procedures():
+    return ProcedureRegistry([
+        StoredProcedure("dbo.usp_GetUserDailyTotals", ("int", "date")),
+        StoredProcedure("dbo.usp_GetRandomMealByDiet", ("nvarchar",)),
+        StoredProcedure("dbo.usp_GetDietPlans"),
+        StoredProcedure("dbo.usp_UpdateUserPreferences", ("int", "nvarchar", "int", "nvarchar")),
+        # Untyped: Description can be longer than the nvarchar(4000) binding
+        StoredProcedure("dbo.sp_UpsertTask"),
+        StoredProcedure("dbo.sp_GetWeeklyPlan", ("int", "date")),
+    ])
+
+
+# Inline equivalent of dbo.usp_GetUserDailyTotals for databases without it
+DAILY_TOTALS_SQL = """
+    SELECT 
+        ISNULL(SUM(m.Calories), 0) AS TotalCalories,
+        ISNULL(SUM(m.ProteinGrams), 0) AS TotalProtein,
+        ISNULL(SUM(m.FatGrams), 0) AS TotalFat,
+        ISNULL(SUM(m.CarbGrams), 0) AS TotalCarbs,
+        COUNT(mp.PlanID) AS MealCount
+    FROM dbo.MealPlans mp
+    INNER JOIN dbo.Meals m ON mp.MealID = m.MealID
+    WHERE mp.UserID = ?
+      AND mp.PlannedDate = CAST(? AS DATE)
+      AND mp.Status IN ('Pending', 'Accepted')
+"""
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Read Coalescing
+# ────────────────────────────────────────────────────────────────────────────
+
+def _coalesced(method):
+    """Concurrent calls with the same arguments share one call (config.SINGLE_FLIGHT_ENABLED)."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not config.SINGLE_FLIGHT_ENABLED:
+            return method(self, *args, **kwargs)
+        key = (name,) + args + tuple(sorted(kwargs.items()))
+        return self.single_flight.do(key, method, self, *args, **kwargs)
+    return wrapper
+
+
+def _replica_read(method):
+    """
+    Read that may run on a replica (_get_connection(read=True)). If the
+    replica connection drops after checkout the method already swallowed
+    the error, so it is run once more, on the primary.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        state = self._read_state
+        outer = (getattr(state, "replica_failed", False), getattr(state, "primary_only", False))
+        state.replica_failed = False
+        try:
+            result = method(self, *args, **kwargs)
+            if not state.replica_failed:
+                return result
+            with self._replica_lock:
+                self.replica_retries += 1
+            state.primary_only = True
+            return method(self, *args, **kwargs)
+        finally:
+            state.replica_failed, state.primary_only = outer
+    return wrapper
+
+
 class DatabaseManager:
     def __init__(self):
-        self.server = 'DESKTOP-G76966Q'
-        self.database = 'Amble'
-        
-        drivers = [
-            "ODBC Driver 18 for SQL Server",
-            "ODBC Driver 17 for SQL Server",
-            "SQL Server Native Client 11.0",
-            "SQL Server",
-        ]
-        
+        self.server = config.DB_SERVER
+        self.database = config.DB_DATABASE
+
+        # Driver resolution is deferred to first use (or warm_up()), so
+        # constructing the manager - and importing routes.py - does no I/O
         self.conn_str = None
-        for driver in drivers:
+        self.driver = None
+        self.pool = None
+        self._init_lock = threading.Lock()
+        self._warmup_thread = None
+        self.totals_store = DailyTotalsStore()
+        self.procedures = default_procedures()
+        self.preference_cache = PreferenceCache()
+        self.single_flight = SingleFlight()
+        self.breaker = CircuitBreaker(on_open=self._drop_idle_connections)
+        self._health_lock = threading.Lock()
+        self._last_health = None        # (monotonic, result)
+        # Read replicas are built on first read (None = not yet, [] = none)
+        self.replicas = None
+        self._replica_lock = threading.Lock()
+        self._next_replica = 0
+        self._recent_writes = {}        # str(user_id) -> monotonic deadline, oldest first
+        self.sticky_reads = 0
+        self.replica_fallbacks = 0
+        self.replica_retries = 0
+        self._read_state = threading.local()
+        self._preference_columns = ("ActiveDietName", "CaloriesGoal", "Allergies")
+
+    def _build_conn_str(self, driver, server=None, database=None, read_only=False):
+        return (
+            f"DRIVER={{{driver}}};"
+            f"SERVER={server or self.server};"
+            f"DATABASE={database or self.database};"
+            "Trusted_Connection=yes;"
+            "Encrypt=no;"
+            + ("ApplicationIntent=ReadOnly;" if read_only else "")
+        )
+
+    def _candidate_drivers(self):
+        """Cached driver first, then the supported drivers actually installed."""
+        try:
+            installed = set(pyodbc.drivers())
+        except Exception:
+            installed = set()
+
+        candidates = [d for d in SUPPORTED_DRIVERS if not installed or d in installed]
+        cached = _load_driver_cache(config.DB_DRIVER_CACHE_PATH).get(self._cache_key())
+        if cached:
+            candidates = [cached] + [d for d in candidates if d != cached]
+        return candidates
+
+    def _cache_key(self):
+        return f"{self.server}|{self.database}"
+
+    def _resolve_driver(self):
+        """
+        Pick the ODBC driver to use.
+
+        Returns (driver, probe_connection). probe_connection is the live
+        connection opened while probing (None when the driver came from an
+        explicit config override) and is handed to the pool rather than closed.
+        """
+        if config.DB_DRIVER:
+            logger.info(f"Using ODBC driver from config: {config.DB_DRIVER}")
+            return config.DB_DRIVER, None
+
+        for driver in self._candidate_drivers():
             try:
-                conn_str = (
-                    f"DRIVER={{{driver}}};"
-                    f"SERVER={self.server};"
-                    f"DATABASE={self.database};"
-                    "Trusted_Connection=yes;"
-                    "Encrypt=no;"
-                )
-                with pyodbc.connect(conn_str, timeout=5) as test_conn:
-                    logger.info(f"Using ODBC driver: {driver}")
-                    self.conn_str = conn_str
-                    break
+                probe = pyodbc.connect(self._build_conn_str(driver), timeout=config.DB_DRIVER_PROBE_TIMEOUT)
             except Exception:
                 continue
-        
-        if not self.conn_str:
-            raise RuntimeError("No working ODBC driver found. Install ODBC Driver 17/18.")
+            logger.info(f"Using ODBC driver: {driver}")
+            _save_driver_cache(config.DB_DRIVER_CACHE_PATH, self._cache_key(), driver)
+            return driver, probe
+
+        raise RuntimeError("No working ODBC driver found. Install ODBC Driver 17/18.")
+
+    def _ensure_pool(self):
+        if self.pool is not None:
+            return self.pool
+        with self._init_lock:
+            if self.pool is None:
+                driver, probe = self._resolve_driver()
+                pool = ConnectionPool(self._build_conn_str(driver), breaker=self.breaker)
+                if probe is not None:
+                    pool.adopt(probe)
+                self.driver = driver
+                self.conn_str = pool.conn_str
+                self.pool = pool
+        return self.pool
+
+    def _replica_driver(self):
+        # The primary's driver when resolved; otherwise picked without a
+        # connection probe, so building replicas never waits on the primary
+        if self.driver:
+            return self.driver
+        if config.DB_DRIVER:
+            return config.DB_DRIVER
+        candidates = self._candidate_drivers()
+        return candidates[0] if candidates else SUPPORTED_DRIVERS[0]
+
+    def _ensure_replicas(self):
+        if self.replicas is not None:
+            return self.replicas
+        driver = self._replica_driver()
+        with self._init_lock:
+            if self.replicas is None:
+                self.replicas = [
+                    ReadReplica(f"{server}/{database}",
+                                self._build_conn_str(driver, server, database, read_only=True))
+                    for server, database in _parse_replica_targets(config.DB_READ_REPLICAS, self.database)
+                ]
+                if self.replicas:
+                    logger.info(f"[Replica] Reads routed to: {', '.join(r.name for r in self.replicas)}")
+        return self.replicas
+
+    def use_connector(self, connect, conn_str="standin"):
+        """
+        Route all connections through `connect(conn_str, timeout=...)` instead
+        of pyodbc, skipping driver discovery. Used by bench/ to run the real
+        app against a local stand-in database. Reads go to the same database
+        until use_replica_connectors() adds stand-in replicas.
+        """
+        with self._init_lock:
+            old_pool = self.pool
+            old_replicas = self.replicas or []
+            self.driver = "stand-in"
+            self.conn_str = conn_str
+            self.pool = ConnectionPool(conn_str, connect=connect, breaker=self.breaker)
+            self.replicas = []
+        if old_pool is not None:
+            old_pool.close_all()
+        for replica in old_replicas:
+            replica.pool.close_all()
+
+    def use_replica_connectors(self, connects):
+        """
+        Read replicas through stand-in `connect` functions, one per replica
+        (the replica counterpart of use_connector()); [] turns replicas off.
+        """
+        replicas = [
+            ReadReplica(f"stand-in-{i}", f"standin-replica-{i}", connect=connect)
+            for i, connect in enumerate(connects, start=1)
+        ]
+        with self._init_lock:
+            old_replicas = self.replicas or []
+            self.replicas = replicas
+        for replica in old_replicas:
+            replica.pool.close_all()
+
+    def refresh_procedures(self):
+        """
+        Re-read which stored procedures are deployed (e.g. after a release
+        adds one). Returns the registry stats, or None if no connection.
+        """
+        self.procedures.refresh()
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            self.procedures.probe(conn.cursor())
+            return self.procedures.stats()
+        finally:
+            conn.close()
+
+    def warm_up(self, background=True):
+        """
+        Resolve the driver and fill the pool to min_size ahead of the first
+        request. With background=True this runs on a daemon thread.
+        """
+        def _run():
+            try:
+                self._ensure_pool().warm()
+                logger.info(f"[Pool] Warm-up complete: {self.pool.stats()}")
+            except Exception as e:
+                logger.warning(f"[Pool] Warm-up failed, connections will open on demand: {e}")
+                return
+            for replica in self._ensure_replicas():
+                try:
+                    replica.pool.warm()
+                except Exception as e:
+                    logger.warning(f"[Replica] Warm-up of {replica.name} failed: {e}")
+
+        if not background:
+            _run()
+            return None
+        if self._warmup_thread is None or not self._warmup_thread.is_alive():
+            self._warmup_thread = threading.Thread(target=_run, name="amble-db-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _user_wrote(self, user_id):
+        # Reads for this user that start from now on must not join a query
+        # that began before the write, nor hit a replica that may not have it yet
+        user = str(user_id)
+        self.single_flight.forget(lambda key: len(key) > 1 and str(key[1]) == user)
+        window = config.DB_READ_YOUR_WRITES_WINDOW
+        if window <= 0:
+            return
+        now = time.monotonic()
+        with self._replica_lock:
+            # Re-inserting keeps the dict in deadline order, so expired users
+            # are always at the front
+            self._recent_writes.pop(user, None)
+            self._recent_writes[user] = now + window
+            while True:
+                oldest = next(iter(self._recent_writes))
+                if self._recent_writes[oldest] > now:
+                    break
+                del self._recent_writes[oldest]
+
+    def _pinned_to_primary(self, user_id):
+        if user_id is None:
+            return False
+        deadline = self._recent_writes.get(str(user_id))
+        return deadline is not None and deadline > time.monotonic()
 
-    def _get_connection(self):
+    def _drop_idle_connections(self):
+        # Idle connections are most likely dead once the breaker opens
+        if self.pool is not None:
+            self.pool.close_all()
+
+    def _ping(self, conn, breaker=None):
+        """SELECT 1 round trip in ms, reported to the (primary's) breaker; None on failure."""
+        breaker = breaker or self.breaker
+        start = time.perf_counter()
         try:
-            return pyodbc.connect(self.conn_str, timeout=10)
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
         except Exception as e:
+            breaker.record_failure(e)
+            return None
+        probe_ms = round((time.perf_counter() - start) * 1000, 3)
+        breaker.record_success(probe_ms)
+        return probe_ms
+
+    def _checkout(self, pool, label):
+        if label is None:
+            return pool.connection()
+        with metrics.db_timer(label, "connect"):
+            return pool.connection(label)
+
+    def _replica_statement_failed(self, replica, error):
+        # Schema differences (a missing procedure, an unknown column) are
+        # ProgrammingErrors the calling method has its own fallback for
+        if not _is_connection_error(error):
+            return
+        # Picked up by _replica_read, which retries the read on the primary
+        logger.warning(f"[Replica] Read on {replica.name} failed, retrying on the primary: {error}")
+        self._read_state.replica_failed = True
+
+    def _replica_connection(self, user_id, label):
+        """A connection to the next healthy replica, or None to read from the primary."""
+        replicas = self.replicas
+        if replicas is None:
+            if not config.DB_READ_REPLICAS:
+                return None
+            try:
+                replicas = self._ensure_replicas()
+            except Exception as e:
+                logger.error(f"Replica setup failed: {e}", exc_info=True)
+                return None
+        if not replicas:
+            return None
+        if getattr(self._read_state, "primary_only", False):
+            return None
+        if self._pinned_to_primary(user_id):
+            with self._replica_lock:
+                self.sticky_reads += 1
+            return None
+
+        with self._replica_lock:
+            start = self._next_replica = (self._next_replica + 1) % len(replicas)
+        for offset in range(len(replicas)):
+            replica = replicas[(start + offset) % len(replicas)]
+            admission = replica.breaker.admit()
+            if admission is None:
+                continue
+            try:
+                conn = self._checkout(replica.pool, label)
+            except Exception as e:
+                logger.warning(f"[Replica] {replica.name} unavailable: {e}")
+                continue
+            if admission == "probe" and self._ping(conn, replica.breaker) is None:
+                conn.invalidate()
+                continue
+            conn._on_error = functools.partial(self._replica_statement_failed, replica)
+            with self._replica_lock:
+                replica.reads += 1
+            return conn
+
+        with self._replica_lock:
+            self.replica_fallbacks += 1
+        logger.debug("No healthy read replica; reading from the primary")
+        return None
+
+    def _get_connection(self, read=False, user_id=None):
+        """
+        A pooled connection to the primary, or with read=True to a read
+        replica unless user_id wrote recently or no replica is healthy.
+        """
+        # Label timings with the calling method; CALL statements are
+        # relabelled with the procedure name by the cursor
+        label = None
+        if config.METRICS_ENABLED or profiling.active:
+            label = sys._getframe(1).f_code.co_name
+        if read:
+            conn = self._replica_connection(user_id, label)
+            if conn is not None:
+                return conn
+
+        admission = self.breaker.admit()
+        if admission is None:
+            # Circuit open: fail in microseconds rather than after the connect timeout
+            logger.debug("Connection skipped: database circuit open")
+            return None
+        try:
+            pool = self._ensure_pool()
+        except Exception as e:
+            self.breaker.record_failure(e)
             logger.error(f"Connection failed: {e}", exc_info=True)
             return None
+        try:
+            conn = self._checkout(pool, label)
+        except Exception as e:
+            logger.error(f"Connection failed: {e}", exc_info=True)
+            return None
+        # The half-open probe must prove the DB answers, not just that a
+        # pooled connection was handed out
+        if admission == "probe" and self._ping(conn) is None:
+            conn.invalidate()
+            return None
+        return conn
+
+    def health_check(self):
+        """
+        Database health for /api/health: a real SELECT 1 probe (reused for
+        DB_HEALTH_PROBE_INTERVAL seconds so load balancer polling stays cheap)
+        plus the circuit breaker's state. While the breaker is open no
+        connection is attempted.
+
+        Returns:
+            dict with healthy, probe_ms and the breaker stats
+        """
+        with self._health_lock:
+            if self._last_health is not None and \
+                    time.monotonic() - self._last_health[0] < config.DB_HEALTH_PROBE_INTERVAL:
+                return dict(self._last_health[1])
+
+            probe_ms = None
+            conn = self._get_connection()
+            if conn:
+                probe_ms = self._ping(conn)
+                if probe_ms is None:
+                    conn.invalidate()
+                else:
+                    conn.close()
+            result = {"healthy": probe_ms is not None, "probe_ms": probe_ms, "breaker": self.breaker.stats()}
+            self._last_health = (time.monotonic(), result)
+            return dict(result)
+
+    def replication_stats(self):
+        """Per-replica reads, breaker and pool, plus primary fallbacks and sticky reads."""
+        now = time.monotonic()
+        with self._replica_lock:
+            pinned = sum(1 for deadline in self._recent_writes.values() if deadline > now)
+            stats = {
+                "read_your_writes_window_s": config.DB_READ_YOUR_WRITES_WINDOW,
+                "pinned_users": pinned,
+                "sticky_reads": self.sticky_reads,
+                "fallbacks": self.replica_fallbacks,
+                "retries": self.replica_retries,
+            }
+        stats["replicas"] = [replica.stats() for replica in self.replicas or []]
+        return stats
 
     # ────────────────────────────────────────────────────────────────────────────
     # NEW: Get Daily Totals for VitalsBar Persistence
     # ────────────────────────────────────────────────────────────────────────────
 
+    @_coalesced
+    @_replica_read
     def get_daily_totals(self, user_id, target_date=None):
         """
         Retrieve aggregated nutritional totals for a user's meal plans for a specific date.
@@ -71,56 +1369,114 @@ class DatabaseManager:
             
         Returns:
             dict with TotalCalories, TotalProtein, TotalFat, TotalCarbs, MealCount, ForDate
-            or None if error
+            or None if error (including a target_date that is not YYYY-MM-DD)
         """
-        conn = self._get_connection()
+        try:
+            # totals_store is keyed on the ISO date, whatever form the caller used
+            for_date = parse_iso_date(target_date, date.today()).isoformat()
+        except (TypeError, ValueError):
+            logger.error(f"Invalid target_date: {target_date!r}")
+            return None
+        cached = self.totals_store.get(user_id, for_date)
+        if cached is not None:
+            return cached
+
+        generation = self.totals_store.generation(user_id, for_date)
+        conn = self._get_connection(read=True, user_id=user_id)
         if not conn:
             return None
         
         try:
             cursor = conn.cursor()
             
-            # Use stored procedure if available, otherwise inline SQL
-            try:
-                if target_date:
-                    cursor.execute("{CALL dbo.usp_GetUserDailyTotals (?, ?)}", (user_id, target_date))
-                else:
-                    cursor.execute("{CALL dbo.usp_GetUserDailyTotals (?)}", (user_id,))
-            except pyodbc.ProgrammingError:
-                # Stored procedure doesn't exist, use inline SQL
-                logger.warning("usp_GetUserDailyTotals not found, using inline SQL")
-                
-                if target_date is None:
-                    target_date = date.today().isoformat()
-                
-                cursor.execute("""
-                    SELECT 
-                        ISNULL(SUM(m.Calories), 0) AS TotalCalories,
-                        ISNULL(SUM(m.ProteinGrams), 0) AS TotalProtein,
-                        ISNULL(SUM(m.FatGrams), 0) AS TotalFat,
-                        ISNULL(SUM(m.CarbGrams), 0) AS TotalCarbs,
-                        COUNT(mp.PlanID) AS MealCount
-                    FROM dbo.MealPlans mp
-                    INNER JOIN dbo.Meals m ON mp.MealID = m.MealID
-                    WHERE mp.UserID = ?
-                      AND mp.PlannedDate = CAST(? AS DATE)
-                      AND mp.Status IN ('Pending', 'Accepted')
-                """, (user_id, target_date))
+            # Stored procedure when deployed, otherwise inline SQL (decided
+            # once by the procedure registry, not per request)
+            self.procedures.execute(
+                cursor, "dbo.usp_GetUserDailyTotals",
+                (user_id, target_date) if target_date else (user_id,),
+                fallback=(DAILY_TOTALS_SQL, (user_id, for_date))
+            )
             
             row = cursor.fetchone()
             if row:
-                return {
+                totals = {
                     "TotalCalories": row[0] or 0,
                     "TotalProtein": row[1] or 0,
                     "TotalFat": row[2] or 0,
                     "TotalCarbs": row[3] or 0,
                     "MealCount": row[4] or 0,
-                    "ForDate": target_date or date.today().isoformat()
+                    "ForDate": for_date
                 }
+                self.totals_store.put(user_id, for_date, totals, generation)
+                return totals
             return None
             
         except Exception as e:
-            logger.error(f"Failed to get daily totals for user {user_id}: {e}", exc_info=True)
+            logger.error(f"Failed to get daily totals for user {user_id}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    @_coalesced
+    def get_daily_totals_range(self, user_id, start_date, end_date):
+        """
+        Daily nutritional totals for every date from start_date to end_date
+        (inclusive date objects). Days without meals are returned as zeros.
+
+        Served from totals_store when every day is cached; otherwise one
+        grouped query covers the whole range and refills the store.
+
+        Returns:
+            list of dicts shaped like get_daily_totals(), in date order, or None if error
+        """
+        dates = date_range(start_date, end_date)
+        cached = self.totals_store.get_range(user_id, dates)
+        if cached is not None:
+            return cached
+
+        generations = {d: self.totals_store.generation(user_id, d) for d in dates}
+        conn = self._get_connection()
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT
+                    mp.PlannedDate,
+                    ISNULL(SUM(m.Calories), 0) AS TotalCalories,
+                    ISNULL(SUM(m.ProteinGrams), 0) AS TotalProtein,
+                    ISNULL(SUM(m.FatGrams), 0) AS TotalFat,
+                    ISNULL(SUM(m.CarbGrams), 0) AS TotalCarbs,
+                    COUNT(mp.PlanID) AS MealCount
+                FROM dbo.MealPlans mp
+                INNER JOIN dbo.Meals m ON mp.MealID = m.MealID
+                WHERE mp.UserID = ?
+                  AND mp.PlannedDate BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+                  AND mp.Status IN ('Pending', 'Accepted')
+                GROUP BY mp.PlannedDate
+            """, (user_id, dates[0], dates[-1]))
+
+            by_date = {}
+            for row in cursor.fetchall():
+                planned = row[0].isoformat()[:10] if hasattr(row[0], "isoformat") else str(row[0])[:10]
+                by_date[planned] = {
+                    "TotalCalories": row[1] or 0,
+                    "TotalProtein": row[2] or 0,
+                    "TotalFat": row[3] or 0,
+                    "TotalCarbs": row[4] or 0,
+                    "MealCount": row[5] or 0,
+                    "ForDate": planned
+                }
+
+            days = []
+            for d in dates:
+                totals = by_date.get(d) or empty_totals(d)
+                self.totals_store.put(user_id, d, totals, generations[d])
+                days.append(totals)
+            return days
+        except Exception as e:
+            logger.error(f"Failed to get totals range for user {user_id}: {e}", exc_info=True)
             return None
         finally:
             conn.close()
@@ -135,8 +1491,8 @@ class DatabaseManager:
             return False
         try:
             cursor = conn.cursor()
-            cursor.execute(
-                "{CALL sp_UpsertTask (?, ?, ?, ?, ?)}",
+            self.procedures.execute(
+                cursor, "dbo.sp_UpsertTask",
                 (task_id, file_path, file_name, description, status)
             )
             conn.commit()
@@ -148,17 +1504,55 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def upsert_tasks(self, tasks):
+        """
+        Upsert many tasks in one transaction (task_queue write-behind flush).
+
+        Args:
+            tasks: list of dicts with task_id, file_path, file_name, description, status
+
+        Returns:
+            True when every task was committed, False (nothing committed) when
+            the database rejected a statement, None when it could not be reached
+        """
+        if not tasks:
+            return True
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            for task in tasks:
+                self.procedures.execute(
+                    cursor, "dbo.sp_UpsertTask",
+                    (task["task_id"], task["file_path"], task["file_name"],
+                     task["description"], task.get("status", "Pending"))
+                )
+            conn.commit()
+            logger.info(f"[Registry] Synced {len(tasks)} task(s) in one batch")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to upsert batch of {len(tasks)} tasks: {e}", exc_info=True)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return None if _is_connection_error(e) else False
+        finally:
+            conn.close()
+
     # ────────────────────────────────────────────────────────────────────────────
     # Meal Management
     # ────────────────────────────────────────────────────────────────────────────
 
+    @_replica_read
     def get_random_meal_by_diet(self, diet_category):
-        conn = self._get_connection()
+        conn = self._get_connection(read=True)
         if not conn:
             return None
         try:
             cursor = conn.cursor()
-            cursor.execute("{CALL dbo.usp_GetRandomMealByDiet (?)}", (diet_category,))
+            self.procedures.execute(cursor, "dbo.usp_GetRandomMealByDiet", (diet_category,))
            
             meal_row = cursor.fetchone()
             if not meal_row:
@@ -194,17 +1588,147 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    @_coalesced
+    def get_meals_by_diet(self, diet_category):
+        """
+        All meals for one diet category with their ingredients, fetched as
+        two result sets in one batch. Feeds /api/meals/suggest/batch when the
+        MealCatalog is unavailable.
+
+        Returns:
+            list of meal dicts shaped like get_random_meal_by_diet(), or None if error
+        """
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SET NOCOUNT ON;
+
+                SELECT m.MealID, m.MealName, m.ImageURL,
+                       m.ProteinGrams, m.FatGrams, m.CarbGrams, m.Calories
+                FROM dbo.Meals m
+                WHERE m.DietCategory = ?;
+
+                SELECT mi.MealID, i.IngredientName, mi.Quantity, i.SmartGroup
+                FROM dbo.MealIngredients mi
+                INNER JOIN dbo.Ingredients i ON mi.IngredientID = i.IngredientID
+                INNER JOIN dbo.Meals m ON mi.MealID = m.MealID
+                WHERE m.DietCategory = ?
+                ORDER BY mi.MealID;
+            """, (diet_category, diet_category))
+
+            meals = {}
+            for row in cursor.fetchall():
+                meals[row[0]] = {
+                    "MealID": row[0],
+                    "MealName": row[1],
+                    "ImageURL": row[2],
+                    "ProteinGrams": row[3],
+                    "FatGrams": row[4],
+                    "CarbGrams": row[5],
+                    "Calories": row[6],
+                    "ingredients": []
+                }
+
+            if cursor.nextset():
+                for row in cursor.fetchall():
+                    meal = meals.get(row[0])
+                    if meal is not None:
+                        meal["ingredients"].append({
+                            "IngredientName": row[1],
+                            "Quantity": row[2],
+                            "SmartGroup": row[3]
+                        })
+
+            return list(meals.values())
+        except Exception as e:
+            logger.error(f"Failed to fetch meals for {diet_category}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    def get_meal_catalog(self):
+        """
+        Bulk-load every meal with its diet category and ingredients.
+
+        Both result sets come back from a single batch so the whole catalog
+        costs one round trip. Used by MealCatalog to serve suggestions locally.
+
+        Returns:
+            list of meal dicts shaped like get_random_meal_by_diet() plus a
+            "DietCategory" key, or None if error
+        """
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SET NOCOUNT ON;
+
+                SELECT m.MealID, m.MealName, m.ImageURL,
+                       m.ProteinGrams, m.FatGrams, m.CarbGrams, m.Calories,
+                       m.DietCategory
+                FROM dbo.Meals m;
+
+                SELECT mi.MealID, i.IngredientName, mi.Quantity, i.SmartGroup
+                FROM dbo.MealIngredients mi
+                INNER JOIN dbo.Ingredients i ON mi.IngredientID = i.IngredientID
+                ORDER BY mi.MealID;
+            """)
+
+            meals = {}
+            for row in cursor.fetchall():
+                meals[row[0]] = {
+                    "MealID": row[0],
+                    "MealName": row[1],
+                    "ImageURL": row[2],
+                    "ProteinGrams": row[3],
+                    "FatGrams": row[4],
+                    "CarbGrams": row[5],
+                    "Calories": row[6],
+                    "DietCategory": row[7],
+                    "ingredients": []
+                }
+
+            if cursor.nextset():
+                for row in cursor.fetchall():
+                    meal = meals.get(row[0])
+                    if meal is not None:
+                        meal["ingredients"].append({
+                            "IngredientName": row[1],
+                            "Quantity": row[2],
+                            "SmartGroup": row[3]
+                        })
+
+            logger.info(f"[Catalog] Loaded {len(meals)} meals")
+            return list(meals.values())
+        except Exception as e:
+            logger.error(f"Failed to load meal catalog: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
     # ────────────────────────────────────────────────────────────────────────────
     # Diet Plans
     # ────────────────────────────────────────────────────────────────────────────
 
-    def get_diet_plans(self):
-        conn = self._get_connection()
+    @_coalesced
+    @_replica_read
+    def get_diet_plans(self, strict=False):
+        """
+        Every diet plan. A failed read returns [] - or None with strict=True,
+        for callers that must tell "no plans" from a database failure.
+        """
+        failed = None if strict else []
+        conn = self._get_connection(read=True)
         if not conn:
-            return []
+            return failed
         try:
             cursor = conn.cursor()
-            cursor.execute("{CALL [dbo].[usp_GetDietPlans]}")
+            self.procedures.execute(cursor, "dbo.usp_GetDietPlans")
            
             columns = [column[0] for column in cursor.description]
             results = []
@@ -214,7 +1738,7 @@ class DatabaseManager:
             return results
         except Exception as e:
             logger.error(f"Failed to fetch diet plans: {e}", exc_info=True)
-            return []
+            return failed
         finally:
             conn.close()
 
@@ -223,14 +1747,18 @@ class DatabaseManager:
     # ────────────────────────────────────────────────────────────────────────────
 
     def update_user_preferences(self, user_id, diet_type, calories_goal, allergies):
+        token = self.preference_cache.begin_write(user_id)
+        written = None
         conn = self._get_connection()
         if not conn:
+            self.preference_cache.commit_write(user_id, None, token)
             return False
         try:
             cursor = conn.cursor()
-            cursor.execute("{CALL dbo.usp_UpdateUserPreferences (?, ?, ?, ?)}",
-                           (user_id, diet_type, calories_goal, allergies))
+            self.procedures.execute(cursor, "dbo.usp_UpdateUserPreferences",
+                                    (user_id, diet_type, calories_goal, allergies))
             conn.commit()
+            written = {"ActiveDietName": diet_type, "CaloriesGoal": calories_goal, "Allergies": allergies}
             logger.info(f"[Profile] Updated preferences for User: {user_id}")
             return True
         except Exception as e:
@@ -238,67 +1766,167 @@ class DatabaseManager:
             return False
         finally:
             conn.close()
+            # Write-through; a failed write leaves the entry dropped (DB state unknown)
+            self.preference_cache.commit_write(user_id, written, token)
+            self._user_wrote(user_id)
 
     def update_user_diet_preference(self, user_id, diet_name):
+        # Keep the user's existing goal and allergies; defaults only for new users
+        current = self.get_user_preference(user_id) or {}
         default_calories = 2500
         default_allergies = ""
         return self.update_user_preferences(
             user_id=user_id,
             diet_type=diet_name,
-            calories_goal=default_calories,
-            allergies=default_allergies
+            calories_goal=current.get("CaloriesGoal") or default_calories,
+            allergies=current.get("Allergies") if current.get("Allergies") is not None else default_allergies
         )
 
+    @_coalesced
+    @_replica_read
     def get_user_preference(self, user_id):
-        conn = self._get_connection()
+        """
+        Active preference for a user, served from preference_cache when possible.
+
+        Returns:
+            {"ActiveDietName": "Keto", "CaloriesGoal": 2500, "Allergies": ""}
+            (goal / allergies only when the table has those columns), or None
+            if the user has no active preference or on error
+        """
+        cached = self.preference_cache.get(user_id)
+        if cached is not MISSING:
+            return cached
+
+        generation = self.preference_cache.generation(user_id)
+        conn = self._get_connection(read=True, user_id=user_id)
         if not conn:
             return None
         try:
             cursor = conn.cursor()
-            # Only select column that actually exists
-            cursor.execute("""
-                SELECT ActiveDietName
-                FROM UserPreferences
-                WHERE UserID = ? AND IsActive = 1
-            """, (user_id,))
-           
+            columns = self._preference_columns
+            try:
+                cursor.execute(f"""
+                    SELECT {", ".join(columns)}
+                    FROM UserPreferences
+                    WHERE UserID = ? AND IsActive = 1
+                """, (user_id,))
+            except pyodbc.ProgrammingError as e:
+                if len(columns) == 1 or "invalid column" not in str(e).lower():
+                    raise
+                # Older schema: only select the column that actually exists
+                logger.warning(f"UserPreferences has no goal columns, reading ActiveDietName only: {e}")
+                columns = self._preference_columns = ("ActiveDietName",)
+                cursor.execute("""
+                    SELECT ActiveDietName
+                    FROM UserPreferences
+                    WHERE UserID = ? AND IsActive = 1
+                """, (user_id,))
+
             row = cursor.fetchone()
-            if row:
-                return {"ActiveDietName": row[0]}
-            return None
+            preference = dict(zip(columns, row)) if row else None
+            self.preference_cache.put(user_id, preference, generation)
+            return dict(preference) if preference else None
         except Exception as e:
             logger.error(f"Failed to get preference for user {user_id}: {e}", exc_info=True)
             return None
         finally:
             conn.close()
 
+    def get_recent_meal_ids(self, user_id, since_date):
+        """
+        Distinct MealIDs the user has planned on or after since_date (date
+        object), or None if error.
+        """
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT MealID
+                FROM dbo.MealPlans
+                WHERE UserID = ? AND PlannedDate >= CAST(? AS DATE)
+            """, (user_id, since_date.isoformat()))
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to get recent meals for user {user_id}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    def get_recommendation_context(self, user_id, since_date):
+        """
+        Active diet, calorie goal (from the preference cache) and recently
+        planned meals.
+
+        Args:
+            user_id: The user's ID
+            since_date: date object; meals planned on or after it count as recent
+
+        Returns:
+            {"ActiveDietName": "Keto" | None, "CaloriesGoal": 2500 | None,
+             "RecentMealIDs": [12, 40, ...]}  or None if error
+        """
+        recent = self.get_recent_meal_ids(user_id, since_date)
+        if recent is None:
+            return None
+        preference = self.get_user_preference(user_id) or {}
+        return {
+            "ActiveDietName": preference.get("ActiveDietName"),
+            "CaloriesGoal": preference.get("CaloriesGoal"),
+            "RecentMealIDs": recent
+        }
+
     # ────────────────────────────────────────────────────────────────────────────
     # Meal Plan Management
     # ────────────────────────────────────────────────────────────────────────────
 
     def insert_meal_plan(self, user_id, meal_id, planned_date, meal_time='Lunch'):
-        conn = self._get_connection()
-        if not conn:
-            return False
-
         if isinstance(planned_date, (date, datetime)):
             planned_date_str = planned_date.isoformat()[:10]
-        elif isinstance(planned_date, str):
-            planned_date_str = planned_date
+        elif isinstance(planned_date, str) and planned_date:
+            # Normalized so the totals_store key is the day SQL Server stores
+            try:
+                planned_date_str = parse_iso_date(planned_date).isoformat()
+            except ValueError:
+                logger.error(f"Invalid planned_date: {planned_date!r}")
+                return False
         else:
             logger.error(f"Invalid planned_date type: {type(planned_date)}")
             return False
 
+        conn = self._get_connection()
+        if not conn:
+            return False
+
         try:
             cursor = conn.cursor()
             # FIXED: Use 'Pending' instead of 'Planned' to match CHECK constraint
+            # The meal's macros come back in the same batch so the running
+            # daily totals can be updated without re-aggregating
             cursor.execute("""
+                SET NOCOUNT ON;
+
                 INSERT INTO MealPlans 
                     (UserID, MealID, PlannedDate, MealTime, Status)
-                VALUES (?, ?, CAST(? AS DATE), ?, 'Pending')
-            """, (user_id, meal_id, planned_date_str, meal_time))
+                VALUES (?, ?, CAST(? AS DATE), ?, 'Pending');
+
+                SELECT Calories, ProteinGrams, FatGrams, CarbGrams
+                FROM dbo.Meals
+                WHERE MealID = ?;
+            """, (user_id, meal_id, planned_date_str, meal_time, meal_id))
+            macros = cursor.fetchone()
             
             conn.commit()
+
+            if macros:
+                self.totals_store.apply_delta(
+                    user_id, planned_date_str,
+                    calories=macros[0], protein=macros[1], fat=macros[2], carbs=macros[3], meals=1
+                )
+            else:
+                self.totals_store.invalidate(user_id, planned_date_str)
+            self._user_wrote(user_id)
             logger.info(f"Meal plan added | user={user_id} meal={meal_id} date={planned_date_str}")
             return True
         except pyodbc.Error as e:
@@ -311,13 +1939,389 @@ class DatabaseManager:
             conn.close()
 
 
+    def insert_meal_plans_bulk(self, plans, atomic=True):
+        """
+        Insert many MealPlans rows on one connection in one transaction.
+
+        Args:
+            plans: iterable of dicts with user_id, meal_id, planned_date and
+                   optional meal_time (default 'Lunch')
+            atomic: True  -> all-or-nothing; any invalid or failing row rolls back everything
+                    False -> insert every valid row, report the rest per row
+
+        Returns:
+            dict {"inserted", "failed", "committed", "results": [{"index", "status", "error"?}]}
+            or None if no connection could be opened
+        """
+        results = []
+        rows = []
+        row_indexes = []
+        parsed_dates = {}
+
+        for index, plan in enumerate(plans):
+            planned_date = plan.get("planned_date")
+            if isinstance(planned_date, datetime):
+                planned_date = planned_date.date()
+
+            # Parse each distinct date once - a week import repeats seven of them
+            key = planned_date if isinstance(planned_date, (str, date)) and planned_date else None
+            if key is not None and key not in parsed_dates:
+                try:
+                    parsed_dates[key] = (
+                        key.isoformat() if isinstance(key, date) else parse_iso_date(key).isoformat()
+                    )
+                except ValueError:
+                    parsed_dates[key] = None
+            planned_date_str = parsed_dates.get(key)
+
+            if not plan.get("user_id") or not plan.get("meal_id"):
+                results.append({"index": index, "status": "invalid", "error": "Missing user_id or meal_id"})
+            elif planned_date_str is None:
+                results.append({"index": index, "status": "invalid", "error": f"Invalid planned_date: {planned_date!r}"})
+            else:
+                results.append({"index": index, "status": "pending"})
+                rows.append((plan["user_id"], plan["meal_id"], planned_date_str, plan.get("meal_time") or "Lunch"))
+                row_indexes.append(index)
+
+        invalid = len(results) - len(rows)
+        if atomic and invalid:
+            for result in results:
+                if result["status"] == "pending":
+                    result["status"] = "skipped"
+            return {"inserted": 0, "failed": invalid, "committed": False, "results": results}
+
+        if not rows:
+            return {"inserted": 0, "failed": invalid, "committed": False, "results": results}
+
+        conn = self._get_connection()
+        if not conn:
+            return None
+
+        sql = """
+            INSERT INTO MealPlans
+                (UserID, MealID, PlannedDate, MealTime, Status)
+            VALUES (?, ?, CAST(? AS DATE), ?, 'Pending')
+        """
+        batch_size = config.MEAL_PLAN_BULK_BATCH_SIZE
+        try:
+            cursor = conn.cursor()
+            cursor.fast_executemany = True
+            try:
+                for start in range(0, len(rows), batch_size):
+                    cursor.executemany(sql, rows[start:start + batch_size])
+                failed_rows = {}
+            except pyodbc.Error as e:
+                conn.rollback()
+                if atomic:
+                    logger.error(f"Bulk meal plan insert rolled back: {e}", exc_info=True)
+                    for result in results:
+                        if result["status"] == "pending":
+                            result["status"] = "failed"
+                            result["error"] = str(e)
+                    return {"inserted": 0, "failed": len(results), "committed": False, "results": results}
+
+                # Best effort: find the offending rows one at a time, keep the rest
+                logger.warning(f"Bulk meal plan insert failed, retrying row by row: {e}")
+                cursor = conn.cursor()
+                failed_rows = {}
+                for position, row in enumerate(rows):
+                    try:
+                        cursor.execute(sql, row)
+                    except pyodbc.Error as row_error:
+                        failed_rows[position] = str(row_error)
+
+            conn.commit()
+
+            for user_id, _, planned_date_str, _ in rows:
+                self.totals_store.invalidate(user_id, planned_date_str)
+                self._user_wrote(user_id)
+
+            for position, index in enumerate(row_indexes):
+                if position in failed_rows:
+                    results[index]["status"] = "failed"
+                    results[index]["error"] = failed_rows[position]
+                else:
+                    results[index]["status"] = "inserted"
+
+            inserted = len(rows) - len(failed_rows)
+            logger.info(f"Bulk meal plans added | rows={inserted} failed={len(failed_rows) + invalid}")
+            return {
+                "inserted": inserted,
+                "failed": len(failed_rows) + invalid,
+                "committed": True,
+                "results": results
+            }
+        except Exception as e:
+            logger.error(f"Unexpected error in bulk meal plan insert: {e}", exc_info=True)
+            for result in results:
+                if result["status"] == "pending":
+                    result["status"] = "failed"
+                    result["error"] = "Transaction rolled back"
+            return {"inserted": 0, "failed": len(results), "committed": False, "results": results}
+        finally:
+            conn.close()
+
+    def update_meal_plan_status(self, plan_id, status):
+        """
+        Change a MealPlans row's Status and adjust the running daily totals
+        when it moves into or out of the counted statuses (Pending/Accepted).
+
+        Returns:
+            dict with PlanID, UserID, PlannedDate, OldStatus, Status; False if
+            no plan has that id; None if the status is not one of
+            MEAL_PLAN_STATUSES or the update failed
+        """
+        if status not in MEAL_PLAN_STATUSES:
+            logger.error(f"Invalid meal plan status: {status!r}")
+            return None
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE mp
+                SET mp.Status = ?
+                OUTPUT deleted.Status, inserted.Status, inserted.UserID, inserted.PlannedDate,
+                       m.Calories, m.ProteinGrams, m.FatGrams, m.CarbGrams
+                FROM dbo.MealPlans mp
+                INNER JOIN dbo.Meals m ON mp.MealID = m.MealID
+                WHERE mp.PlanID = ?
+            """, (status, plan_id))
+            row = cursor.fetchone()
+            if not row:
+                return False
+            conn.commit()
+
+            old_status, new_status, user_id, planned = row[0], row[1], row[2], row[3]
+            planned_str = planned.isoformat()[:10] if hasattr(planned, "isoformat") else str(planned)[:10]
+            was_counted = old_status in COUNTED_STATUSES
+            is_counted = new_status in COUNTED_STATUSES
+            if was_counted != is_counted:
+                sign = 1 if is_counted else -1
+                self.totals_store.apply_delta(
+                    user_id, planned_str,
+                    calories=sign * (row[4] or 0), protein=sign * (row[5] or 0),
+                    fat=sign * (row[6] or 0), carbs=sign * (row[7] or 0), meals=sign
+                )
+            self._user_wrote(user_id)
+
+            logger.info(f"Meal plan status | plan={plan_id} {old_status} -> {new_status}")
+            return {
+                "PlanID": plan_id,
+                "UserID": user_id,
+                "PlannedDate": planned_str,
+                "OldStatus": old_status,
+                "Status": new_status
+            }
+        except pyodbc.Error as e:
+            logger.error(f"SQL Error updating meal plan {plan_id} status: {e}", exc_info=True)
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    @_coalesced
+    def get_weekly_plan(self, user_id, start_date):
+        """
+        Every planned meal for the 7 days starting at start_date, with macros
+        and ingredients, from a single dbo.sp_GetWeeklyPlan call.
+
+        Args:
+            user_id: The user's ID
+            start_date: date object for the first day of the week
+
+        Returns:
+            {
+              "UserID": 2, "StartDate": "...", "EndDate": "...",
+              "Days": [ { "PlannedDate": "...", "Meals": [ {...,"ingredients": [...]} ],
+                          "Totals": { "TotalCalories": ..., "MealCount": ... } } ]
+            }
+            or None if error
+        """
+        dates = date_range(start_date, start_date + timedelta(days=6))
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            self.procedures.execute(cursor, "dbo.sp_GetWeeklyPlan", (user_id, dates[0]))
+
+            days = {d: {"PlannedDate": d, "Meals": [], "Totals": empty_totals(d)} for d in dates}
+            ingredients_by_meal = {}
+
+            for row in cursor.fetchall():
+                planned = row[1].isoformat()[:10] if hasattr(row[1], "isoformat") else str(row[1])[:10]
+                day = days.get(planned)
+                if day is None:
+                    continue
+                meal_ingredients = ingredients_by_meal.setdefault(row[4], [])
+                day["Meals"].append({
+                    "PlanID": row[0],
+                    "MealTime": row[2],
+                    "Status": row[3],
+                    "MealID": row[4],
+                    "MealName": row[5],
+                    "ImageURL": row[6],
+                    "Calories": row[7],
+                    "ProteinGrams": row[8],
+                    "FatGrams": row[9],
+                    "CarbGrams": row[10],
+                    "ingredients": meal_ingredients
+                })
+                if row[3] in COUNTED_STATUSES:
+                    totals = day["Totals"]
+                    totals["TotalCalories"] += row[7] or 0
+                    totals["TotalProtein"] += row[8] or 0
+                    totals["TotalFat"] += row[9] or 0
+                    totals["TotalCarbs"] += row[10] or 0
+                    totals["MealCount"] += 1
+
+            # Meals planned more than once share one ingredient list
+            if cursor.nextset():
+                for row in cursor.fetchall():
+                    meal_ingredients = ingredients_by_meal.get(row[0])
+                    if meal_ingredients is not None:
+                        meal_ingredients.append({
+                            "IngredientName": row[1],
+                            "Quantity": row[2],
+                            "SmartGroup": row[3]
+                        })
+
+            return {
+                "UserID": user_id,
+                "StartDate": dates[0],
+                "EndDate": dates[-1],
+                "Days": [days[d] for d in dates]
+            }
+        except Exception as e:
+            logger.error(f"Failed to get weekly plan for user {user_id}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    @_coalesced
+    def get_planned_ingredients(self, user_id, start_date, end_date):
+        """
+        Ingredient rows for every counted meal plan in a date range, one row
+        per plan and ingredient (a meal planned twice contributes twice).
+
+        Returns:
+            list of (IngredientName, Quantity, SmartGroup, MealID) tuples, or None if error
+        """
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT i.IngredientName, mi.Quantity, i.SmartGroup, mp.MealID
+                FROM dbo.MealPlans mp
+                INNER JOIN dbo.MealIngredients mi ON mp.MealID = mi.MealID
+                INNER JOIN dbo.Ingredients i ON mi.IngredientID = i.IngredientID
+                WHERE mp.UserID = ?
+                  AND mp.PlannedDate BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+                  AND mp.Status IN ('Pending', 'Accepted')
+            """, (user_id, start_date.isoformat(), end_date.isoformat()))
+            return [tuple(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to get planned ingredients for user {user_id}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    @_coalesced
+    def get_meal_plan_version(self, user_id, start_date, end_date):
+        """
+        Fingerprint of the counted (Pending / Accepted) meal plans in a date
+        range: changes whenever a plan is added, removed or changes status,
+        whichever worker wrote it. Used to validate cached grocery lists.
+
+        Returns:
+            (count, sum of PlanIDs, sum of squared PlanIDs) tuple, or None if error
+        """
+        conn = self._get_connection()
+        if not conn:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*),
+                       ISNULL(SUM(CAST(mp.PlanID AS BIGINT)), 0),
+                       ISNULL(SUM(CAST(mp.PlanID AS BIGINT) * mp.PlanID), 0)
+                FROM dbo.MealPlans mp
+                WHERE mp.UserID = ?
+                  AND mp.PlannedDate BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+                  AND mp.Status IN ('Pending', 'Accepted')
+            """, (user_id, start_date.isoformat(), end_date.isoformat()))
+            row = cursor.fetchone()
+            return tuple(row) if row else (0, 0, 0)
+        except Exception as e:
+            logger.error(f"Failed to get meal plan version for user {user_id}: {e}", exc_info=True)
+            return None
+        finally:
+            conn.close()
+
+    def iter_meal_plan_history(self, user_id, start_date=None, end_date=None, batch_size=None):
+        """
+        Stream a user's meal-plan history (every status) joined with the
+        meal's macros, oldest first, without loading it all into memory.
+
+        A generator: the first item is the column name list (or None if the
+        connection or query failed), then lists of row tuples of up to
+        batch_size rows each. The pooled connection is held until the
+        generator is exhausted or closed.
+        """
+        batch_size = batch_size or config.EXPORT_FETCH_BATCH_SIZE
+        conn = self._get_connection()
+        if not conn:
+            yield None
+            return
+        try:
+            cursor = conn.cursor()
+            where = ["mp.UserID = ?"]
+            params = [user_id]
+            if start_date is not None:
+                where.append("mp.PlannedDate >= CAST(? AS DATE)")
+                params.append(start_date.isoformat())
+            if end_date is not None:
+                where.append("mp.PlannedDate <= CAST(? AS DATE)")
+                params.append(end_date.isoformat())
+            try:
+                cursor.execute(f"""
+                    SELECT mp.PlanID, mp.PlannedDate, mp.MealTime, mp.Status,
+                           mp.MealID, m.MealName, m.DietCategory,
+                           m.Calories, m.ProteinGrams, m.FatGrams, m.CarbGrams
+                    FROM dbo.MealPlans mp
+                    INNER JOIN dbo.Meals m ON mp.MealID = m.MealID
+                    WHERE {" AND ".join(where)}
+                    ORDER BY mp.PlannedDate, mp.PlanID
+                """, params)
+                columns = [column[0] for column in cursor.description]
+            except Exception as e:
+                logger.error(f"Failed to start meal plan export for user {user_id}: {e}", exc_info=True)
+                yield None
+                return
+
+            yield columns
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
+        finally:
+            conn.close()
+
 # ────────────────────────────────────────────────────────────────────────────
 # Self-Test
 # ────────────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     try:
         db = DatabaseManager()
-        print("DatabaseManager initialized successfully")
+        db.warm_up(background=False)
+        print(f"DatabaseManager initialized successfully (driver: {db.driver})")
         
         # Show available methods
         print("Available methods:", [m for m in dir(db) if callable(getattr(db, m)) and not m.startswith('_')])
@@ -331,6 +2335,9 @@ if __name__ == "__main__":
         print("\n=== Testing get_user_preference ===")
         pref = db.get_user_preference(2)
         print(f"User 2 preference: {pref}")
+
+        print("\n=== Connection pool ===")
+        print(f"Pool stats: {db.pool.stats()}")
         
     except Exception as e:
         logger.error("Test block failed", exc_info=True)
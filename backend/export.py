@@ -0,0 +1,68 @@
+"""
+File: export.py
+Version: 1.0.0
+
+Description:
+- Chunk encoders for GET /api/meal-plans/export/<user_id>
+- Each fetchmany batch from DatabaseManager.iter_meal_plan_history() becomes
+  one NDJSON or CSV chunk, so memory stays flat however long the history is
+- gzip_chunks() compresses on the fly and sync-flushes every chunk so the
+  client keeps receiving data as rows are fetched
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+import config
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, (_value(v) for v in row))), separators=(",", ":")) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows([_value(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only: nothing was yielded yet
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_chunks(fmt, columns, batches):
+    return ndjson_chunks(columns, batches) if fmt == "ndjson" else csv_chunks(columns, batches)
+
+
+def gzip_chunks(chunks, level=None):
+    """gzip-encode a byte stream chunk by chunk (Content-Encoding: gzip)."""
+    compressor = zlib.compressobj(config.EXPORT_GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,207 @@
+"""
+File: grocery.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- GroceryListCache entries are checked against a version read from the
+  database (DatabaseManager.get_meal_plan_version), not a per-process write
+  counter, so a plan written on another worker retires them too
+
+Description:
+- Server-side grocery list: parses free-text ingredient Quantity values
+  ("1 1/2 cups", "200g", "2 cloves"), converts them to canonical units,
+  sums duplicates and groups the result by SmartGroup
+- GroceryListCache keeps built lists per user/date range until the
+  counted meal plans in that range change
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+# unit alias -> (dimension, factor to the canonical unit)
+# mass → grams, volume → millilitres, everything else is counted by its own name
+_UNITS = {
+    "g": ("mass", 1.0), "gram": ("mass", 1.0), "grams": ("mass", 1.0), "gr": ("mass", 1.0),
+    "kg": ("mass", 1000.0), "kilogram": ("mass", 1000.0), "kilograms": ("mass", 1000.0),
+    "mg": ("mass", 0.001),
+    "oz": ("mass", 28.3495), "ounce": ("mass", 28.3495), "ounces": ("mass", 28.3495),
+    "lb": ("mass", 453.592), "lbs": ("mass", 453.592), "pound": ("mass", 453.592), "pounds": ("mass", 453.592),
+    "ml": ("volume", 1.0), "milliliter": ("volume", 1.0), "milliliters": ("volume", 1.0),
+    "millilitre": ("volume", 1.0), "millilitres": ("volume", 1.0),
+    "l": ("volume", 1000.0), "liter": ("volume", 1000.0), "liters": ("volume", 1000.0),
+    "litre": ("volume", 1000.0), "litres": ("volume", 1000.0),
+    "tsp": ("volume", 4.92892), "teaspoon": ("volume", 4.92892), "teaspoons": ("volume", 4.92892),
+    "tbsp": ("volume", 14.7868), "tablespoon": ("volume", 14.7868), "tablespoons": ("volume", 14.7868),
+    "cup": ("volume", 236.588), "cups": ("volume", 236.588),
+    "fl oz": ("volume", 29.5735), "floz": ("volume", 29.5735),
+    "pint": ("volume", 473.176), "pints": ("volume", 473.176),
+}
+
+# Plural count units collapse onto one name ("2 cloves" + "1 clove" = "3 clove")
+_COUNT_SINGULAR = {
+    "cloves": "clove", "slices": "slice", "pieces": "piece", "pcs": "piece", "pc": "piece",
+    "cans": "can", "eggs": "egg", "leaves": "leaf", "sprigs": "sprig", "stalks": "stalk",
+    "bunches": "bunch", "heads": "head", "fillets": "fillet", "breasts": "breast",
+}
+
+_COUNT_UNITS = set(_COUNT_SINGULAR) | set(_COUNT_SINGULAR.values())
+
+_VULGAR_FRACTIONS = {"½": 0.5, "⅓": 1 / 3, "⅔": 2 / 3, "¼": 0.25, "¾": 0.75, "⅛": 0.125}
+
+_QUANTITY_RE = re.compile(
+    r"^\s*(?P<amount>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)\s*(?P<unit>fl\.?\s*oz|[a-zA-Z]+)?\.?\s*(?P<rest>.*)$"
+)
+
+
+def _parse_amount(text):
+    parts = text.split()
+    if len(parts) == 2:
+        return float(parts[0]) + _parse_amount(parts[1])
+    if "/" in text:
+        numerator, denominator = text.split("/")
+        return float(numerator) / float(denominator)
+    return float(text)
+
+
+def parse_quantity(quantity):
+    """
+    Parse a Quantity string into (amount, dimension, unit).
+
+    Returns amounts in canonical units: ("mass", "g"), ("volume", "ml") or
+    ("count", <unit name or "">). Returns None when the text has no leading
+    number (e.g. "to taste", "a pinch").
+    """
+    if quantity is None:
+        return None
+    if isinstance(quantity, (int, float)):
+        return float(quantity), "count", ""
+
+    text = str(quantity).strip()
+    for symbol, value in _VULGAR_FRACTIONS.items():
+        # "1½" / "1 ½" → "1.5"
+        text = re.sub(rf"(\d*)\s*{symbol}", lambda m: str((int(m.group(1)) if m.group(1) else 0) + value), text)
+
+    match = _QUANTITY_RE.match(text)
+    if not match:
+        return None
+    amount = _parse_amount(match.group("amount"))
+    unit = (match.group("unit") or "").lower().replace(".", "")
+    unit = re.sub(r"\s+", " ", unit)
+
+    if unit in _UNITS:
+        dimension, factor = _UNITS[unit]
+        return amount * factor, dimension, "g" if dimension == "mass" else "ml"
+    if unit in _COUNT_UNITS:
+        return amount, "count", _COUNT_SINGULAR.get(unit, unit)
+    # "2 large", "3 ripe" - a plain count of the ingredient itself
+    return amount, "count", ""
+
+
+def format_amount(amount, dimension, unit):
+    """Human-readable canonical amount, e.g. 1500 g → "1.5 kg"."""
+    if dimension == "mass" and amount >= 1000:
+        amount, unit = amount / 1000, "kg"
+    elif dimension == "volume" and amount >= 1000:
+        amount, unit = amount / 1000, "l"
+    rounded = round(amount, 2)
+    number = f"{rounded:g}"
+    return f"{number} {unit}".strip()
+
+
+def build_grocery_list(rows):
+    """
+    Aggregate ingredient rows into grouped, summed grocery items.
+
+    Args:
+        rows: iterable of (IngredientName, Quantity, SmartGroup, MealID)
+
+    Returns:
+        list of {"SmartGroup", "Items": [{"IngredientName", "Quantity", "Amount",
+        "Unit", "MealCount", "Unparsed"}]} sorted by group and ingredient name.
+        Quantities in different dimensions (e.g. "2 cups" and "100 g") stay
+        separate items; text that cannot be parsed is listed under Unparsed.
+    """
+    items = {}
+    for name, quantity, group, meal_id in rows:
+        group = group or "Other"
+        parsed = parse_quantity(quantity)
+        if parsed is None:
+            key = (group, name.lower(), None, None)
+        else:
+            key = (group, name.lower(), parsed[1], parsed[2])
+
+        item = items.get(key)
+        if item is None:
+            item = items[key] = {
+                "SmartGroup": group,
+                "IngredientName": name,
+                "Amount": 0.0 if parsed else None,
+                "Dimension": parsed[1] if parsed else None,
+                "Unit": parsed[2] if parsed else None,
+                "Meals": set(),
+                "Unparsed": []
+            }
+        if parsed:
+            item["Amount"] += parsed[0]
+        elif quantity:
+            item["Unparsed"].append(str(quantity))
+        item["Meals"].add(meal_id)
+
+    groups = {}
+    for key in sorted(items, key=lambda k: (k[0].lower(), k[1], k[2] or "", k[3] or "")):
+        item = items[key]
+        if item["Amount"] is not None:
+            quantity = format_amount(item["Amount"], item["Dimension"], item["Unit"])
+            amount = round(item["Amount"], 2)
+        else:
+            quantity = ", ".join(item["Unparsed"])
+            amount = None
+        groups.setdefault(item["SmartGroup"], []).append({
+            "IngredientName": item["IngredientName"],
+            "SmartGroup": item["SmartGroup"],
+            "Quantity": quantity,
+            "Amount": amount,
+            "Unit": item["Unit"],
+            "MealCount": len(item["Meals"]),
+            "Unparsed": item["Unparsed"] if item["Amount"] is not None else []
+        })
+
+    return [{"SmartGroup": group, "Items": group_items} for group, group_items in groups.items()]
+
+
+class GroceryListCache:
+    """
+    Built grocery lists keyed by (user, from, to).
+
+    Each entry remembers the range's meal-plan version (a fingerprint read
+    from the database) at build time; once the plans change, the version no
+    longer matches and the entry is rebuilt. ttl bounds staleness from
+    changes the fingerprint cannot see (e.g. a meal's ingredients edited).
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = config.GROCERY_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = config.GROCERY_CACHE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (version, stored_at, payload)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version or time.monotonic() - entry[1] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, version, payload):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,175 @@
+"""
+File: http_cache.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- VersionRegistry also records a last-modified time per key
+- ADDED: last_modified() decorator for If-Modified-Since / 304
+
+Description:
+- Conditional GET support for the read blueprints in routes.py
+- ETags are either version-based (a counter bumped by our own write routes)
+  or a hash of the response body
+- A matching If-None-Match on a version-based route returns 304 before the
+  view runs, so the database is not touched at all
+- Per-route Cache-Control policies
+"""
+import functools
+import hashlib
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Response, make_response, request
+
+import config
+
+# Changes on every process start so ETags from a previous run never match
+# counters that restarted at zero
+_EPOCH = uuid.uuid4().hex[:8]
+
+# Anything written before this process started is treated as modified now
+_STARTED_AT = math.ceil(time.time())
+
+
+class VersionRegistry:
+    """Thread-safe counters, one per cached resource (e.g. ("preference", 2))."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._modified = {}
+
+    def get(self, key):
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def bump(self, key):
+        with self._lock:
+            version = self._versions.get(key, 0) + 1
+            self._versions[key] = version
+            # HTTP dates have whole-second precision, so give every write its
+            # own second; two writes in one second would otherwise share a
+            # Last-Modified and the second one could be answered with a 304
+            previous = self._modified.get(key, _STARTED_AT)
+            self._modified[key] = max(math.ceil(time.time()), previous + 1)
+            return version
+
+    def modified_at(self, key):
+        """Epoch seconds of the last bump (process start if never bumped)."""
+        with self._lock:
+            return self._modified.get(key, _STARTED_AT)
+
+
+versions = VersionRegistry()
+
+
+def user_key(kind, user_id):
+    """Registry key for a per-user resource; JSON bodies may send "2" or 2."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        pass
+    return (kind, user_id)
+
+
+def _etag_matches(etag):
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _not_modified(etag, cache_control):
+    response = Response(status=304)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def conditional(cache_control, version_key=None, vary=None):
+    """
+    Decorate a GET view with ETag / If-None-Match / Cache-Control handling.
+
+    cache_control: Cache-Control header value for this route
+    version_key:   callable(**view_args) -> VersionRegistry key. When given,
+                   the ETag comes from the version counter and a match skips
+                   the view entirely. Only safe while every write to the
+                   resource goes through this process (see
+                   config.HTTP_CACHE_VERSIONED_ETAGS).
+    vary:          callable(**view_args) -> str mixed into a version ETag for
+                   inputs outside the counter (e.g. the requested date)
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not config.HTTP_CACHE_ENABLED:
+                return view(*args, **kwargs)
+
+            version_etag = None
+            if version_key is not None and config.HTTP_CACHE_VERSIONED_ETAGS:
+                key = version_key(**kwargs)
+                parts = [_EPOCH, repr(key), str(versions.get(key))]
+                if vary is not None:
+                    parts.append(str(vary(**kwargs)))
+                digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+                version_etag = f'"v-{digest}"'
+                if _etag_matches(version_etag):
+                    return _not_modified(version_etag, cache_control)
+
+            rv = view(*args, **kwargs)
+            response = make_response(rv)
+            if response.status_code != 200 or "no-store" in response.headers.get("Cache-Control", ""):
+                return response
+
+            if version_etag is not None:
+                etag = version_etag
+            else:
+                digest = hashlib.sha1(response.get_data()).hexdigest()[:20]
+                etag = f'"h-{digest}"'
+
+            if _etag_matches(etag):
+                return _not_modified(etag, cache_control)
+
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = cache_control
+            return response
+
+        return wrapper
+    return decorator
+
+
+def last_modified(cache_control, version_key):
+    """
+    Decorate a GET view with Last-Modified / If-Modified-Since handling.
+
+    version_key(**view_args) names the VersionRegistry entry whose bumps mark
+    the resource as changed. A request whose If-Modified-Since is at or after
+    that time gets a 304 without running the view. Like version ETags this
+    assumes writes go through this process (config.HTTP_CACHE_VERSIONED_ETAGS).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not (config.HTTP_CACHE_ENABLED and config.HTTP_CACHE_VERSIONED_ETAGS):
+                return view(*args, **kwargs)
+
+            modified = versions.modified_at(version_key(**kwargs))
+            since = request.if_modified_since
+            if since is not None and modified <= since.timestamp() and "If-None-Match" not in request.headers:
+                response = Response(status=304)
+                response.headers["Cache-Control"] = cache_control
+                response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+                response.headers["Cache-Control"] = cache_control
+            return response
+
+        return wrapper
+    return decorator
@@ -0,0 +1,177 @@
+"""
+File: load_control.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- AdmissionGate holds the slot of a streamed response until the body has
+  been sent (response.call_on_close) instead of releasing it at teardown,
+  which runs before the body is consumed. Streamed exports keep a pooled
+  connection open, so they now count against ADMISSION_MAX_CONCURRENT
+
+Description:
+- SingleFlight: concurrent identical DatabaseManager reads share one
+  in-flight call instead of each borrowing a connection and running the
+  same query. Writers forget matching in-flight keys so a read that starts
+  after a write never joins a flight that started before it
+- AdmissionGate: caps concurrent DB-bound requests per process. Past the
+  cap a request waits at most ADMISSION_QUEUE_WAIT, then gets a fast 503
+  with Retry-After instead of queuing behind the 10 s pool checkout timeout
+- exempt() marks views that never touch the DB (health, in-memory reads)
+"""
+import copy
+import threading
+
+from flask import g, jsonify, request, current_app
+
+import config
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    key -> in-flight call. The first caller (leader) runs fn; callers that
+    arrive while it runs wait and receive a deep copy of its result (or its
+    exception), so no caller can mutate another's data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                flight.followers += 1
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = fn(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                shared = flight.followers > 0
+            flight.done.set()
+        # Followers copy from flight.result, so the leader's caller gets its own copy too
+        return copy.deepcopy(flight.result) if shared else flight.result
+
+    def forget(self, match):
+        """
+        Detach in-flight calls whose key satisfies match(key). Callers
+        already waiting still get that result; new callers start a fresh call.
+        """
+        with self._lock:
+            for key in [k for k in self._flights if match(k)]:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            calls = self.leaders + self.shared
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "shared_rate": round(self.shared / calls, 3) if calls else None,
+            }
+
+
+class AdmissionGate:
+    """Counting gate in front of DB-bound requests (limit 0 = unlimited)."""
+
+    def __init__(self, limit=None, wait=None, retry_after=None):
+        self.limit = config.ADMISSION_MAX_CONCURRENT if limit is None else limit
+        self.wait = config.ADMISSION_QUEUE_WAIT if wait is None else wait
+        self.retry_after = config.ADMISSION_RETRY_AFTER if retry_after is None else retry_after
+        self._slots = threading.BoundedSemaphore(self.limit) if self.limit > 0 else None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_enter(self):
+        if self._slots is not None and not self._slots.acquire(timeout=self.wait):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.active += 1
+            self.admitted += 1
+        return True
+
+    def leave(self):
+        with self._lock:
+            self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def _before_request(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if view is None or getattr(view, "_admission_exempt", False) or request.method == "OPTIONS":
+            return None
+        if not self.try_enter():
+            response = jsonify({"error": "Server busy, retry shortly"})
+            response.headers["Retry-After"] = str(self.retry_after)
+            return response, 503
+        g._admission_gate = self
+        return None
+
+    def _after_request(self, response):
+        # Teardown runs before a streamed body is read; the slot (and the
+        # connection the generator holds) stays taken until the body is closed
+        if response.is_streamed and g.get("_admission_gate") is self:
+            g.pop("_admission_gate")
+            response.call_on_close(self.leave)
+        return response
+
+    def _teardown_request(self, exc):
+        if g.pop("_admission_gate", None) is self:
+            self.leave()
+
+    def protect(self, *blueprints):
+        """Gate every route of the given blueprints except exempt() views."""
+        for blueprint in blueprints:
+            blueprint.before_request(self._before_request)
+            blueprint.after_request(self._after_request)
+            blueprint.teardown_request(self._teardown_request)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "queue_wait_s": self.wait,
+            }
+
+
+def exempt(view):
+    """Let a view through the AdmissionGate (put it directly under @route)."""
+    view._admission_exempt = True
+    return view
@@ -0,0 +1,243 @@
+"""
+File: meal_catalog.py
+Version: 1.4.0
+
+CHANGES FROM 1.3.0:
+- invalidate() bumps a generation instead of a stale flag, so an
+  invalidate() that arrives during a reload still forces the next one
+- Failed reloads back off (MEAL_CATALOG_RETRY_BACKOFF, doubling up to
+  MEAL_CATALOG_RETRY_BACKOFF_MAX) instead of every request retrying the load
+- Shared mode never waits for another worker's reload: the published (or
+  no) snapshot is served and callers fall back to the DB meanwhile
+
+CHANGES FROM 1.2.0:
+- Optional shared mode (config.MEAL_CATALOG_SHARED_DIR): snapshots are
+  published to a memory-mapped file (catalog_mmap.py) that every worker
+  process maps, and only one process at a time reloads from the DB
+
+CHANGES FROM 1.1.0:
+- diet_key() is public so recommender.py groups diets the same way
+
+CHANGES FROM 1.0.0:
+- ADDED: sample_meals() / sample_distinct() for batch week planning
+
+Description:
+- In-memory meal catalog indexed by diet category
+- Serves /api/meals/suggest with a local random pick instead of a
+  usp_GetRandomMealByDiet round trip per click
+- Reloads on TTL expiry or explicit invalidate(); readers always see one
+  complete snapshot because a reload swaps a single reference
+"""
+import logging
+import random
+import threading
+import time
+from collections.abc import Sequence
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog as loaded at one point in time."""
+
+    def __init__(self, meals, loaded_at):
+        by_id = {}
+        by_diet = {}
+        for meal in meals:
+            meal = dict(meal)
+            diet = meal.pop("DietCategory", None)
+            by_id[meal["MealID"]] = meal
+            by_diet.setdefault(diet_key(diet), []).append(meal)
+
+        self.by_id = by_id
+        self.by_diet = {diet: tuple(items) for diet, items in by_diet.items()}
+        self.meal_count = len(by_id)
+        self.loaded_at = loaded_at
+
+    def meals_for(self, diet_category):
+        return self.by_diet.get(diet_key(diet_category), ())
+
+
+def sample_distinct(meals, count, rng=None):
+    """
+    Pick `count` meals, avoiding repeats until every meal has been used once.
+    Returns copies safe to hand to jsonify.
+    """
+    rng = rng or random
+    # Lazy sequences (mapped snapshots) are sampled in place, not copied
+    meals = meals if isinstance(meals, Sequence) else list(meals)
+    picked = []
+    while meals and len(picked) < count:
+        take = min(count - len(picked), len(meals))
+        picked.extend(rng.sample(meals, take))
+    return [dict(meal, ingredients=list(meal["ingredients"])) for meal in picked]
+
+
+def diet_key(diet_category):
+    # SQL Server compares DietCategory case-insensitively; mirror that here
+    return (diet_category or "").strip().lower()
+
+
+class MealCatalog:
+    """
+    Cached meal catalog.
+
+    `loader` is a zero-argument callable returning the meal list (normally
+    DatabaseManager.get_meal_catalog) or None on failure. A failed reload
+    keeps serving the previous snapshot.
+
+    With `shared_dir` the snapshot lives in a memory-mapped file shared by
+    every worker process (see catalog_mmap.py).
+    """
+
+    def __init__(self, loader, ttl=None, shared_dir=None):
+        self._loader = loader
+        self.ttl = config.MEAL_CATALOG_TTL if ttl is None else ttl
+        self._snapshot = None
+        # invalidate() bumps _generation; a load only satisfies the generation
+        # it started under, so an invalidate() during a reload is not lost
+        self._generation = 1
+        self._loaded_generation = 0
+        self._invalidated_at = 0.0          # wall clock, compared with shared snapshots
+        self._retry_at = 0.0                # monotonic; no automatic reload before this
+        self._failures = 0
+        self._reload_lock = threading.Lock()
+        self._rng = random.Random()
+        self._shared = None
+        if shared_dir:
+            from catalog_mmap import SharedSnapshotFile
+            self._shared = SharedSnapshotFile(shared_dir)
+
+    def _expired(self, snapshot):
+        return (self._loaded_generation != self._generation or snapshot is None or
+                time.monotonic() - snapshot.loaded_at >= self.ttl)
+
+    def _loaded(self, snapshot, generation):
+        self._snapshot = snapshot
+        self._loaded_generation = generation
+        self._failures = 0
+        self._retry_at = 0.0
+        return snapshot
+
+    def _load_failed(self):
+        # Back off so requests do not each retry a full load against a failing DB
+        self._failures += 1
+        delay = min(config.MEAL_CATALOG_RETRY_BACKOFF * 2 ** (self._failures - 1),
+                    config.MEAL_CATALOG_RETRY_BACKOFF_MAX)
+        self._retry_at = time.monotonic() + delay
+        logger.warning(f"[Catalog] Reload failed; keeping previous snapshot, next attempt in {delay:.0f}s")
+        return self._snapshot
+
+    def refresh(self):
+        """Reload from the loader and swap in the new snapshot."""
+        generation = self._generation
+        if self._shared is not None:
+            return self._refresh_shared(generation)
+        meals = self._loader()
+        if meals is None:
+            return self._load_failed()
+        return self._loaded(CatalogSnapshot(meals, time.monotonic()), generation)
+
+    def _refresh_shared(self, generation):
+        if not self._shared.try_lease():
+            # Another worker is reloading: serve whatever is published (or
+            # nothing, so callers fall back to the DB) rather than wait for it
+            published = self._shared.current(force=True)
+            if published is not None and published is not self._snapshot:
+                self._snapshot = published
+            self._retry_at = time.monotonic() + self._shared.poll_interval
+            return self._snapshot
+        try:
+            meals = self._loader()
+            if meals is None:
+                return self._load_failed()
+            snapshot = self._shared.publish(meals)
+        except OSError as e:
+            logger.error(f"[Catalog] Could not publish shared snapshot: {e}", exc_info=True)
+            return self._load_failed()
+        finally:
+            self._shared.release_lease()
+        return self._loaded(snapshot, generation)
+
+    def snapshot(self):
+        """
+        Current snapshot, reloading first if it has expired. Only one thread
+        reloads; others keep using the previous snapshot if there is one.
+        After a failed reload the next attempt waits for the retry backoff.
+        """
+        if self._shared is not None:
+            # Pick up snapshots published by other workers (cheap; rate limited)
+            published = self._shared.current()
+            if published is not None and published is not self._snapshot:
+                if self._snapshot is None or published.created_at > self._snapshot.created_at:
+                    self._snapshot = published
+                    if published.created_at > self._invalidated_at:
+                        self._loaded_generation = self._generation
+        snapshot = self._snapshot
+        if not self._expired(snapshot) or time.monotonic() < self._retry_at:
+            return snapshot
+
+        if snapshot is None:
+            # Nothing to serve yet, so wait for whoever is loading
+            with self._reload_lock:
+                if self._expired(self._snapshot) and time.monotonic() >= self._retry_at:
+                    return self.refresh()
+                return self._snapshot
+
+        if self._reload_lock.acquire(blocking=False):
+            try:
+                if self._expired(self._snapshot):
+                    return self.refresh()
+            finally:
+                self._reload_lock.release()
+        return self._snapshot
+
+    def invalidate(self):
+        """Force a reload on the next read (e.g. after meals are edited)."""
+        self._invalidated_at = time.time()
+        self._generation += 1
+        self._retry_at = 0.0
+
+    def is_loaded(self):
+        return self._snapshot is not None
+
+    def random_meal(self, diet_category):
+        """
+        Random meal for a diet in the same shape as
+        DatabaseManager.get_random_meal_by_diet(), or None if the diet has
+        no meals or the catalog could not be loaded.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        meals = snapshot.meals_for(diet_category)
+        if not meals:
+            return None
+        meal = self._rng.choice(meals)
+        return dict(meal, ingredients=list(meal["ingredients"]))
+
+    def sample_meals(self, diet_category, count):
+        """
+        `count` meals for a diet with no repeats unless the diet has fewer
+        than `count` meals. Returns None if the catalog could not be loaded.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        return sample_distinct(snapshot.meals_for(diet_category), count, self._rng)
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "meals": snapshot.meal_count,
+            "shared": self._shared is not None,
+            "diets": {diet: len(meals) for diet, meals in snapshot.by_diet.items()},
+            "age_seconds": round(time.monotonic() - snapshot.loaded_at, 1),
+            "ttl_seconds": self.ttl,
+            "reload_failures": self._failures,
+        }
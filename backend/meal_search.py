@@ -0,0 +1,294 @@
+"""
+File: meal_search.py
+Version: 1.0.0
+
+Description:
+- In-process inverted index over the MealCatalog for /api/meals/search
+- Indexes MealName, IngredientName and SmartGroup tokens; every query term
+  matches whole tokens or token prefixes ("salm" finds salmon), and all
+  terms must match
+- Diet filters and ingredient exclusions (whole words and plurals) are
+  posting-list set operations, so a query never scans the catalog
+- When the catalog snapshot changes the index is updated incrementally:
+  only meals whose name, diet or ingredients changed are re-tokenized, and
+  the new index is built copy-on-write so in-flight queries keep a
+  consistent view
+- Works on both in-process (CatalogSnapshot) and shared, memory-mapped
+  (catalog_mmap.MappedSnapshot) snapshots
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from meal_catalog import diet_key
+
+# Per-term score by where the token was found; exact tokens beat prefixes
+FIELD_WEIGHTS = {"name": 3, "ingredient": 2, "group": 1}
+EXACT_BONUS = 1
+
+# Scored query terms kept per index (typeahead repeats the same prefixes)
+TERM_CACHE_SIZE = 512
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lower-case ASCII word tokens ("Crème Fraîche" -> ["creme", "fraiche"])."""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return _TOKEN_RE.findall(folded.lower())
+
+
+def _word_forms(term):
+    forms = {term, term + "s", term + "es"}
+    if term.endswith("es"):
+        forms.add(term[:-2])
+    if term.endswith("s"):
+        forms.add(term[:-1])
+    return forms
+
+
+def _meal_signature(diet, meal):
+    return (
+        diet,
+        meal.get("MealName"),
+        tuple((i.get("IngredientName"), i.get("SmartGroup")) for i in meal.get("ingredients", ()))
+    )
+
+
+def _meal_tokens(signature):
+    """token -> field weight, and the ingredient-side tokens used for exclusions."""
+    _, name, ingredients = signature
+    weights = {}
+    for token in tokenize(name):
+        weights[token] = FIELD_WEIGHTS["name"]
+    ingredient_tokens = set()
+    for ingredient_name, group in ingredients:
+        for field, text in (("ingredient", ingredient_name), ("group", group)):
+            for token in tokenize(text):
+                ingredient_tokens.add(token)
+                if weights.get(token, 0) < FIELD_WEIGHTS[field]:
+                    weights[token] = FIELD_WEIGHTS[field]
+    return weights, ingredient_tokens
+
+
+class SearchIndex:
+    """Immutable inverted index for one catalog snapshot."""
+
+    def __init__(self, snapshot, previous=None):
+        self.snapshot = snapshot
+        self.reused = 0
+        self.reindexed = 0
+        self.removed = 0
+        if previous is None:
+            self._signatures = {}
+            self._postings = {}          # token -> {MealID: weight}
+            self._ingredients = {}       # token -> {MealID} (ingredient / group tokens only)
+            self._vocabulary = []
+        else:
+            # Copy-on-write: outer dicts are copied, posting dicts only when touched
+            self._signatures = dict(previous._signatures)
+            self._postings = dict(previous._postings)
+            self._ingredients = dict(previous._ingredients)
+            self._vocabulary = previous._vocabulary
+        self._locations = {}             # MealID -> (diet, position in snapshot.by_diet[diet])
+        self._diets = {}                 # diet -> frozenset of MealIDs
+        self._owned = set()              # (table, token) posting lists copied by this build
+        self._term_cache = {}
+        self._build(snapshot)
+
+    def _build(self, snapshot):
+        seen = set()
+        vocabulary_changed = False
+        for diet, meals in snapshot.by_diet.items():
+            ids = []
+            for position, meal in enumerate(meals):
+                meal_id = meal["MealID"]
+                ids.append(meal_id)
+                seen.add(meal_id)
+                self._locations[meal_id] = (diet, position)
+                signature = _meal_signature(diet, meal)
+                old = self._signatures.get(meal_id)
+                if old == signature:
+                    self.reused += 1
+                    continue
+                if old is not None:
+                    self._unindex(meal_id, old)
+                vocabulary_changed |= self._index(meal_id, signature)
+                self._signatures[meal_id] = signature
+                self.reindexed += 1
+            self._diets[diet] = frozenset(ids)
+
+        for meal_id in [m for m in self._signatures if m not in seen]:
+            self._unindex(meal_id, self._signatures.pop(meal_id))
+            self.removed += 1
+
+        tables = {"postings": self._postings, "ingredients": self._ingredients}
+        for name, token in self._owned:
+            if not tables[name].get(token, True):
+                del tables[name][token]
+                vocabulary_changed = True
+        if vocabulary_changed or not self._vocabulary:
+            self._vocabulary = sorted(self._postings)
+        del self._owned
+
+    def _own(self, name, table, token, factory):
+        # The first write to a posting list in this build copies the shared one
+        if (name, token) not in self._owned:
+            self._owned.add((name, token))
+            table[token] = factory(table.get(token, ()))
+        return table[token]
+
+    def _index(self, meal_id, signature):
+        weights, ingredient_tokens = _meal_tokens(signature)
+        new_token = False
+        for token, weight in weights.items():
+            new_token |= token not in self._postings
+            self._own("postings", self._postings, token, dict)[meal_id] = weight
+        for token in ingredient_tokens:
+            new_token |= token not in self._ingredients
+            self._own("ingredients", self._ingredients, token, set).add(meal_id)
+        return new_token
+
+    def _unindex(self, meal_id, signature):
+        weights, ingredient_tokens = _meal_tokens(signature)
+        for token in weights:
+            if token in self._postings:
+                self._own("postings", self._postings, token, dict).pop(meal_id, None)
+        for token in ingredient_tokens:
+            if token in self._ingredients:
+                self._own("ingredients", self._ingredients, token, set).discard(meal_id)
+
+    @staticmethod
+    def _prefix_tokens(vocabulary, prefix):
+        start = bisect_left(vocabulary, prefix)
+        end = start
+        while end < len(vocabulary) and vocabulary[end].startswith(prefix):
+            end += 1
+        return vocabulary[start:end]
+
+    def _term_scores(self, term):
+        """MealID -> best score for one query term across exact and prefix matches (read-only)."""
+        scores = self._term_cache.get(term)
+        if scores is not None:
+            return scores
+        scores = {}
+        for token in self._prefix_tokens(self._vocabulary, term):
+            posting = self._postings[token]
+            bonus = EXACT_BONUS if token == term else 0
+            if not scores:
+                scores = {meal_id: weight + bonus for meal_id, weight in posting.items()}
+                continue
+            for meal_id, weight in posting.items():
+                if scores.get(meal_id, 0) < weight + bonus:
+                    scores[meal_id] = weight + bonus
+        if len(self._term_cache) >= TERM_CACHE_SIZE:
+            self._term_cache.clear()
+        self._term_cache[term] = scores
+        return scores
+
+    def _excluded(self, phrase):
+        """
+        MealIDs whose ingredients contain every token of an exclusion phrase.
+        Exclusions match whole words and plurals, not prefixes ("egg" must
+        not drop eggplant).
+        """
+        matched = None
+        for term in tokenize(phrase):
+            ids = set()
+            for token in _word_forms(term):
+                ids |= self._ingredients.get(token, set())
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return set()
+        return matched or set()
+
+    def search(self, query="", diet=None, exclude=(), offset=0, limit=20):
+        """
+        Returns (total, [(score, MealID)]) for one page, best first. An empty
+        query lists the diet's meals (score 0).
+        """
+        candidates = None
+        if diet:
+            candidates = self._diets.get(diet_key(diet), frozenset())
+
+        # Most selective term first keeps every intersection small
+        terms = sorted((self._term_scores(term) for term in dict.fromkeys(tokenize(query))), key=len)
+        if terms:
+            first = terms[0]
+            keys = first.keys() if candidates is None else first.keys() & candidates
+            scores = {meal_id: first[meal_id] for meal_id in keys}
+            for term_scores in terms[1:]:
+                scores = {meal_id: score + term_scores[meal_id]
+                          for meal_id, score in scores.items() if meal_id in term_scores}
+        elif candidates is not None:
+            scores = dict.fromkeys(candidates, 0)
+        else:
+            scores = {}
+
+        for phrase in exclude:
+            for meal_id in self._excluded(phrase):
+                scores.pop(meal_id, None)
+
+        if not scores:
+            return 0, []
+        ranked = heapq.nsmallest(offset + limit, [(-score, meal_id) for meal_id, score in scores.items()])
+        return len(scores), [(-negative, meal_id) for negative, meal_id in ranked[offset:]]
+
+    def meal(self, meal_id):
+        diet, position = self._locations[meal_id]
+        return self.snapshot.by_diet[diet][position]
+
+
+class MealSearch:
+    """Keeps a SearchIndex in step with the MealCatalog's current snapshot."""
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._index = None
+
+    def index(self):
+        """SearchIndex for the current catalog snapshot, or None if it cannot load."""
+        snapshot = self._catalog.snapshot()
+        if snapshot is None:
+            return None
+        index = self._index
+        if index is None or index.snapshot is not snapshot:
+            with self._lock:
+                index = self._index
+                if index is None or index.snapshot is not snapshot:
+                    index = SearchIndex(snapshot, previous=index)
+                    self._index = index
+        return index
+
+    def search(self, query="", diet=None, exclude=(), page=1, page_size=20):
+        """
+        Returns {"Total", "Meals"} for one page (meal copies with "Score"),
+        or None if the catalog could not be loaded.
+        """
+        index = self.index()
+        if index is None:
+            return None
+        total, hits = index.search(query, diet, exclude, offset=(page - 1) * page_size, limit=page_size)
+        meals = []
+        for score, meal_id in hits:
+            meal = index.meal(meal_id)
+            meals.append(dict(meal, ingredients=list(meal["ingredients"]), Score=score))
+        return {"Total": total, "Meals": meals}
+
+    def stats(self):
+        index = self._index
+        if index is None:
+            return {"built": False}
+        return {
+            "built": True,
+            "meals": len(index._signatures),
+            "tokens": len(index._vocabulary),
+            "reused": index.reused,
+            "reindexed": index.reindexed,
+            "removed": index.removed,
+        }
@@ -0,0 +1,358 @@
+"""
+File: metrics.py
+Version: 1.3.0
+
+CHANGES FROM 1.2.0:
+- db_timer() also feeds the DB call timeline of a request being profiled (profiling.py)
+
+CHANGES FROM 1.1.0:
+- ADDED: register_load_gauges() - admission gate and single-flight counts
+
+CHANGES FROM 1.0.0:
+- ADDED: register_cache_gauges() - entries / hits / misses per in-process cache
+
+Description:
+- Dependency-free Prometheus-style metrics: counters, histograms and
+  callback gauges, rendered in text exposition format at /metrics
+- init_app() adds per-endpoint request timing, error counters and JSON
+  serialization timing to the Flask app
+- DatabaseManager records connect / execute / fetch timings per procedure
+  or query through db_timer()
+- config.METRICS_ENABLED=False skips all of it; the hot path then only pays
+  one attribute check
+"""
+import bisect
+import threading
+import time
+
+from flask import Response, g, request
+from flask.json.provider import DefaultJSONProvider
+
+import config
+import profiling
+
+# Seconds; tuned for sub-millisecond cache hits up to the 10 s connect timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_label_str(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}   # label_values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _label_str(self.labels, label_values, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = _label_str(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, label_values)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge whose samples are read at scrape time: fn() -> {label_values: value}."""
+
+    def __init__(self, name, help_text, fn, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._fn = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = self._fn() or {}
+        except Exception:
+            samples = {}
+        for label_values, value in sorted(samples.items()):
+            lines.append(f"{self.name}{_label_str(self.labels, label_values)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ────────────────────────────────────────────────────────────────────────────
+# Metric Definitions
+# ────────────────────────────────────────────────────────────────────────────
+
+http_request_seconds = registry.register(Histogram(
+    "amble_http_request_duration_seconds", "Request duration by endpoint", ("endpoint", "method")))
+http_responses_total = registry.register(Counter(
+    "amble_http_responses_total", "Responses by endpoint and status code", ("endpoint", "status")))
+http_errors_total = registry.register(Counter(
+    "amble_http_errors_total", "5xx responses and unhandled exceptions by endpoint", ("endpoint",)))
+json_serialize_seconds = registry.register(Histogram(
+    "amble_json_serialize_seconds", "Time spent serializing JSON responses", ("endpoint",)))
+
+db_call_seconds = registry.register(Histogram(
+    "amble_db_call_duration_seconds", "DB time by procedure/query and phase (connect, execute, fetch)",
+    ("query", "phase")))
+db_errors_total = registry.register(Counter(
+    "amble_db_errors_total", "DB calls that raised, by procedure/query and phase", ("query", "phase")))
+
+
+def register_pool_gauges(stats_fn):
+    """Expose connection pool counts; stats_fn() returns ConnectionPool.stats() or None."""
+    def samples():
+        stats = stats_fn()
+        if not stats:
+            return {}
+        return {(key,): stats[key] for key in ("size", "idle", "checked_out", "waiting", "created", "recycled")}
+
+    registry.register(CallbackGauge(
+        "amble_db_pool_connections", "Connection pool counts by state", samples, ("state",)))
+
+
+def register_load_gauges(stats_fn):
+    """Expose load-control counts; stats_fn() returns {component: stats dict}."""
+    def samples():
+        return {
+            (component, kind): value
+            for component, stats in (stats_fn() or {}).items()
+            for kind, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+
+    registry.register(CallbackGauge(
+        "amble_load_control", "Admission gate and single-flight counts", samples, ("component", "kind")))
+
+
+_cache_stats = {}   # cache name -> stats_fn
+_cache_stats_lock = threading.Lock()
+
+
+def _cache_samples():
+    with _cache_stats_lock:
+        sources = list(_cache_stats.items())
+    samples = {}
+    for cache, stats_fn in sources:
+        stats = stats_fn() or {}
+        for kind in ("entries", "hits", "misses"):
+            if kind in stats:
+                samples[(cache, kind)] = stats[kind]
+    return samples
+
+
+def register_cache_gauges(cache, stats_fn):
+    """Expose a cache's stats() entries / hits / misses under the given cache name."""
+    with _cache_stats_lock:
+        first = not _cache_stats
+        _cache_stats[cache] = stats_fn
+    if first:
+        registry.register(CallbackGauge(
+            "amble_cache", "In-process cache entries and lookup counts", _cache_samples, ("cache", "kind")))
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# DB Instrumentation
+# ────────────────────────────────────────────────────────────────────────────
+
+class db_timer:
+    """
+    Context manager timing one DB phase:
+
+        with metrics.db_timer("usp_GetDietPlans", "execute"):
+            cursor.execute(...)
+    """
+    __slots__ = ("query", "phase", "start")
+
+    def __init__(self, query, phase):
+        self.query = query
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        db_call_seconds.observe(elapsed, self.query, self.phase)
+        if profiling.active:
+            profiling.record_db_call(self.query, self.phase, self.start, elapsed)
+        if exc_type is not None:
+            db_errors_total.inc(self.query, self.phase)
+        return False
+
+
+def query_label(sql, default):
+    """Label for a statement: {CALL dbo.usp_GetDietPlans} → usp_GetDietPlans; inline SQL → default."""
+    text = sql.lstrip()
+    if text[:1] == "{" and text[1:5].upper() == "CALL":
+        name = text[5:].strip().split("(", 1)[0].split("}", 1)[0].strip()
+        return name.rsplit(".", 1)[-1].strip("[]")
+    return default
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute* and fetch*/nextset calls."""
+
+    def __init__(self, cursor, label):
+        self._cursor = cursor
+        self._label = label
+        self._query = label
+
+    def execute(self, sql, *params):
+        self._query = query_label(sql, self._label)
+        with db_timer(self._query, "execute"):
+            self._cursor.execute(sql, *params)
+        return self
+
+    def executemany(self, sql, rows):
+        self._query = query_label(sql, self._label)
+        with db_timer(self._query, "execute"):
+            return self._cursor.executemany(sql, rows)
+
+    def fetchone(self):
+        with db_timer(self._query, "fetch"):
+            return self._cursor.fetchone()
+
+    def fetchall(self):
+        with db_timer(self._query, "fetch"):
+            return self._cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        with db_timer(self._query, "fetch"):
+            return self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+
+    def nextset(self):
+        with db_timer(self._query, "fetch"):
+            return self._cursor.nextset()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Flask Integration
+# ────────────────────────────────────────────────────────────────────────────
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that records serialization time per endpoint."""
+
+    def response(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            json_serialize_seconds.observe(time.perf_counter() - start, request.endpoint or "unknown")
+
+
+def _endpoint():
+    return request.endpoint or "unmatched"
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        endpoint = _endpoint()
+        http_request_seconds.observe(time.perf_counter() - start, endpoint, request.method)
+        http_responses_total.inc(endpoint, str(response.status_code))
+        if response.status_code >= 500:
+            http_errors_total.inc(endpoint)
+    return response
+
+
+def _teardown_request(exc):
+    if exc is not None:
+        http_errors_total.inc(_endpoint())
+
+
+def init_app(app):
+    """Register request hooks and the /metrics route (no-op when disabled)."""
+    if not config.METRICS_ENABLED:
+        return
+
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,127 @@
+"""
+File: preferences.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- Entries live PREFERENCE_CACHE_TTL (now 5 s by default) instead of 300 s.
+  Write-through only reaches this process's cache, so the TTL bounds how
+  long other workers serve the old preference
+
+Description:
+- Bounded, thread-safe LRU of user preferences (active diet, calorie goal,
+  allergies) so page loads stop querying UserPreferences
+- Writes go through the cache: begin_write() before the DB call,
+  commit_write() after it. Loads and writes race safely on a per-user
+  generation counter, so a slow read or an out-of-order write can never
+  leave an older preference cached
+- Users without a preference are cached too (as None)
+- The cache is per process. Entries expire after PREFERENCE_CACHE_TTL, the
+  longest another worker serves a preference after a write; page loads
+  that read the preference several times still share one query
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+# get() result for "not cached" (None means "cached: user has no preference")
+MISSING = object()
+
+
+def _user_key(user_id):
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return user_id
+
+
+class PreferenceCache:
+    """user -> preference LRU with TTL, write-through and hit/miss counts."""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = config.PREFERENCE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = config.PREFERENCE_CACHE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # user -> (preference or None, stored_at)
+        self._generations = {}          # user -> int, bumped by every write
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Cached preference (a copy), None for "no preference", or MISSING."""
+        user = _user_key(user_id)
+        with self._lock:
+            entry = self._entries.get(user)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user)
+                self.hits += 1
+                return dict(entry[0]) if entry[0] is not None else None
+            if entry is not None:
+                del self._entries[user]
+            self.misses += 1
+            return MISSING
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(_user_key(user_id), 0)
+
+    def _store_locked(self, user, preference):
+        self._entries[user] = (dict(preference) if preference is not None else None, time.monotonic())
+        self._entries.move_to_end(user)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, user_id, preference, generation):
+        """Store a loaded preference unless a write started after `generation` was read."""
+        user = _user_key(user_id)
+        with self._lock:
+            if self._generations.get(user, 0) != generation:
+                return False
+            self._store_locked(user, preference)
+            return True
+
+    def begin_write(self, user_id):
+        """Drop the entry before a DB write; returns the token for commit_write()."""
+        user = _user_key(user_id)
+        with self._lock:
+            self._entries.pop(user, None)
+            generation = self._generations.get(user, 0) + 1
+            self._generations[user] = generation
+            return generation
+
+    def commit_write(self, user_id, preference, token):
+        """
+        Cache the written preference. If another write to the same user began
+        in the meantime, the DB commit order is unknown, so the entry is
+        dropped instead and the next read reloads it.
+        """
+        user = _user_key(user_id)
+        with self._lock:
+            if self._generations.get(user, 0) == token and preference is not None:
+                self._store_locked(user, preference)
+                return True
+            self._entries.pop(user, None)
+            self._generations[user] = self._generations.get(user, 0) + 1
+            return False
+
+    def invalidate(self, user_id):
+        user = _user_key(user_id)
+        with self._lock:
+            self._entries.pop(user, None)
+            self._generations[user] = self._generations.get(user, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "ttl_seconds": self.ttl,
+            }
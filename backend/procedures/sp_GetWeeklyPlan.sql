@@ -0,0 +1,55 @@
+/*
+    File: sp_GetWeeklyPlan.sql
+    Version: 1.0.0
+
+    Description:
+    - Every planned meal for one user across a 7-day week, in one call
+    - Result set 1: plan rows with the meal's macros
+    - Result set 2: ingredients for each distinct meal in the week
+    - Used by DatabaseManager.get_weekly_plan() → /api/meal-plans/week/<user_id>
+*/
+CREATE OR ALTER PROCEDURE dbo.sp_GetWeeklyPlan
+    @UserID    INT,
+    @StartDate DATE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @EndDate DATE = DATEADD(DAY, 6, @StartDate);
+
+    -- 1. Planned meals with macros
+    SELECT
+        mp.PlanID,
+        mp.PlannedDate,
+        mp.MealTime,
+        mp.Status,
+        m.MealID,
+        m.MealName,
+        m.ImageURL,
+        m.Calories,
+        m.ProteinGrams,
+        m.FatGrams,
+        m.CarbGrams
+    FROM dbo.MealPlans mp
+    INNER JOIN dbo.Meals m ON mp.MealID = m.MealID
+    WHERE mp.UserID = @UserID
+      AND mp.PlannedDate BETWEEN @StartDate AND @EndDate
+    ORDER BY mp.PlannedDate, mp.PlanID;
+
+    -- 2. Ingredients, once per distinct meal in the week
+    SELECT
+        mi.MealID,
+        i.IngredientName,
+        mi.Quantity,
+        i.SmartGroup
+    FROM dbo.MealIngredients mi
+    INNER JOIN dbo.Ingredients i ON mi.IngredientID = i.IngredientID
+    WHERE mi.MealID IN (
+        SELECT DISTINCT mp.MealID
+        FROM dbo.MealPlans mp
+        WHERE mp.UserID = @UserID
+          AND mp.PlannedDate BETWEEN @StartDate AND @EndDate
+    )
+    ORDER BY mi.MealID;
+END
+GO
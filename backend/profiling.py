@@ -0,0 +1,238 @@
+"""
+File: profiling.py
+Version: 1.0.0
+
+Description:
+- Opt-in cProfile capture of individual requests, safe to leave configured
+  in production
+- A request is profiled when it carries X-Amble-Profile: 1 together with a
+  valid X-Amble-Admin-Token, or when it is picked by PROFILE_SAMPLE_RATE
+- Each capture stores the .prof stats plus a JSON record with the request
+  and the timeline of DB calls made on the request thread (connect /
+  execute / fetch per procedure or query) in a ring buffer of
+  PROFILE_MAX_ENTRIES files under PROFILE_DIR
+- Profiled responses carry X-Amble-Profile-Id; /api/admin/profiles lists,
+  shows (top functions) and downloads captures
+- With no admin token and a zero sample rate init_app() registers nothing,
+  so the request path pays nothing; DB calls pay one integer check
+- One request is profiled at a time per process (cProfile cannot run two
+  profilers at once); others in the meantime are served unprofiled
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import abort, g, jsonify, request, send_file
+
+import config
+
+TRIGGER_HEADER = "X-Amble-Profile"
+TOKEN_HEADER = "X-Amble-Admin-Token"
+ID_HEADER = "X-Amble-Profile-Id"
+
+# 1 while a request is being profiled; DB hooks check this before anything else
+active = 0
+
+_capture_lock = threading.Lock()
+_local = threading.local()
+_ID_RE = re.compile(r"^[0-9T]+-[0-9a-f]{8}$")
+
+
+def record_db_call(query, phase, started, duration):
+    """Append a DB phase to the current request's timeline (called from metrics.db_timer)."""
+    timeline = getattr(_local, "timeline", None)
+    if timeline is not None and len(timeline) < config.PROFILE_MAX_DB_CALLS:
+        timeline.append({
+            "query": query,
+            "phase": phase,
+            "start_ms": round((started - _local.started) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        })
+
+
+def _valid_token():
+    supplied = request.headers.get(TOKEN_HEADER, "").encode("utf-8")
+    return bool(config.PROFILE_ADMIN_TOKEN) and \
+        hmac.compare_digest(supplied, config.PROFILE_ADMIN_TOKEN.encode("utf-8"))
+
+
+def _wanted():
+    if request.path.startswith("/api/admin/profiles"):
+        return None
+    if request.headers.get(TRIGGER_HEADER) and _valid_token():
+        return "header"
+    if config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def _before_request():
+    global active
+    trigger = _wanted()
+    if trigger is None or not _capture_lock.acquire(blocking=False):
+        return
+    active = 1
+    _local.started = time.perf_counter()
+    _local.timeline = []
+    g._profile = {
+        "trigger": trigger,
+        "started_at": datetime.now().isoformat(timespec="milliseconds"),
+        "profiler": cProfile.Profile(),
+    }
+    g._profile["profiler"].enable()
+
+
+def _finish(status):
+    global active
+    state = g.pop("_profile", None)
+    if state is None:
+        return None
+    state["profiler"].disable()
+    elapsed = time.perf_counter() - _local.started
+    timeline = _local.timeline
+    _local.timeline = None
+    active = 0
+    _capture_lock.release()
+    try:
+        return _store(state, status, elapsed, timeline)
+    except Exception as e:
+        print(f"[Profiling Error] Could not store profile: {e}")
+        return None
+
+
+def _after_request(response):
+    profile_id = _finish(response.status_code)
+    if profile_id is not None:
+        response.headers[ID_HEADER] = profile_id
+    return response
+
+
+def _teardown_request(exc):
+    # Only reached with a live profile when the view raised past after_request
+    _finish(500)
+
+
+def _store(state, status, elapsed, timeline):
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    state["profiler"].dump_stats(os.path.join(config.PROFILE_DIR, f"{profile_id}.prof"))
+    db_ms = sum(call["duration_ms"] for call in timeline)
+    record = {
+        "id": profile_id,
+        "trigger": state["trigger"],
+        "started_at": state["started_at"],
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "status": status,
+        "duration_ms": round(elapsed * 1000, 3),
+        "db_ms": round(db_ms, 3),
+        "db_calls": timeline,
+    }
+    tmp_path = os.path.join(config.PROFILE_DIR, f"{profile_id}.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=1)
+    os.replace(tmp_path, os.path.join(config.PROFILE_DIR, f"{profile_id}.json"))
+    _trim()
+    return profile_id
+
+
+def _profile_ids():
+    try:
+        names = os.listdir(config.PROFILE_DIR)
+    except OSError:
+        return []
+    # Ids start with a timestamp, so name order is capture order
+    return sorted(name[:-5] for name in names if name.endswith(".json") and _ID_RE.match(name[:-5]))
+
+
+def _trim():
+    ids = _profile_ids()
+    for profile_id in ids[:max(0, len(ids) - config.PROFILE_MAX_ENTRIES)]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(config.PROFILE_DIR, profile_id + suffix))
+            except OSError:
+                pass
+
+
+def _load(profile_id):
+    if not _ID_RE.match(profile_id):
+        abort(404)
+    try:
+        with open(os.path.join(config.PROFILE_DIR, f"{profile_id}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        abort(404)
+
+
+def _require_admin():
+    if not _valid_token():
+        return jsonify({"error": f"Missing or invalid {TOKEN_HEADER}"}), 403
+    return None
+
+
+def init_app(app):
+    """Register the capture hooks and admin routes (no-op when profiling is not configured)."""
+    if not config.PROFILE_ADMIN_TOKEN and config.PROFILE_SAMPLE_RATE <= 0:
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route('/api/admin/profiles', methods=['GET'])
+    def list_profiles():
+        """Newest first: id, request, status, total and DB time of each capture."""
+        denied = _require_admin()
+        if denied:
+            return denied
+        summaries = []
+        for profile_id in reversed(_profile_ids()):
+            try:
+                record = _load(profile_id)
+            except Exception:
+                continue
+            record["db_calls"] = len(record["db_calls"])
+            summaries.append(record)
+        return jsonify({"max_entries": config.PROFILE_MAX_ENTRIES, "profiles": summaries}), 200
+
+    @app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+    def show_profile(profile_id):
+        """One capture with its DB timeline and the top functions by cumulative time."""
+        denied = _require_admin()
+        if denied:
+            return denied
+        record = _load(profile_id)
+        try:
+            limit = int(request.args.get('top', 30))
+        except ValueError:
+            return jsonify({"error": "'top' must be an integer"}), 400
+        out = io.StringIO()
+        stats = pstats.Stats(os.path.join(config.PROFILE_DIR, f"{profile_id}.prof"), stream=out)
+        stats.sort_stats("cumulative").print_stats(limit)
+        record["stats"] = out.getvalue()
+        return jsonify(record), 200
+
+    @app.route('/api/admin/profiles/<profile_id>/download', methods=['GET'])
+    def download_profile(profile_id):
+        """Raw cProfile stats (open with pstats, snakeviz, ...)."""
+        denied = _require_admin()
+        if denied:
+            return denied
+        _load(profile_id)
+        return send_file(
+            os.path.join(config.PROFILE_DIR, f"{profile_id}.prof"),
+            mimetype="application/octet-stream",
+            as_attachment=True,
+            download_name=f"{profile_id}.prof"
+        )
@@ -0,0 +1,220 @@
+"""
+File: recommender.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- Mapped (shared) catalog snapshots are scored straight from the mapping
+  with np.frombuffer - no per-process copy of the macro columns
+
+Description:
+- Macro-aware meal recommendations for /api/meals/recommend/<user_id>
+- The catalog's macros are held as columnar NumPy arrays (rebuilt once per
+  catalog snapshot, rows grouped by diet), so scoring every candidate
+  against the user's remaining budget is a handful of array operations
+- Top-k selection uses argpartition; temperature > 0 adds Gumbel noise to
+  the best RECOMMEND_SAMPLE_POOL fits so repeat requests vary
+- numpy is optional: without it available() is False and the route answers 501
+"""
+import threading
+
+try:
+    import numpy as np
+except ImportError:   # optional dependency
+    np = None
+
+import config
+from meal_catalog import diet_key
+
+MACRO_FIELDS = ("Calories", "ProteinGrams", "FatGrams", "CarbGrams")
+
+# Share of daily calories from protein / fat / carbs
+MACRO_SPLITS = {
+    "default": (0.30, 0.30, 0.40),
+    "keto": (0.25, 0.70, 0.05),
+    "paleo": (0.30, 0.40, 0.30),
+    "vegan": (0.20, 0.30, 0.50),
+}
+KCAL_PER_GRAM = (4.0, 9.0, 4.0)
+
+# Relative weight of each macro's miss, and extra weight for overshooting
+# what is left of the day's budget
+MACRO_WEIGHTS = (1.0, 0.8, 0.6, 0.6)
+OVERSHOOT_PENALTY = 4.0
+
+
+def available():
+    return np is not None
+
+
+def daily_targets(calories_goal, diet_category):
+    """Daily [calories, protein g, fat g, carb g] for a calorie goal and diet."""
+    split = MACRO_SPLITS.get(diet_key(diet_category), MACRO_SPLITS["default"])
+    grams = [calories_goal * share / kcal for share, kcal in zip(split, KCAL_PER_GRAM)]
+    return np.array([calories_goal] + grams, dtype=np.float64)
+
+
+class MacroMatrix:
+    """Columnar macros for one catalog snapshot; rows are contiguous per diet."""
+
+    def __init__(self, snapshot):
+        if hasattr(snapshot, "columns"):
+            self._from_mapped(snapshot)
+            return
+        meals = []
+        self.diet_slices = {}
+        for diet, diet_meals in snapshot.by_diet.items():
+            start = len(meals)
+            meals.extend(diet_meals)
+            self.diet_slices[diet] = (start, len(meals))
+
+        self.meals = meals
+        meal_ids = np.fromiter((m["MealID"] for m in meals), dtype=np.int64, count=len(meals))
+        # One contiguous array per macro: column-wise arithmetic stays in cache
+        self.columns = np.array(
+            [[m.get(field) or 0 for m in meals] for field in MACRO_FIELDS],
+            dtype=np.float64
+        ).reshape(len(MACRO_FIELDS), len(meals))
+        self.nan_columns = [False] * len(MACRO_FIELDS)
+        # Sorted ids + row order map MealIDs to rows with one searchsorted
+        self._id_order = np.argsort(meal_ids, kind="stable")
+        self._sorted_ids = meal_ids[self._id_order]
+
+    def _from_mapped(self, snapshot):
+        # Zero-copy, read-only views over the shared catalog file
+        self.meals = snapshot.all_meals()
+        self.diet_slices = dict(snapshot.diet_slices)
+        meal_ids = np.frombuffer(snapshot.meal_ids, dtype=np.int64)
+        self.columns = [np.frombuffer(snapshot.columns[field], dtype=np.float64) for field in MACRO_FIELDS]
+        # NULL macros are stored as NaN; those columns are cleaned per request
+        self.nan_columns = [bool(np.isnan(column).any()) for column in self.columns]
+        self._id_order = np.argsort(meal_ids, kind="stable")
+        self._sorted_ids = meal_ids[self._id_order]
+
+    def rows_for(self, diet_category):
+        return self.diet_slices.get(diet_key(diet_category), (0, 0))
+
+    def rows_of(self, meal_ids):
+        """Row indexes of the given MealIDs (unknown ids are dropped)."""
+        if not len(self._sorted_ids):
+            return np.empty(0, dtype=np.int64)
+        ids = np.asarray(meal_ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return self._id_order[pos[self._sorted_ids[pos] == ids]]
+
+
+class Recommender:
+    """Scores MealCatalog meals against a user's remaining macro budget."""
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._matrix_snapshot = None
+
+    def matrix(self):
+        """MacroMatrix for the current catalog snapshot, or None if it cannot load."""
+        snapshot = self._catalog.snapshot()
+        if snapshot is None:
+            return None
+        if self._matrix_snapshot is not snapshot:
+            with self._lock:
+                if self._matrix_snapshot is not snapshot:
+                    self._matrix = MacroMatrix(snapshot)
+                    self._matrix_snapshot = snapshot
+        return self._matrix
+
+    def recommend(self, diet_category, calories_goal, eaten, meals_left, exclude_ids=(),
+                  k=None, temperature=None, seed=None):
+        """
+        Top-k meals for the next meal of the day.
+
+        Args:
+            diet_category: diet to recommend from
+            calories_goal: daily calorie goal
+            eaten: today's [calories, protein, fat, carbs] so far
+            meals_left: meals still to plan today (>= 1); the remaining budget
+                is split evenly between them
+            exclude_ids: MealIDs to skip (recently planned)
+            k: number of meals to return
+            temperature: 0 = strict ranking; higher values mix in randomness
+            seed: optional RNG seed for reproducible picks
+
+        Returns:
+            dict with "Meals" (copies with a "Score"), "Target", "Remaining" and
+            "ExclusionsRelaxed", or None if the catalog could not be loaded
+        """
+        matrix = self.matrix()
+        if matrix is None:
+            return None
+        k = config.RECOMMEND_DEFAULT_K if k is None else k
+        temperature = config.RECOMMEND_DEFAULT_TEMPERATURE if temperature is None else temperature
+
+        targets = daily_targets(calories_goal, diet_category)
+        remaining = np.clip(targets - np.asarray(eaten, dtype=np.float64), 0.0, None)
+        target = remaining / max(1, meals_left)
+        # Normalise each macro by a typical per-meal amount so grams and kcal compare
+        scale = np.maximum(targets / config.RECOMMEND_MEALS_PER_DAY, 1.0)
+
+        start, end = matrix.rows_for(diet_category)
+        size = end - start
+
+        # penalty = sum_j w_j * (miss_j^2 + OVERSHOOT_PENALTY * overshoot_j^2), in place per column
+        penalty = np.zeros(size)
+        work = np.empty(size)
+        over = np.empty(size)
+        for j, weight in enumerate(MACRO_WEIGHTS):
+            column = matrix.columns[j][start:end]
+            if matrix.nan_columns[j]:
+                column = np.nan_to_num(column)
+            np.subtract(column, target[j], out=work)
+            work *= 1.0 / scale[j]
+            work *= work
+            np.subtract(column, remaining[j], out=over)
+            np.maximum(over, 0.0, out=over)
+            over *= 1.0 / scale[j]
+            over *= over
+            over *= OVERSHOOT_PENALTY
+            work += over
+            work *= weight
+            penalty += work
+        scores = np.negative(penalty, out=penalty)
+
+        relaxed = False
+        available_count = size
+        if len(exclude_ids) and size:
+            rows = matrix.rows_of(list(exclude_ids))
+            rows = rows[(rows >= start) & (rows < end)] - start
+            if len(rows) >= size:
+                relaxed = True
+            else:
+                ranking = scores.copy()
+                ranking[rows] = -np.inf
+                available_count = size - len(rows)
+        if available_count == size:
+            ranking = scores
+
+        count = min(k, available_count)
+        picks = []
+        if count:
+            if temperature > 0:
+                # Gumbel-top-k over the best fits only; meals further down
+                # would almost never win and noising all of them costs more
+                pool = min(available_count, max(config.RECOMMEND_SAMPLE_POOL, count))
+                candidates = np.argpartition(-ranking, pool - 1)[:pool] if pool < size else np.arange(size)
+                rng = np.random.default_rng(seed)
+                noisy = ranking[candidates] / temperature + rng.gumbel(size=len(candidates))
+                order = np.argsort(-noisy)[:count]
+                top = candidates[order]
+            else:
+                top = np.argpartition(-ranking, count - 1)[:count]
+                top = top[np.argsort(-ranking[top])]
+            for i in top:
+                meal = matrix.meals[start + i]
+                picks.append(dict(meal, ingredients=list(meal["ingredients"]), Score=round(float(scores[i]), 4)))
+
+        return {
+            "Meals": picks,
+            "Target": dict(zip(MACRO_FIELDS, (round(float(v), 1) for v in target))),
+            "Remaining": dict(zip(MACRO_FIELDS, (round(float(v), 1) for v in remaining))),
+            "ExclusionsRelaxed": relaxed,
+        }
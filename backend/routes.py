@@ -1,14 +1,127 @@
 """
 File: routes.py
-Version: 1.2.0
+Version: 1.27.0
+
+CHANGES FROM 1.26.0:
+- The grocery list cache is validated against the meal plans in the
+  database instead of this process's write counter, so plans added on
+  another worker show up immediately
+
+CHANGES FROM 1.25.0:
+- /api/meal-plans/week gets a content-hash ETag and 304s in the default
+  config (it had no validator unless version ETags were on); Last-Modified
+  is still only sent in the single-worker versioned mode
+
+CHANGES FROM 1.24.0:
+- /api/tasks/queue lists the most recent dead-lettered task updates
+- /api/bootstrap reports a failed DietPlans read in Errors (it came back
+  as an empty list), so a database outage now answers 500
+
+CHANGES FROM 1.23.0:
+- /api/meal-plans/export reads Accept-Encoding q-values: "gzip;q=0" gets an
+  uncompressed stream instead of a gzip one
+
+CHANGES FROM 1.22.0:
+- POST /api/meal-plans/<plan_id>/status answers 400 for a status outside
+  Pending/Accepted/Skipped/Completed, 404 only when the plan does not exist
+  and 500 when the database update fails
+
+CHANGES FROM 1.21.0:
+- /api/user/daily-totals and /api/meal-plans/add answer 400 for a date that
+  is not YYYY-MM-DD instead of passing it on to SQL Server
+
+CHANGES FROM 1.20.0:
+- /api/health and /api/db/load report the read replicas (reads, breaker,
+  pool), primary fallbacks and read-your-writes pinning; health status still
+  follows the primary only
+
+CHANGES FROM 1.19.0:
+- ADDED: GET /api/meals/search?q=&diet=&exclude= - inverted-index meal and
+  ingredient search with prefix matching, exclusions and paging
+
+CHANGES FROM 1.18.0:
+- ADDED: GET /api/meal-plans/export/<user_id>?from=&to=&format=ndjson|csv -
+  full meal-plan history streamed in fetchmany batches, gzip when accepted
+
+CHANGES FROM 1.17.0:
+- /api/health probes the database and reports the circuit breaker; it answers
+  503 while the database is unreachable so load balancers can drain the instance
+
+CHANGES FROM 1.16.0:
+- Admission control on all blueprints: past ADMISSION_MAX_CONCURRENT DB-bound
+  requests, new ones get a fast 503 with Retry-After
+- ADDED: GET /api/db/load - admission and read-coalescing stats
+
+CHANGES FROM 1.15.0:
+- Meal catalog can be shared across worker processes (config.MEAL_CATALOG_SHARED_DIR)
+
+CHANGES FROM 1.14.0:
+- Preference and daily-totals cache counts exported as metrics gauges
+
+CHANGES FROM 1.13.0:
+- ADDED: GET /api/meals/recommend/<user_id> - meals ranked against the day's
+  remaining macro budget (needs numpy)
+
+CHANGES FROM 1.12.0:
+- ADDED: GET /api/bootstrap/<user_id> - diet plans, preference and today's totals
+  read concurrently and returned together, with per-section errors
+
+CHANGES FROM 1.11.0:
+- /api/tasks can acknowledge immediately and write behind (config.TASK_WRITE_BEHIND_ENABLED)
+- ADDED: GET /api/tasks/queue - write-behind queue and flush stats
+
+CHANGES FROM 1.10.0:
+- ADDED: POST /api/db/procedures/refresh - re-probe deployed stored procedures
+
+CHANGES FROM 1.9.0:
+- Connection pool counts exported as metrics gauges
+
+CHANGES FROM 1.8.0:
+- ADDED: GET /api/grocery-list/<user_id>?from=&to= - aggregated, unit-normalized grocery list
+
+CHANGES FROM 1.7.0:
+- ADDED: GET /api/meal-plans/week/<user_id>?start= backed by dbo.sp_GetWeeklyPlan
+
+CHANGES FROM 1.6.0:
+- ADDED: GET /api/user/totals/<user_id>?from=&to= - per-day totals plus rolling averages
+- ADDED: POST /api/meal-plans/<plan_id>/status
+
+CHANGES FROM 1.5.0:
+- ADDED: POST /api/meal-plans/bulk - many meal plans in one transaction
+
+CHANGES FROM 1.4.0:
+- ADDED: GET /api/meals/suggest/batch - a full week of distinct suggestions in one call
+
+CHANGES FROM 1.3.0:
+- ETag / If-None-Match / Cache-Control on diet plans, preference and daily totals
+- Preference and meal-plan writes bump the matching cache versions
+
+CHANGES FROM 1.2.0:
+- /api/meals/suggest samples from the in-memory MealCatalog
+- ADDED: POST /api/meals/catalog/refresh to invalidate the catalog
 
 CHANGES FROM 1.1.0:
 - ADDED: /api/user/daily-totals/<user_id> endpoint for VitalsBar persistence
 
 Blueprints for better organization
 """
-from flask import Blueprint, request, jsonify
+import atexit
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from flask import Blueprint, Response, request, jsonify
+import config
+import export
+import http_cache
+import load_control
+import metrics
+from grocery import GroceryListCache, build_grocery_list
+from daily_totals import MEAL_PLAN_STATUSES, TOTAL_FIELDS, empty_totals, parse_iso_date, with_rolling_averages
 from database_manager import DatabaseManager
+import recommender
+from meal_catalog import MealCatalog, sample_distinct
+from meal_search import MealSearch
+from task_queue import TaskWriteBehind
 
 # Blueprints for better organization
 tasks_bp = Blueprint('tasks', __name__)
@@ -17,6 +130,27 @@ meals_bp = Blueprint('meals', __name__)
 plans_bp = Blueprint('plans', __name__)
 
 db = DatabaseManager()
+metrics.register_pool_gauges(lambda: db.pool.stats() if db.pool else None)
+metrics.register_cache_gauges("preferences", db.preference_cache.stats)
+metrics.register_cache_gauges("daily_totals", db.totals_store.stats)
+catalog = MealCatalog(db.get_meal_catalog, shared_dir=config.MEAL_CATALOG_SHARED_DIR or None)
+meal_recommender = recommender.Recommender(catalog)
+meal_search = MealSearch(catalog)
+grocery_cache = GroceryListCache()
+
+# Write-behind for /api/tasks; flushed at interpreter exit so queued updates are not lost
+task_queue = None
+if config.TASK_WRITE_BEHIND_ENABLED:
+    task_queue = TaskWriteBehind(db.upsert_tasks).start()
+    atexit.register(task_queue.close)
+
+# Sheds excess DB-bound requests with a 503 instead of queuing them on the pool
+admission = load_control.AdmissionGate()
+admission.protect(tasks_bp, user_bp, meals_bp, plans_bp)
+metrics.register_load_gauges(lambda: {"admission": admission.stats(), "single_flight": db.single_flight.stats()})
+
+# Fans independent reads inside one request out to pooled connections
+fanout = ThreadPoolExecutor(max_workers=config.BOOTSTRAP_WORKERS, thread_name_prefix="amble-fanout")
 
 # ────────────────────────────────────────────────
 # Existing Task & Health Routes (unchanged)
@@ -34,6 +168,20 @@ def update_task():
     if not all(k in data for k in required_fields):
         return jsonify({"error": "Missing required task fields"}), 400
 
+    if task_queue is not None:
+        outcome = task_queue.submit({
+            "task_id": data['task_id'],
+            "file_path": data['file_path'],
+            "file_name": data['file_name'],
+            "description": data['description'],
+            "status": data.get('status', 'Pending')
+        })
+        if outcome is None:
+            response = jsonify({"error": "Task queue full, retry shortly"})
+            response.headers["Retry-After"] = str(config.TASK_QUEUE_RETRY_AFTER)
+            return response, 503
+        return jsonify({"message": f"Task {data['task_id']} queued", "queue": outcome}), 202
+
     success = db.upsert_task(
         task_id=data['task_id'],
         file_path=data['file_path'],
@@ -48,13 +196,67 @@ def update_task():
         return jsonify({"error": "Database operation failed"}), 500
 
 
+@tasks_bp.route('/api/tasks/queue', methods=['GET'])
+@load_control.exempt
+def task_queue_stats():
+    """Write-behind queue depth, flush stats and dead-lettered updates."""
+    if task_queue is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **task_queue.stats(), "dead_letters": task_queue.dead_letters()}), 200
+
+
 @tasks_bp.route('/api/health', methods=['GET'])
+@load_control.exempt
 def health_check():
-    """Simple endpoint to verify the API is running."""
-    return jsonify({"status": "API is online", "database": "Connected"}), 200
+    """
+    API and database health. 200 when a SELECT 1 probe succeeds, otherwise 503
+    with the circuit breaker state (and Retry-After while it is open).
+    """
+    health = db.health_check()
+    breaker = health["breaker"]
+    body = {
+        "status": "API is online",
+        "database": "Connected" if health["healthy"] else "Unavailable",
+        "probe_ms": health["probe_ms"],
+        "last_success": breaker["last_success_at"],
+        "breaker": breaker
+    }
+    replication = db.replication_stats()
+    if replication["replicas"]:
+        body["replicas"] = replication["replicas"]
+    if health["healthy"]:
+        return jsonify(body), 200
+    response = jsonify(body)
+    if breaker["retry_in_s"]:
+        response.headers["Retry-After"] = str(max(1, int(round(breaker["retry_in_s"]))))
+    return response, 503
+
+
+@tasks_bp.route('/api/db/load', methods=['GET'])
+@load_control.exempt
+def load_stats():
+    """Admission gate, single-flight and replica routing counters for this process."""
+    return jsonify({
+        "admission": admission.stats(),
+        "single_flight": {"enabled": config.SINGLE_FLIGHT_ENABLED, **db.single_flight.stats()},
+        "replication": db.replication_stats()
+    }), 200
+
+
+@tasks_bp.route('/api/db/procedures/refresh', methods=['POST'])
+def refresh_procedures():
+    """
+    Re-check which stored procedures exist in SQL Server.
+    Call after deploying new procedures; until then the inline SQL fallbacks stay in use.
+    """
+    stats = db.refresh_procedures()
+    if stats is None:
+        return jsonify({"error": "Database connection failed"}), 500
+    return jsonify(stats), 200
 
 
 @tasks_bp.route('/api/diet-plans', methods=['GET'])
+@http_cache.conditional(config.CACHE_CONTROL_DIET_PLANS)
 def get_diet_plans_route():
     """
     Endpoint to retrieve all diet plans for the combo box.
@@ -73,6 +275,10 @@ def get_diet_plans_route():
 # ────────────────────────────────────────────────
 
 @user_bp.route('/api/user/preference/<int:user_id>', methods=['GET'])
+@http_cache.conditional(
+    config.CACHE_CONTROL_USER_DATA,
+    version_key=lambda user_id: http_cache.user_key("preference", user_id)
+)
 def get_user_preference(user_id):
     """
     Fetch active diet preference for a user.
@@ -105,6 +311,7 @@ def update_user_preference():
     try:
         success = db.update_user_diet_preference(user_id, diet_name)
         if success:
+            http_cache.versions.bump(http_cache.user_key("preference", user_id))
             return jsonify({"message": f"Preference updated for user {user_id}"}), 200
         else:
             return jsonify({"error": "Failed to update preference"}), 500
@@ -113,11 +320,90 @@ def update_user_preference():
         return jsonify({"error": "Internal server error"}), 500
 
 
+# ────────────────────────────────────────────────
+# Bootstrap Route (app startup in one round trip)
+# ────────────────────────────────────────────────
+
+def bootstrap_sections(user_id):
+    """(name, fn, args) for each independent read combined by /api/bootstrap."""
+    return (
+        # strict: a failed read is None, not an empty list that looks successful
+        ("DietPlans", functools.partial(db.get_diet_plans, strict=True), ()),
+        ("Preference", db.get_user_preference, (user_id,)),
+        ("DailyTotals", db.get_daily_totals, (user_id,)),
+    )
+
+
+def bootstrap_payload(user_id, results):
+    """
+    Combine section results (value or exception, in bootstrap_sections order)
+    into (status, payload). Failed sections are null with a message in Errors.
+    """
+    payload = {"UserID": user_id}
+    errors = {}
+    for (name, _fn, _args), result in zip(bootstrap_sections(user_id), results):
+        if isinstance(result, BaseException):
+            print(f"[Bootstrap Error] user_id={user_id}, section={name}: {result!r}")
+            errors[name] = "Timed out" if isinstance(result, TimeoutError) else "Database operation failed"
+            result = None
+        elif result is None:
+            errors[name] = (
+                f"No preferences found for user {user_id}" if name == "Preference"
+                else "Database operation failed"
+            )
+        payload[name] = result
+    payload["Errors"] = errors
+    status = 500 if len(errors) == len(results) else 200
+    return status, payload
+
+
+@user_bp.route('/api/bootstrap/<int:user_id>', methods=['GET'])
+@http_cache.conditional(config.CACHE_CONTROL_USER_DATA)
+def get_bootstrap(user_id):
+    """
+    Everything App.js needs for first render in one call: diet plans, the
+    active preference and today's totals. The three reads run concurrently.
+
+    Returns:
+      {
+        "UserID": 2,
+        "DietPlans": [ {...} ],
+        "Preference": { "ActiveDietName": "Keto" },
+        "DailyTotals": { "TotalCalories": 520, ..., "ForDate": "2026-01-30" },
+        "Errors": { "Preference": "No preferences found for user 2" }
+      }
+    """
+    sections = bootstrap_sections(user_id)
+    futures = [fanout.submit(fn, *args) for _name, fn, args in sections]
+    wait(futures, timeout=config.BOOTSTRAP_TIMEOUT)
+
+    results = []
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            results.append(TimeoutError("section did not finish in time"))
+        elif future.exception() is not None:
+            results.append(future.exception())
+        else:
+            results.append(future.result())
+
+    status, payload = bootstrap_payload(user_id, results)
+    if payload["Errors"]:
+        # Partial results must not be revalidated against later
+        return jsonify(payload), status, {"Cache-Control": "no-store"}
+    return jsonify(payload), status
+
+
 # ────────────────────────────────────────────────
 # NEW: Daily Totals Route (for VitalsBar persistence)
 # ────────────────────────────────────────────────
 
 @user_bp.route('/api/user/daily-totals/<int:user_id>', methods=['GET'])
+@http_cache.conditional(
+    config.CACHE_CONTROL_USER_DATA,
+    version_key=lambda user_id: http_cache.user_key("totals", user_id),
+    vary=lambda user_id: request.args.get('date') or date.today().isoformat()
+)
 def get_user_daily_totals(user_id):
     """
     NEW: Fetch daily nutritional totals for a user.
@@ -137,11 +423,16 @@ def get_user_daily_totals(user_id):
       }
     """
     target_date = request.args.get('date')  # Optional: '2026-01-30'
+    try:
+        parse_iso_date(target_date)
+    except ValueError:
+        return jsonify({"error": "'date' must be YYYY-MM-DD"}), 400
     
     try:
         totals = db.get_daily_totals(user_id, target_date)
         if totals is None:
-            # Return zeros if no data (not an error)
+            # Return zeros if no data (not an error), but never let a client
+            # revalidate against them - the real totals may exist
             return jsonify({
                 "TotalCalories": 0,
                 "TotalProtein": 0,
@@ -149,13 +440,76 @@ def get_user_daily_totals(user_id):
                 "TotalCarbs": 0,
                 "MealCount": 0,
                 "ForDate": target_date or "today"
-            }), 200
+            }), 200, {"Cache-Control": "no-store"}
         return jsonify(totals), 200
     except Exception as e:
         print(f"[Daily Totals Error] user_id={user_id}, date={target_date}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+@user_bp.route('/api/user/totals/<int:user_id>', methods=['GET'])
+@http_cache.conditional(
+    config.CACHE_CONTROL_USER_DATA,
+    version_key=lambda user_id: http_cache.user_key("totals", user_id),
+    vary=lambda user_id: request.query_string.decode('utf-8') + "|" + date.today().isoformat()
+)
+def get_user_totals_range(user_id):
+    """
+    Daily nutritional totals for every day in a range, with rolling averages.
+    Replaces one /api/user/daily-totals call per day for week/month views.
+
+    Optional query params:
+      - from:   ISO date (defaults to 6 days before 'to')
+      - to:     ISO date (defaults to today)
+      - window: rolling average window in days (default DAILY_TOTALS_ROLLING_WINDOW)
+
+    Returns:
+      {
+        "UserID": 2, "From": "2026-01-24", "To": "2026-01-30", "Window": 7,
+        "Days": [ { "ForDate": "2026-01-24", "TotalCalories": 520, ...,
+                    "Rolling": { "TotalCalories": 480.0, ... } }, ... ],
+        "Averages": { "TotalCalories": 501.4, ... }
+      }
+    """
+    try:
+        end = parse_iso_date(request.args.get('to'), date.today())
+        start = parse_iso_date(request.args.get('from'), end - timedelta(days=6))
+        window = int(request.args.get('window', config.DAILY_TOTALS_ROLLING_WINDOW))
+    except ValueError:
+        return jsonify({"error": "'from'/'to' must be YYYY-MM-DD and 'window' an integer"}), 400
+
+    span = (end - start).days + 1
+    if span < 1:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+    if span > config.DAILY_TOTALS_MAX_RANGE_DAYS:
+        return jsonify({"error": f"Range too large (max {config.DAILY_TOTALS_MAX_RANGE_DAYS} days)"}), 400
+    if not 1 <= window <= config.DAILY_TOTALS_MAX_RANGE_DAYS:
+        return jsonify({"error": "'window' out of range"}), 400
+
+    try:
+        # Load window-1 lead-in days so the first day's rolling average is complete
+        days = db.get_daily_totals_range(user_id, start - timedelta(days=window - 1), end)
+        if days is None:
+            return jsonify({"error": "Database operation failed"}), 500
+
+        days = with_rolling_averages(days, window)
+        averages = {
+            field: round(sum(d[field] or 0 for d in days) / len(days), 1)
+            for field in TOTAL_FIELDS
+        }
+        return jsonify({
+            "UserID": user_id,
+            "From": start.isoformat(),
+            "To": end.isoformat(),
+            "Window": window,
+            "Days": days,
+            "Averages": averages
+        }), 200
+    except Exception as e:
+        print(f"[Totals Range Error] user_id={user_id}, from={start}, to={end}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
 # ────────────────────────────────────────────────
 # Meal Suggestion Route
 # ────────────────────────────────────────────────
@@ -165,14 +519,19 @@ def suggest_random_meal():
     """
     Returns a random meal matching the requested diet category.
     Matches Dashboard.jsx → /api/meals/suggest?diet=Keto
-    Uses existing db.get_random_meal_by_diet()
+    Samples from the in-memory MealCatalog; falls back to
+    db.get_random_meal_by_diet() if the catalog cannot be loaded.
     """
     diet = request.args.get('diet')
     if not diet:
         return jsonify({"error": "Missing 'diet' query parameter"}), 400
 
     try:
-        meal_data = db.get_random_meal_by_diet(diet)
+        meal_data = None
+        if config.MEAL_CATALOG_ENABLED:
+            meal_data = catalog.random_meal(diet)
+        if meal_data is None and not (config.MEAL_CATALOG_ENABLED and catalog.is_loaded()):
+            meal_data = db.get_random_meal_by_diet(diet)
         if not meal_data:
             return jsonify({"error": f"No meals available for diet: {diet}"}), 404
         
@@ -182,6 +541,234 @@ def suggest_random_meal():
         return jsonify({"error": "Internal server error"}), 500
 
 
+@meals_bp.route('/api/meals/suggest/batch', methods=['GET'])
+def suggest_meal_batch():
+    """
+    Returns distinct suggestions for every day/meal-time slot of a week.
+    Replaces one /api/meals/suggest call per slot on the Dashboard.
+
+    Query params:
+      - diet:      diet category (required)
+      - days:      number of days, 1..SUGGEST_BATCH_MAX_DAYS (default 7)
+      - mealTimes: comma separated, e.g. Breakfast,Lunch,Dinner (default all three)
+      - startDate: optional ISO date; each day then carries its plannedDate
+
+    Returns:
+      {
+        "diet": "Keto",
+        "days": [
+          { "dayIndex": 0, "plannedDate": "2026-02-02",
+            "meals": { "Breakfast": { "MealID": 7, ..., "ingredients": [...] }, ... } }
+        ],
+        "totalSlots": 21,
+        "distinctMeals": 21
+      }
+    """
+    diet = request.args.get('diet')
+    if not diet:
+        return jsonify({"error": "Missing 'diet' query parameter"}), 400
+
+    try:
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({"error": "'days' must be an integer"}), 400
+    if not 1 <= days <= config.SUGGEST_BATCH_MAX_DAYS:
+        return jsonify({"error": f"'days' must be between 1 and {config.SUGGEST_BATCH_MAX_DAYS}"}), 400
+
+    meal_times_arg = request.args.get('mealTimes')
+    if meal_times_arg:
+        meal_times = [t.strip() for t in meal_times_arg.split(',') if t.strip()]
+    else:
+        meal_times = list(config.SUGGEST_BATCH_DEFAULT_MEAL_TIMES)
+    if not meal_times or len(set(meal_times)) != len(meal_times):
+        return jsonify({"error": "'mealTimes' must be a list of distinct meal times"}), 400
+
+    start_date = None
+    if request.args.get('startDate'):
+        try:
+            start_date = date.fromisoformat(request.args['startDate'])
+        except ValueError:
+            return jsonify({"error": "'startDate' must be YYYY-MM-DD"}), 400
+
+    try:
+        slot_count = days * len(meal_times)
+        meals = None
+        if config.MEAL_CATALOG_ENABLED:
+            meals = catalog.sample_meals(diet, slot_count)
+        if meals is None:
+            # Catalog unavailable - one round trip for the diet, sampled here
+            candidates = db.get_meals_by_diet(diet)
+            if candidates is None:
+                return jsonify({"error": "Database operation failed"}), 500
+            meals = sample_distinct(candidates, slot_count)
+
+        if not meals:
+            return jsonify({"error": f"No meals available for diet: {diet}"}), 404
+
+        week = []
+        picks = iter(meals)
+        for day_index in range(days):
+            week.append({
+                "dayIndex": day_index,
+                "plannedDate": (start_date + timedelta(days=day_index)).isoformat() if start_date else None,
+                "meals": {meal_time: next(picks) for meal_time in meal_times}
+            })
+
+        return jsonify({
+            "diet": diet,
+            "days": week,
+            "totalSlots": slot_count,
+            "distinctMeals": len({m["MealID"] for m in meals})
+        }), 200
+    except Exception as e:
+        print(f"[Meal Suggest Batch Error] diet={diet} days={days}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@meals_bp.route('/api/meals/search', methods=['GET'])
+def search_meals():
+    """
+    Search meals by name, ingredient or smart group from the in-memory index.
+    Every word must match a whole word or the start of one ("salm" finds salmon).
+
+    Query params (q or diet required):
+      - q:        search text
+      - diet:     only meals of this diet category
+      - exclude:  comma separated ingredients to leave out, e.g. peanut,shellfish
+      - userId:   also leave out that user's saved allergies
+      - page:     1-based page (default 1)
+      - pageSize: 1..SEARCH_MAX_PAGE_SIZE (default SEARCH_DEFAULT_PAGE_SIZE)
+
+    Returns:
+      { "Query": "salmon", "Diet": null, "Excluded": ["peanut"], "Total": 12,
+        "Page": 1, "PageSize": 20,
+        "Meals": [ { "MealID": 7, ..., "Score": 4, "ingredients": [...] } ] }
+    """
+    query = (request.args.get('q') or '').strip()
+    diet = request.args.get('diet')
+    if not query and not diet:
+        return jsonify({"error": "Missing 'q' or 'diet' query parameter"}), 400
+
+    try:
+        page = int(request.args.get('page', 1))
+        page_size = int(request.args.get('pageSize', config.SEARCH_DEFAULT_PAGE_SIZE))
+        user_id = request.args.get('userId')
+        user_id = int(user_id) if user_id else None
+    except ValueError:
+        return jsonify({"error": "'page', 'pageSize' and 'userId' must be integers"}), 400
+    if page < 1 or not 1 <= page_size <= config.SEARCH_MAX_PAGE_SIZE:
+        return jsonify({"error": f"'page' must be >= 1 and 'pageSize' between 1 and {config.SEARCH_MAX_PAGE_SIZE}"}), 400
+
+    excluded = [e.strip() for e in (request.args.get('exclude') or '').split(',') if e.strip()]
+
+    try:
+        if user_id is not None:
+            pref = db.get_user_preference(user_id) or {}
+            allergies = pref.get("Allergies") or ""
+            excluded += [a.strip() for a in allergies.replace(';', ',').split(',') if a.strip()]
+        excluded = list(dict.fromkeys(excluded))
+
+        result = meal_search.search(query, diet, excluded, page=page, page_size=page_size)
+        if result is None:
+            return jsonify({"error": "Meal catalog unavailable"}), 503
+        return jsonify({
+            "Query": query,
+            "Diet": diet,
+            "Excluded": excluded,
+            "Page": page,
+            "PageSize": page_size,
+            **result
+        }), 200
+    except Exception as e:
+        print(f"[Meal Search Error] q={query!r} diet={diet}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@meals_bp.route('/api/meals/recommend/<int:user_id>', methods=['GET'])
+def recommend_meals(user_id):
+    """
+    Meals that best fit what is left of the user's macro budget today.
+    Scores the whole diet in the MealCatalog at once, skipping recently planned meals.
+
+    Optional query params:
+      - diet:         diet category (defaults to the user's active diet)
+      - k:            number of meals, 1..RECOMMEND_MAX_K (default RECOMMEND_DEFAULT_K)
+      - temperature:  0 for a strict ranking, higher for more variety
+      - excludeDays:  skip meals planned within this many days (default RECOMMEND_EXCLUDE_DAYS)
+      - seed:         integer for reproducible picks
+
+    Returns:
+      {
+        "UserID": 2, "Diet": "Keto", "CaloriesGoal": 2500,
+        "Eaten": { "TotalCalories": 520, ... },
+        "Remaining": { "Calories": 1980.0, "ProteinGrams": ..., ... },
+        "Target": { ...per-meal share of Remaining... },
+        "ExclusionsRelaxed": false,
+        "Meals": [ { "MealID": 7, ..., "Score": -0.1834, "ingredients": [...] } ]
+      }
+    """
+    if not recommender.available():
+        return jsonify({"error": "Recommendations require numpy on the server"}), 501
+
+    try:
+        k = int(request.args.get('k', config.RECOMMEND_DEFAULT_K))
+        temperature = float(request.args.get('temperature', config.RECOMMEND_DEFAULT_TEMPERATURE))
+        exclude_days = int(request.args.get('excludeDays', config.RECOMMEND_EXCLUDE_DAYS))
+        seed = request.args.get('seed')
+        seed = int(seed) if seed is not None else None
+    except ValueError:
+        return jsonify({"error": "'k', 'excludeDays' and 'seed' must be integers and 'temperature' a number"}), 400
+    if not 1 <= k <= config.RECOMMEND_MAX_K:
+        return jsonify({"error": f"'k' must be between 1 and {config.RECOMMEND_MAX_K}"}), 400
+    if temperature < 0 or exclude_days < 0:
+        return jsonify({"error": "'temperature' and 'excludeDays' must not be negative"}), 400
+
+    try:
+        today = date.today()
+        context = db.get_recommendation_context(user_id, today - timedelta(days=exclude_days))
+        if context is None:
+            return jsonify({"error": "Database operation failed"}), 500
+        diet = request.args.get('diet') or context["ActiveDietName"]
+        if not diet:
+            return jsonify({"error": f"No 'diet' given and no preferences found for user {user_id}"}), 404
+        calories_goal = context["CaloriesGoal"] or config.RECOMMEND_DEFAULT_CALORIES_GOAL
+
+        eaten = db.get_daily_totals(user_id) or empty_totals(today.isoformat())
+        result = meal_recommender.recommend(
+            diet, calories_goal,
+            eaten=[eaten["TotalCalories"], eaten["TotalProtein"], eaten["TotalFat"], eaten["TotalCarbs"]],
+            meals_left=config.RECOMMEND_MEALS_PER_DAY - eaten["MealCount"],
+            exclude_ids=context["RecentMealIDs"] if exclude_days else (),
+            k=k, temperature=temperature, seed=seed
+        )
+        if result is None:
+            return jsonify({"error": "Meal catalog unavailable"}), 503
+        if not result["Meals"]:
+            return jsonify({"error": f"No meals available for diet: {diet}"}), 404
+
+        return jsonify({
+            "UserID": user_id,
+            "Diet": diet,
+            "CaloriesGoal": calories_goal,
+            "Eaten": eaten,
+            **result
+        }), 200
+    except Exception as e:
+        print(f"[Meal Recommend Error] user_id={user_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@meals_bp.route('/api/meals/catalog/refresh', methods=['POST'])
+@load_control.exempt
+def refresh_meal_catalog():
+    """
+    Drop the cached meal catalog so the next suggestion reloads it.
+    Call after meals or ingredients are edited in SQL Server.
+    """
+    catalog.invalidate()
+    return jsonify({"message": "Meal catalog invalidated"}), 200
+
+
 # ────────────────────────────────────────────────
 # Meal Plan Creation Route
 # ────────────────────────────────────────────────
@@ -202,6 +789,10 @@ def add_meal_plan():
 
     if not all([user_id, meal_id, planned_date]):
         return jsonify({"error": "Missing required fields: userId, mealId, plannedDate"}), 400
+    try:
+        planned_date = parse_iso_date(str(planned_date)).isoformat()
+    except ValueError:
+        return jsonify({"error": "'plannedDate' must be YYYY-MM-DD"}), 400
 
     try:
         success = db.insert_meal_plan(
@@ -212,6 +803,7 @@ def add_meal_plan():
         )
         
         if success:
+            http_cache.versions.bump(http_cache.user_key("totals", user_id))
             return jsonify({"message": "Meal plan added successfully"}), 201
         else:
             return jsonify({"error": "Failed to save meal plan"}), 500
@@ -220,6 +812,237 @@ def add_meal_plan():
         return jsonify({"error": "Internal server error"}), 500
 
 
+@plans_bp.route('/api/meal-plans/bulk', methods=['POST'])
+def add_meal_plans_bulk():
+    """
+    Create many meal plan entries in one request (a whole week, or a history import).
+    Expects:
+      {
+        "userId": 2,                 # default for plans without their own userId
+        "atomic": true,              # optional, all-or-nothing (default true)
+        "plans": [ { "mealId": 42, "plannedDate": "2025-04-10", "mealTime": "Lunch" }, ... ]
+      }
+    Returns per-row results:
+      { "inserted": 20, "failed": 1, "committed": true,
+        "results": [ { "index": 0, "status": "inserted" }, ... ] }
+    """
+    data = request.get_json(silent=True) or {}
+    plans = data.get('plans')
+    default_user_id = data.get('userId')
+    atomic = data.get('atomic', True)
+
+    if not isinstance(plans, list) or not plans:
+        return jsonify({"error": "Missing required field: plans (non-empty list)"}), 400
+    if len(plans) > config.MEAL_PLAN_BULK_MAX_ROWS:
+        return jsonify({"error": f"Too many plans (max {config.MEAL_PLAN_BULK_MAX_ROWS})"}), 413
+
+    rows = []
+    for plan in plans:
+        plan = plan if isinstance(plan, dict) else {}
+        rows.append({
+            "user_id": plan.get('userId', default_user_id),
+            "meal_id": plan.get('mealId'),
+            "planned_date": plan.get('plannedDate'),
+            "meal_time": plan.get('mealTime', 'Lunch')
+        })
+
+    try:
+        outcome = db.insert_meal_plans_bulk(rows, atomic=bool(atomic))
+        if outcome is None:
+            return jsonify({"error": "Database connection failed"}), 500
+
+        if outcome["inserted"]:
+            for user_id in {row["user_id"] for row in rows}:
+                http_cache.versions.bump(http_cache.user_key("totals", user_id))
+
+        if outcome["inserted"] and not outcome["failed"]:
+            status = 201
+        elif outcome["inserted"]:
+            status = 207
+        elif any(r["status"] == "invalid" for r in outcome["results"]):
+            status = 400
+        else:
+            status = 500
+        return jsonify(outcome), status
+    except Exception as e:
+        print(f"[Meal Plan Bulk Error] rows={len(rows)}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@plans_bp.route('/api/meal-plans/week/<int:user_id>', methods=['GET'])
+@http_cache.conditional(
+    config.CACHE_CONTROL_USER_DATA,
+    version_key=lambda user_id: http_cache.user_key("totals", user_id),
+    vary=lambda user_id: request.args.get('start') or date.today().isoformat()
+)
+# MealPlans has no modification time, so Last-Modified comes from the
+# per-process write counter and is only sent in versioned mode
+@http_cache.last_modified(
+    config.CACHE_CONTROL_USER_DATA,
+    version_key=lambda user_id: http_cache.user_key("totals", user_id)
+)
+def get_weekly_plan(user_id):
+    """
+    Every planned meal in a 7-day week with macros and ingredients, so the
+    Dashboard can rebuild its week after a reload in one request.
+    Supports If-None-Match: an unchanged week answers 304 (and
+    If-Modified-Since with config.HTTP_CACHE_VERSIONED_ETAGS).
+
+    Optional query params:
+      - start: ISO date of the first day (defaults to today)
+    """
+    try:
+        start = parse_iso_date(request.args.get('start'), date.today())
+    except ValueError:
+        return jsonify({"error": "'start' must be YYYY-MM-DD"}), 400
+
+    try:
+        week = db.get_weekly_plan(user_id, start)
+        if week is None:
+            return jsonify({"error": "Database operation failed"}), 500
+        return jsonify(week), 200
+    except Exception as e:
+        print(f"[Weekly Plan Error] user_id={user_id}, start={start}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@plans_bp.route('/api/meal-plans/export/<int:user_id>', methods=['GET'])
+def export_meal_plans(user_id):
+    """
+    Stream a user's full meal-plan history joined with meal macros for
+    analytics. Rows are fetched and sent in batches, so memory use is the
+    same for a week or for years of history.
+
+    Optional query params:
+      - from:   ISO date (inclusive; defaults to the first plan)
+      - to:     ISO date (inclusive; defaults to the last plan)
+      - format: ndjson (default) or csv
+    Sent gzip-encoded when the client's Accept-Encoding allows it.
+    """
+    fmt = (request.args.get('format') or 'ndjson').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"'format' must be one of {', '.join(export.FORMATS)}"}), 400
+    try:
+        start = parse_iso_date(request.args.get('from'))
+        end = parse_iso_date(request.args.get('to'))
+    except ValueError:
+        return jsonify({"error": "'from' and 'to' must be YYYY-MM-DD"}), 400
+    if start and end and end < start:
+        return jsonify({"error": "'to' must not be before 'from'"}), 400
+
+    batches = db.iter_meal_plan_history(user_id, start, end)
+    columns = next(batches, None)
+    if columns is None:
+        batches.close()
+        return jsonify({"error": "Database operation failed"}), 500
+
+    # Honours q-values: "gzip;q=0" refuses gzip, "*" accepts it
+    compress = request.accept_encodings["gzip"] > 0
+
+    def body():
+        # Closing the response closes this generator, which closes `batches`
+        # and returns the connection even if the client disconnects mid-stream
+        try:
+            chunks = export.encode_chunks(fmt, columns, batches)
+            if compress:
+                chunks = export.gzip_chunks(chunks)
+            yield from chunks
+        except Exception as e:
+            print(f"[Meal Plan Export Error] user_id={user_id}: {e}")
+            raise
+        finally:
+            batches.close()
+
+    response = Response(body(), mimetype=export.FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="meal-plans-{user_id}.{fmt}"'
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["Vary"] = "Accept-Encoding"
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+@plans_bp.route('/api/meal-plans/<int:plan_id>/status', methods=['POST'])
+def update_meal_plan_status(plan_id):
+    """
+    Change a meal plan's status (e.g. Pending -> Accepted).
+    Expects: { "status": "Accepted" } (one of MEAL_PLAN_STATUSES, any case)
+    """
+    data = request.get_json(silent=True) or {}
+    status = data.get('status')
+    if not status:
+        return jsonify({"error": "Missing required field: status"}), 400
+    canonical = {s.lower(): s for s in MEAL_PLAN_STATUSES}.get(str(status).strip().lower())
+    if canonical is None:
+        return jsonify({"error": f"'status' must be one of: {', '.join(MEAL_PLAN_STATUSES)}"}), 400
+
+    try:
+        updated = db.update_meal_plan_status(plan_id, canonical)
+        if updated is None:
+            return jsonify({"error": f"Could not update meal plan {plan_id}"}), 500
+        if not updated:
+            return jsonify({"error": f"Meal plan {plan_id} not found"}), 404
+        http_cache.versions.bump(http_cache.user_key("totals", updated["UserID"]))
+        return jsonify(updated), 200
+    except Exception as e:
+        print(f"[Meal Plan Status Error] plan={plan_id}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+# ────────────────────────────────────────────────
+# Grocery List Route
+# ────────────────────────────────────────────────
+
+@plans_bp.route('/api/grocery-list/<int:user_id>', methods=['GET'])
+def get_grocery_list(user_id):
+    """
+    Aggregated grocery list for every planned meal in a date range.
+    Quantities are parsed into canonical units (g, ml, counts), duplicates
+    summed and the items grouped by SmartGroup.
+
+    Optional query params:
+      - from: ISO date (defaults to today)
+      - to:   ISO date (defaults to 6 days after 'from')
+
+    Returns:
+      { "UserID": 2, "From": "...", "To": "...",
+        "Groups": [ { "SmartGroup": "Produce",
+                      "Items": [ { "IngredientName": "Garlic", "Quantity": "3 clove",
+                                   "Amount": 3.0, "Unit": "clove", "MealCount": 2, ... } ] } ] }
+    """
+    try:
+        start = parse_iso_date(request.args.get('from'), date.today())
+        end = parse_iso_date(request.args.get('to'), start + timedelta(days=6))
+    except ValueError:
+        return jsonify({"error": "'from' and 'to' must be YYYY-MM-DD"}), 400
+
+    span = (end - start).days + 1
+    if span < 1 or span > config.GROCERY_MAX_RANGE_DAYS:
+        return jsonify({"error": f"Range must be 1 to {config.GROCERY_MAX_RANGE_DAYS} days"}), 400
+
+    try:
+        cache_key = (user_id, start.isoformat(), end.isoformat())
+        # Read from the database, so a plan written by any worker retires the entry
+        version = db.get_meal_plan_version(user_id, start, end)
+        payload = grocery_cache.get(cache_key, version) if version is not None else None
+        if payload is None:
+            rows = db.get_planned_ingredients(user_id, start, end)
+            if rows is None:
+                return jsonify({"error": "Database operation failed"}), 500
+            payload = {
+                "UserID": user_id,
+                "From": start.isoformat(),
+                "To": end.isoformat(),
+                "Groups": build_grocery_list(rows)
+            }
+            if version is not None:
+                grocery_cache.put(cache_key, version, payload)
+        return jsonify(payload), 200
+    except Exception as e:
+        print(f"[Grocery List Error] user_id={user_id}, from={start}, to={end}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
 # ────────────────────────────────────────────────
 # Register all blueprints (add this to your main app.py / server file)
 # ────────────────────────────────────────────────
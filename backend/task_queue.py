@@ -0,0 +1,286 @@
+"""
+File: task_queue.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- A batch the database rejects is retried one task at a time, so a single
+  task that always fails (bad FK, value too long) no longer rolls back the
+  others on every retry
+- A task rejected on its own max_attempts times is logged and moved to a
+  bounded dead-letter list instead of being re-queued forever
+- When the database cannot be reached (flush_fn returns None) the batch is
+  re-queued without counting an attempt against its tasks
+
+Description:
+- Optional write-behind mode for /api/tasks (config.TASK_WRITE_BEHIND_ENABLED)
+- POSTs are acknowledged once queued; repeated updates to the same task_id
+  inside the flush window collapse into the latest one
+- A background worker flushes queued tasks in batches, one transaction per
+  batch; a batch that cannot reach the database is re-queued (newer
+  updates win) and retried, one the database rejects is retried task by task
+- Past max_pending distinct tasks submit() refuses new work so the route can
+  answer 503 instead of growing without bound
+- close() stops the worker and flushes whatever is left synchronously
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class TaskWriteBehind:
+    """
+    Coalescing write-behind queue.
+
+    flush_fn(tasks) receives a list of task dicts and returns True when the
+    whole batch was committed, False when the database rejected it (nothing
+    committed) and None when the database could not be reached.
+    """
+
+    DEAD_LETTER_KEEP = 100
+
+    def __init__(self, flush_fn, flush_window=None, max_pending=None, batch_size=None, retry_delay=None,
+                 max_attempts=None):
+        self.flush_fn = flush_fn
+        self.flush_window = config.TASK_FLUSH_WINDOW if flush_window is None else flush_window
+        self.max_pending = max_pending or config.TASK_QUEUE_MAX_PENDING
+        self.batch_size = batch_size or config.TASK_FLUSH_BATCH_SIZE
+        self.retry_delay = config.TASK_FLUSH_RETRY_DELAY if retry_delay is None else retry_delay
+        self.max_attempts = max_attempts or config.TASK_FLUSH_MAX_ATTEMPTS
+
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()   # task_id -> latest task dict
+        self._attempts = {}             # task_id -> times rejected on its own
+        self._dead_letters = deque(maxlen=self.DEAD_LETTER_KEEP)
+        self._first_queued_at = None
+        self._flushing = False
+        self._stopping = False
+        self._thread = None
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.flushed_batches = 0
+        self.flushed_tasks = 0
+        self.failed_flushes = 0
+        self.retried_alone = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = None
+        self.last_flush_at = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="amble-task-flush", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, task):
+        """
+        Queue a task upsert. Returns "queued", "coalesced" (replaced a pending
+        update for the same task_id) or None when the queue is full.
+        """
+        task_id = task["task_id"]
+        with self._cond:
+            self.submitted += 1
+            # A newer version of a rejected task gets a fresh set of attempts
+            self._attempts.pop(task_id, None)
+            if task_id in self._pending:
+                self._pending[task_id] = task
+                self.coalesced += 1
+                return "coalesced"
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._pending[task_id] = task
+            if self._first_queued_at is None:
+                self._first_queued_at = time.monotonic()
+                self._cond.notify()
+            return "queued"
+
+    def _take_batch_locked(self):
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            batch.append(self._pending.popitem(last=False)[1])
+        self._first_queued_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _requeue_locked(self, batch):
+        # Updates that arrived while the batch was in flight are newer; keep them
+        for task in reversed(batch):
+            if task["task_id"] not in self._pending:
+                self._pending[task["task_id"]] = task
+                self._pending.move_to_end(task["task_id"], last=False)
+        if self._pending and self._first_queued_at is None:
+            self._first_queued_at = time.monotonic()
+
+    def _rejected_locked(self, task):
+        """Count a failed solo write; re-queue the task or dead-letter it. Caller holds the lock."""
+        task_id = task["task_id"]
+        if task_id in self._pending:
+            # Superseded while in flight: the newer update is tried on its own merits
+            return
+        attempts = self._attempts.get(task_id, 0) + 1
+        if attempts < self.max_attempts:
+            self._attempts[task_id] = attempts
+            self._requeue_locked([task])
+            return
+        self._attempts.pop(task_id, None)
+        self.dead_lettered += 1
+        self._dead_letters.append({
+            "task": task,
+            "attempts": attempts,
+            "failed_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        logger.error(f"[TaskQueue] Dropping task {task_id} after {attempts} failed write(s): {task}")
+
+    def _call(self, tasks):
+        try:
+            return self.flush_fn(tasks)
+        except Exception as e:
+            logger.error(f"[TaskQueue] Flush raised: {e}", exc_info=True)
+            return None
+
+    def _flush(self, batch):
+        """
+        Write one batch. Returns True when every task was written or
+        dead-lettered, False when some were re-queued for a later retry and
+        None when the database was unreachable (nothing was tried alone).
+        """
+        start = time.perf_counter()
+        ok = self._call(batch)
+        written, rejected, unreachable = [], [], []
+        if ok:
+            written = batch
+        elif ok is None:
+            unreachable = batch
+        elif len(batch) == 1:
+            rejected = batch
+        else:
+            # One bad task rolls back the whole transaction; find it by
+            # writing the tasks one at a time
+            for i, task in enumerate(batch):
+                solo = self._call([task])
+                if solo:
+                    written.append(task)
+                elif solo is False:
+                    rejected.append(task)
+                else:
+                    unreachable = batch[i:]
+                    break
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        with self._cond:
+            self.last_flush_ms = elapsed_ms
+            if ok is False and len(batch) > 1:
+                self.retried_alone += 1
+            if written:
+                self.flushed_batches += 1
+                self.flushed_tasks += len(written)
+                self.last_flush_at = datetime.now().isoformat(timespec="seconds")
+                for task in written:
+                    self._attempts.pop(task["task_id"], None)
+            if not ok:
+                self.failed_flushes += 1
+            # Keep the original order at the front of the queue
+            self._requeue_locked(unreachable)
+            for task in reversed(rejected):
+                self._rejected_locked(task)
+            requeued = any(task["task_id"] in self._attempts for task in rejected)
+
+        if unreachable:
+            return None
+        return not requeued
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while (not self._pending or self._flushing) and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                # Let the window fill so bursts for one task_id collapse
+                wait = self._first_queued_at + self.flush_window - time.monotonic()
+                if wait > 0 and len(self._pending) < self.batch_size:
+                    self._cond.wait(wait)
+                    continue
+                batch = self._take_batch_locked()
+                self._flushing = True
+
+            ok = self._flush(batch)
+
+            with self._cond:
+                self._flushing = False
+                self._cond.notify_all()
+                if not ok and not self._stopping:
+                    self._cond.wait(self.retry_delay)
+
+    def flush(self):
+        """
+        Synchronously write everything queued. Rejected tasks are retried
+        until written or dead-lettered; returns False if the database could
+        not be reached and tasks are still pending.
+        """
+        while True:
+            with self._cond:
+                while self._flushing:
+                    self._cond.wait()
+                batch = self._take_batch_locked()
+                if not batch:
+                    return True
+                self._flushing = True
+            try:
+                ok = self._flush(batch)
+            finally:
+                with self._cond:
+                    self._flushing = False
+                    self._cond.notify_all()
+            # False (a task re-queued with an attempt counted) ends in a
+            # write or a dead letter within max_attempts rounds
+            if ok is None:
+                return False
+
+    def close(self, timeout=10.0):
+        """Stop the worker and flush the remainder on the calling thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        ok = self.flush()
+        if not ok:
+            with self._cond:
+                lost = len(self._pending)
+            logger.error(f"[TaskQueue] Shutdown flush failed; {lost} task update(s) not written")
+        return ok
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "flush_window_s": self.flush_window,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "flushed_batches": self.flushed_batches,
+                "flushed_tasks": self.flushed_tasks,
+                "failed_flushes": self.failed_flushes,
+                "retried_alone": self.retried_alone,
+                "dead_lettered": self.dead_lettered,
+                "max_attempts": self.max_attempts,
+                "last_flush_ms": self.last_flush_ms,
+                "last_flush_at": self.last_flush_at,
+            }
+
+    def dead_letters(self):
+        """The most recent dead-lettered tasks, oldest first."""
+        with self._cond:
+            return list(self._dead_letters)
@@ -0,0 +1,21 @@
+"""
+File: tests/conftest.py
+Version: 1.0.0
+
+Description:
+- Run from the repository root or backend/: python -m pytest -q backend/tests
+- Without an ODBC driver manager the real pyodbc cannot be imported, so
+  tests/fake_pyodbc.py stands in for it
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+try:
+    import pyodbc  # noqa: F401
+except ImportError:
+    from tests import fake_pyodbc
+    sys.modules["pyodbc"] = fake_pyodbc
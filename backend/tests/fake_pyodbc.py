@@ -0,0 +1,165 @@
+"""
+File: tests/fake_pyodbc.py
+Version: 1.2.0
+
+CHANGES FROM 1.1.0:
+- ADDED: FakeDatabase.errors - SQL substring -> exception raised by execute()
+
+CHANGES FROM 1.0.0:
+- ADDED: InterfaceError
+
+Description:
+- Minimal pyodbc-shaped module for exercising ConnectionPool and
+  DatabaseManager without SQL Server or an ODBC driver manager
+- FakeDatabase.connect() hands out FakeConnections; a test can take the
+  whole database down (down = True) or break a single connection
+  (conn.broken = True) to model dropped sessions
+- Cursors answer SELECT 1 and otherwise return the rows registered in
+  FakeDatabase.results for a matching SQL substring, or raise the
+  exception registered in FakeDatabase.errors
+- conftest.py installs it as `pyodbc` only when the real module cannot be
+  imported
+"""
+import itertools
+import threading
+
+
+class Error(Exception):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._rows = []
+        self.description = None
+        self.rowcount = -1
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        self._connection._check()
+        self._connection.database.statements.append(sql)
+        for fragment, error in self._connection.database.errors.items():
+            if fragment in sql:
+                raise error
+        if sql.strip().upper() == "SELECT 1":
+            self._rows = [(1,)]
+        else:
+            self._rows = []
+            for fragment, rows in self._connection.database.results.items():
+                if fragment in sql:
+                    self._rows = list(rows)
+                    break
+        self.description = (("column", None),) if self._rows else None
+        return self
+
+    def executemany(self, sql, rows):
+        for row in rows:
+            self.execute(sql, row)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def nextset(self):
+        return False
+
+    def close(self):
+        self._rows = []
+
+
+class FakeConnection:
+    def __init__(self, database, conn_str, number):
+        self.database = database
+        self.conn_str = conn_str
+        self.number = number
+        self.closed = False
+        self.broken = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def _check(self):
+        if self.closed:
+            raise ProgrammingError("Attempt to use a closed connection.")
+        if self.broken:
+            raise OperationalError("08S01 Communication link failure")
+
+    def cursor(self):
+        self._check()
+        return FakeCursor(self)
+
+    def commit(self):
+        self._check()
+        self.commits += 1
+
+    def rollback(self):
+        self._check()
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDatabase:
+    """One fake server: counts connects and can be taken down."""
+
+    def __init__(self, name="fake"):
+        self.name = name
+        self.down = False
+        self.results = {}           # SQL substring -> rows
+        self.errors = {}            # SQL substring -> exception raised by execute()
+        self.statements = []
+        self.connections = []
+        self._numbers = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def connects(self):
+        return len(self.connections)
+
+    def connect(self, conn_str, timeout=None, **kwargs):
+        if self.down:
+            raise OperationalError(f"08001 Cannot reach {self.name}")
+        with self._lock:
+            connection = FakeConnection(self, conn_str, next(self._numbers))
+            self.connections.append(connection)
+        return connection
+
+
+# Module-level pyodbc API backed by one default database
+default_database = FakeDatabase()
+
+
+def connect(conn_str, timeout=None, **kwargs):
+    return default_database.connect(conn_str, timeout=timeout, **kwargs)
+
+
+def drivers():
+    return ["ODBC Driver 18 for SQL Server"]
@@ -0,0 +1,52 @@
+"""
+File: tests/test_admission_gate.py
+Version: 1.0.0
+
+Description:
+- AdmissionGate slot accounting: a plain response frees its slot at
+  teardown, a streamed response keeps it until the body is closed
+"""
+from flask import Blueprint, Flask, Response
+
+from load_control import AdmissionGate
+
+
+def make_app(gate):
+    bp = Blueprint("gated", __name__)
+
+    @bp.route("/plain")
+    def plain():
+        return "ok"
+
+    @bp.route("/stream")
+    def stream():
+        return Response(iter(["a", "b", "c"]))
+
+    gate.protect(bp)
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def test_plain_response_releases_the_slot():
+    gate = AdmissionGate(limit=1, wait=0.0, retry_after=1)
+    client = make_app(gate)
+    assert client.get("/plain").status_code == 200
+    assert client.get("/plain").status_code == 200
+    assert gate.stats()["active"] == 0
+
+
+def test_streamed_response_holds_the_slot_until_closed():
+    gate = AdmissionGate(limit=1, wait=0.0, retry_after=1)
+    client = make_app(gate)
+
+    streaming = client.get("/stream", buffered=False)
+    assert streaming.status_code == 200
+    assert gate.stats()["active"] == 1
+    busy = client.get("/plain")
+    assert busy.status_code == 503 and busy.headers["Retry-After"] == "1"
+
+    assert b"".join(streaming.response) == b"abc"
+    streaming.close()
+    assert gate.stats()["active"] == 0
+    assert client.get("/plain").status_code == 200
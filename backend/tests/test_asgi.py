@@ -0,0 +1,104 @@
+"""
+File: tests/test_asgi.py
+Version: 1.0.0
+
+Description:
+- AmbleASGI's WSGI bridge with a small WSGI app: the response is closed
+  after a normal stream, after the first call times out (504) and after a
+  chunk times out mid-stream, each time only once the blocked call returns
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from asgi import AmbleASGI, DbExecutor
+
+
+class Body:
+    """WSGI response iterable whose chunks can block and that records close()."""
+
+    def __init__(self, chunks, delays=None):
+        self.chunks = list(chunks)
+        self.delays = dict(delays or {})
+        self.index = 0
+        self.closed = threading.Event()
+        self.closed_while_running = False
+        self.running = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed.is_set() or self.index >= len(self.chunks):
+            raise StopIteration
+        self.running = True
+        try:
+            time.sleep(self.delays.get(self.index, 0))
+            chunk = self.chunks[self.index]
+            self.index += 1
+            return chunk
+        finally:
+            self.running = False
+
+    def close(self):
+        self.closed_while_running = self.running
+        self.closed.set()
+
+
+def make_app(body, build_delay=0.0):
+    def wsgi_app(environ, start_response):
+        time.sleep(build_delay)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return body
+    return wsgi_app
+
+
+def call(app, path="/stream"):
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = messages[0]["status"]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return status, body
+
+
+@pytest.fixture
+def executor():
+    pool = DbExecutor(max_workers=2, max_pending=10, timeout=0.1)
+    yield pool
+    pool.shutdown()
+
+
+def test_streamed_response_is_closed_after_the_last_chunk(executor):
+    body = Body([b"a", b"b", b"c"])
+    status, sent = call(AmbleASGI(make_app(body), executor))
+    assert (status, sent) == (200, b"abc")
+    assert body.closed.wait(1.0)
+
+
+def test_response_is_closed_when_the_first_call_times_out(executor):
+    body = Body([b"a", b"b"])
+    status, _ = call(AmbleASGI(make_app(body, build_delay=0.3), executor))
+    assert status == 504
+    assert not body.closed.is_set()     # still being built on the worker thread
+    assert body.closed.wait(1.0)
+    assert not body.closed_while_running
+
+
+def test_response_is_closed_when_a_chunk_times_out(executor):
+    body = Body([b"a", b"b", b"c"], delays={1: 0.3})
+    status, sent = call(AmbleASGI(make_app(body), executor))
+    assert (status, sent) == (200, b"a")
+    assert body.closed.wait(1.0)
+    # The close waited for the blocked chunk instead of racing it
+    assert not body.closed_while_running
+    assert body.index == 2
@@ -0,0 +1,52 @@
+"""
+File: tests/test_bootstrap.py
+Version: 1.0.0
+
+Description:
+- /api/bootstrap through the Flask app against tests/fake_pyodbc.py: a
+  database outage fails every section and answers 500, and diet plans
+  that cannot be read are reported in Errors rather than as an empty list
+"""
+import pytest
+
+import config
+from tests.fake_pyodbc import FakeDatabase
+
+
+@pytest.fixture
+def app_db(monkeypatch):
+    monkeypatch.setattr(config, "DB_WARMUP_ON_START", False)
+    monkeypatch.setattr(config, "DB_READ_REPLICAS", "")
+    import routes
+    from app import create_app
+
+    database = FakeDatabase()
+    routes.db.use_connector(database.connect)
+    routes.db.procedures.refresh()
+    yield create_app().test_client(), database, routes.db
+    routes.db.use_connector(FakeDatabase().connect)
+
+
+def test_bootstrap_answers_500_when_the_database_is_down(app_db):
+    client, database, _db = app_db
+    database.down = True
+
+    response = client.get("/api/bootstrap/7")
+    assert response.status_code == 500
+    body = response.get_json()
+    assert set(body["Errors"]) == {"DietPlans", "Preference", "DailyTotals"}
+    assert body["DietPlans"] is None
+    assert response.headers["Cache-Control"] == "no-store"
+
+
+def test_failed_diet_plan_read_is_an_error_not_an_empty_list(app_db):
+    client, database, db = app_db
+    database.results["sys.procedures"] = [("dbo", "usp_GetDietPlans")]
+    # The fake answers the procedure call with no result set, so reading
+    # cursor.description fails the way a broken read would
+    response = client.get("/api/bootstrap/7")
+    body = response.get_json()
+    assert body["DietPlans"] is None
+    assert body["Errors"]["DietPlans"] == "Database operation failed"
+    # Callers outside bootstrap keep getting []
+    assert db.get_diet_plans() == []
@@ -0,0 +1,247 @@
+"""
+File: tests/test_circuit_breaker.py
+Version: 1.0.0
+
+Description:
+- CircuitBreaker on a hand-driven clock: closed -> open after the failure
+  threshold, fail-fast while open, one half-open probe at a time, probe
+  success closing and probe failure re-opening it, and a probe that never
+  reports back being replaced
+- /api/health through the Flask app against tests/fake_pyodbc.py: 503 with
+  Retry-After while the breaker is open and no connection is attempted,
+  200 again once the half-open probe succeeds
+"""
+import threading
+
+import pytest
+
+import config
+from database_manager import CircuitBreaker
+from tests.fake_pyodbc import FakeDatabase
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure(RuntimeError("08001 unreachable"))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.admit() == "call"
+
+    breaker.record_failure(RuntimeError("08001 unreachable"))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["last_error"] == "08001 unreachable"
+
+
+def test_success_resets_the_failure_count(breaker):
+    for _ in range(5):
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.opens == 0
+
+
+def test_open_breaker_fails_fast_until_the_reset_timeout(breaker, clock):
+    _open(breaker)
+    assert breaker.admit() is None
+    assert breaker.retry_after() == 30
+
+    clock.advance(29.5)
+    assert breaker.admit() is None
+    assert breaker.retry_after() == pytest.approx(0.5)
+    assert breaker.rejected == 2
+
+    clock.advance(0.5)
+    assert breaker.admit() == "probe"
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.retry_after() == 0
+
+
+def test_half_open_admits_one_probe_at_a_time(breaker, clock):
+    _open(breaker)
+    clock.advance(30)
+    assert breaker.admit() == "probe"
+    assert breaker.admit() is None
+    assert breaker.admit() is None
+
+
+def test_successful_probe_closes_the_breaker(breaker, clock):
+    _open(breaker)
+    clock.advance(30)
+    assert breaker.admit() == "probe"
+
+    breaker.record_success(probe_ms=1.5)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
+    assert breaker.admit() == "call"
+    assert breaker.stats()["last_probe_ms"] == 1.5
+
+
+def test_failed_probe_reopens_for_another_reset_timeout(breaker, clock):
+    _open(breaker)
+    clock.advance(30)
+    assert breaker.admit() == "probe"
+
+    breaker.record_failure()    # one failure is enough in half-open
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opens == 2
+    clock.advance(29)
+    assert breaker.admit() is None
+    clock.advance(1)
+    assert breaker.admit() == "probe"
+
+
+def test_probe_that_never_reports_back_is_replaced(breaker, clock):
+    _open(breaker)
+    clock.advance(30)
+    assert breaker.admit() == "probe"
+
+    clock.advance(29)
+    assert breaker.admit() is None
+    clock.advance(1)
+    assert breaker.admit() == "probe"
+
+
+def test_concurrent_callers_get_a_single_probe(breaker, clock):
+    _open(breaker)
+    clock.advance(30)
+    barrier = threading.Barrier(16)
+    results = []
+    lock = threading.Lock()
+
+    def caller():
+        barrier.wait()
+        admission = breaker.admit()
+        with lock:
+            results.append(admission)
+
+    threads = [threading.Thread(target=caller) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+
+    assert results.count("probe") == 1
+    assert results.count(None) == 15
+
+
+def test_on_open_runs_each_time_the_breaker_opens(clock):
+    opened = []
+
+    def on_open():
+        opened.append(clock())
+        raise RuntimeError("hook failures are logged, not raised")
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, on_open=on_open, clock=clock)
+    breaker.record_failure()
+    clock.advance(30)
+    breaker.admit()
+    breaker.record_failure()
+    assert opened == [1000.0, 1030.0]
+
+
+def test_zero_threshold_disables_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=0, reset_timeout=30, clock=clock)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.admit() == "call"
+    assert breaker.stats()["state"] == "disabled"
+
+
+@pytest.fixture
+def app_db(monkeypatch, clock):
+    monkeypatch.setattr(config, "DB_WARMUP_ON_START", False)
+    monkeypatch.setattr(config, "DB_READ_REPLICAS", "")
+    monkeypatch.setattr(config, "DB_HEALTH_PROBE_INTERVAL", 0.0)
+    import routes
+    from app import create_app
+
+    db = routes.db
+    original = db.breaker
+    db.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30,
+                                on_open=original.on_open, clock=clock)
+    database = FakeDatabase()
+    db.use_connector(database.connect)     # the pool reports to the new breaker
+    db._last_health = None
+    yield create_app().test_client(), database, db
+    db.breaker = original
+    db.use_connector(FakeDatabase().connect)
+    db._last_health = None
+
+
+def _take_down(database):
+    database.down = True
+    for connection in database.connections:
+        connection.broken = True
+
+
+def test_health_is_503_with_retry_after_while_the_breaker_is_open(app_db, clock):
+    client, database, db = app_db
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    assert response.get_json()["database"] == "Connected"
+
+    _take_down(database)
+    for _ in range(2):
+        response = client.get("/api/health")
+        assert response.status_code == 503
+    assert db.breaker.state == CircuitBreaker.OPEN
+    assert response.headers["Retry-After"] == "30"
+
+    connects = database.connects
+    clock.advance(20)
+    response = client.get("/api/health")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "10"
+    body = response.get_json()
+    assert body["database"] == "Unavailable"
+    assert body["breaker"]["state"] == "open"
+    # Failing fast: no connection attempt while open
+    assert database.connects == connects
+
+
+def test_health_recovers_through_the_half_open_probe(app_db, clock):
+    client, database, db = app_db
+    _take_down(database)
+    while db.breaker.state != CircuitBreaker.OPEN:
+        assert client.get("/api/health").status_code == 503
+
+    # The probe fails while the database is still down: open again
+    clock.advance(30)
+    response = client.get("/api/health")
+    assert response.status_code == 503
+    assert db.breaker.state == CircuitBreaker.OPEN
+    assert db.breaker.opens == 2
+
+    database.down = False
+    clock.advance(30)
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    assert "Retry-After" not in response.headers
+    assert response.get_json()["breaker"]["state"] == "closed"
@@ -0,0 +1,177 @@
+"""
+File: tests/test_connection_pool.py
+Version: 1.0.0
+
+Description:
+- ConnectionPool against tests/fake_pyodbc.py: checkout and return,
+  exhaustion and checkout timeout, broken connections being discarded,
+  and concurrent use from several threads
+"""
+import threading
+import time
+
+import pytest
+
+from database_manager import ConnectionPool, PoolTimeout
+from tests.fake_pyodbc import FakeDatabase
+
+
+def make_pool(database, **overrides):
+    options = dict(min_size=0, max_size=2, idle_timeout=300.0, checkout_timeout=1.0,
+                   ping_interval=30.0, connect_timeout=1)
+    options.update(overrides)
+    return ConnectionPool("fake", connect=database.connect, **options)
+
+
+def test_checkout_and_return_reuses_the_connection():
+    database = FakeDatabase()
+    pool = make_pool(database)
+
+    conn = pool.connection()
+    raw = conn._raw
+    assert pool.stats()["checked_out"] == 1
+    conn.cursor().execute("SELECT 1")
+    conn.close()
+    conn.close()    # a second close is a no-op
+
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["checked_out"]) == (1, 1, 0)
+    assert raw.rollbacks == 1    # returned connections are rolled back
+    assert not raw.closed
+
+    with pool.connection() as again:
+        assert again._raw is raw
+    assert database.connects == 1
+    assert raw.commits == 1
+
+
+def test_warm_opens_min_size_connections():
+    database = FakeDatabase()
+    pool = make_pool(database, min_size=2, max_size=3)
+    pool.warm()
+    assert database.connects == 2
+    assert pool.stats()["idle"] == 2
+
+
+def test_exhausted_pool_times_out():
+    pool = make_pool(FakeDatabase(), max_size=2, checkout_timeout=0.1)
+    held = [pool.connection(), pool.connection()]
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.connection()
+    assert 0.1 <= time.monotonic() - started < 1.0
+    assert pool.stats()["waiting"] == 0
+
+    for conn in held:
+        conn.close()
+    pool.connection().close()
+
+
+def test_waiting_checkout_gets_a_released_connection():
+    pool = make_pool(FakeDatabase(), max_size=1, checkout_timeout=2.0)
+    held = pool.connection()
+    got = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.connection()))
+    waiter.start()
+    deadline = time.monotonic() + 1.0
+    while pool.stats()["waiting"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert pool.stats()["waiting"] == 1
+
+    held.close()
+    waiter.join(timeout=2.0)
+    assert got and got[0]._raw is held._raw
+    got[0].close()
+
+
+def test_connection_broken_while_checked_out_is_discarded():
+    database = FakeDatabase()
+    pool = make_pool(database)
+
+    conn = pool.connection()
+    conn._raw.broken = True
+    conn.close()    # rollback fails, so the connection is closed instead of pooled
+
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["recycled"]) == (0, 0, 1)
+    assert database.connections[0].closed
+
+    replacement = pool.connection()
+    assert replacement._raw is not database.connections[0]
+    replacement.close()
+
+
+def test_dead_idle_connection_is_replaced_on_checkout():
+    database = FakeDatabase()
+    pool = make_pool(database, ping_interval=0.0)
+
+    pool.connection().close()
+    database.connections[0].broken = True
+
+    conn = pool.connection()    # the ping fails, so a new connection is opened
+    assert conn._raw is database.connections[1]
+    assert database.connections[0].closed
+    assert pool.stats()["size"] == 1
+    conn.close()
+
+
+def test_invalidate_drops_the_connection():
+    database = FakeDatabase()
+    pool = make_pool(database)
+    conn = pool.connection()
+    conn.invalidate()
+    assert database.connections[0].closed
+    assert pool.stats()["size"] == 0
+
+
+def test_failed_connect_frees_the_slot():
+    database = FakeDatabase()
+    pool = make_pool(database, max_size=1)
+    database.down = True
+    with pytest.raises(Exception):
+        pool.connection()
+    assert pool.stats()["size"] == 0
+
+    database.down = False
+    pool.connection().close()
+    assert pool.stats()["size"] == 1
+
+
+def test_concurrent_threads_never_share_a_connection():
+    database = FakeDatabase()
+    pool = make_pool(database, max_size=3, checkout_timeout=5.0)
+    in_use = set()
+    lock = threading.Lock()
+    peak = [0]
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                conn = pool.connection()
+                with lock:
+                    assert conn._raw.number not in in_use
+                    in_use.add(conn._raw.number)
+                    peak[0] = max(peak[0], len(in_use))
+                conn.cursor().execute("SELECT 1")
+                time.sleep(0.0005)
+                with lock:
+                    in_use.discard(conn._raw.number)
+                conn.close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert peak[0] <= 3
+    assert database.connects <= 3
+    stats = pool.stats()
+    assert stats["checked_out"] == 0 and stats["waiting"] == 0
+    assert stats["size"] == stats["idle"] <= 3
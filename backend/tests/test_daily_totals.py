@@ -0,0 +1,200 @@
+"""
+File: tests/test_daily_totals.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- ADDED: DailyTotalsStore tests (deltas, stale loads, LRU cap, expiry) and
+  running totals against the stand-in with the store on and off
+
+Description:
+- parse_iso_date() accepts YYYY-MM-DD only
+- DatabaseManager rejects other date forms before touching totals_store
+- DailyTotalsStore: deltas on cached days, loads that raced a write are
+  dropped, the LRU cap, expiry and invalidation
+- With DAILY_TOTALS_CACHE_ENABLED, running totals after inserts and status
+  changes match a fresh aggregate; with it off (the default) a write made
+  outside this process is visible on the next read
+"""
+import sqlite3
+import time
+from datetime import date
+
+import pytest
+
+import config
+from bench.standin_db import StandInDatabase
+from daily_totals import DailyTotalsStore, empty_totals, parse_iso_date
+from database_manager import DatabaseManager
+
+DAY = "2026-01-30"
+
+
+@pytest.fixture
+def standin():
+    database = StandInDatabase()
+    database.seed(meals=40, users=4, history_days=2)
+    yield database
+    database.remove()
+
+
+@pytest.fixture
+def db(standin):
+    manager = DatabaseManager()
+    manager.use_connector(standin.connect)
+    return manager
+
+
+@pytest.fixture
+def cached_db(standin, monkeypatch):
+    monkeypatch.setattr(config, "DAILY_TOTALS_CACHE_ENABLED", True)
+    manager = DatabaseManager()
+    manager.use_connector(standin.connect)
+    return manager
+
+
+def _totals(calories=0, meals=0, for_date=DAY):
+    totals = empty_totals(for_date)
+    totals["TotalCalories"] = calories
+    totals["MealCount"] = meals
+    return totals
+
+
+def _aggregate(standin, user_id, for_date):
+    """The day's totals straight from the database, bypassing every cache."""
+    with sqlite3.connect(standin.path) as conn:
+        row = conn.execute("""
+            SELECT IFNULL(SUM(m.Calories), 0), COUNT(mp.PlanID)
+            FROM MealPlans mp JOIN Meals m ON mp.MealID = m.MealID
+            WHERE mp.UserID = ? AND mp.PlannedDate = ? AND mp.Status IN ('Pending', 'Accepted')
+        """, (user_id, for_date)).fetchone()
+    return {"TotalCalories": row[0], "MealCount": row[1]}
+
+
+def test_parse_iso_date_accepts_only_yyyy_mm_dd():
+    assert parse_iso_date("2026-01-30") == date(2026, 1, 30)
+    assert parse_iso_date(None, date(2026, 1, 1)) == date(2026, 1, 1)
+    assert parse_iso_date("", date(2026, 1, 1)) == date(2026, 1, 1)
+    for value in ("2026-W05-1", "20260130", "2026-01-30garbage", "2026-01-30T08:00:00",
+                  "2026-1-30", "01/30/2026", "2026-02-30", "٢٠٢٦-01-30", "2026-01-30\n", 20260130):
+        with pytest.raises(ValueError):
+            parse_iso_date(value)
+
+
+def test_non_iso_dates_are_rejected_before_any_write(db):
+    for value in ("2026-W05-1", "20260130", "2026-01-30garbage", ""):
+        assert db.insert_meal_plan(1, 3, value) is False
+        assert db.get_daily_totals(1, value or "x") is None
+
+    outcome = db.insert_meal_plans_bulk([
+        {"user_id": 1, "meal_id": 3, "planned_date": "2026-W05-1"},
+        {"user_id": 1, "meal_id": 3, "planned_date": "2026-01-26"},
+    ], atomic=False)
+    assert [r["status"] for r in outcome["results"]] == ["invalid", "inserted"]
+
+
+def test_delta_is_applied_to_a_cached_day():
+    store = DailyTotalsStore(ttl=60, max_entries=10, enabled=True)
+    assert store.put(1, DAY, _totals(500, 1), store.generation(1, DAY))
+    store.apply_delta(1, DAY, calories=300, protein=20, meals=1)
+    totals = store.get(1, DAY)
+    assert (totals["TotalCalories"], totals["TotalProtein"], totals["MealCount"]) == (800, 20, 2)
+
+    store.apply_delta(1, DAY, calories=-500, meals=-1)
+    assert store.get(1, DAY)["TotalCalories"] == 300
+    # Uncached days are not created by a delta
+    store.apply_delta(1, "2026-01-31", calories=100, meals=1)
+    assert store.get(1, "2026-01-31") is None
+
+
+def test_load_that_raced_a_write_is_not_stored():
+    store = DailyTotalsStore(ttl=60, max_entries=10, enabled=True)
+    generation = store.generation(1, DAY)      # a loader starts its query
+    store.apply_delta(1, DAY, calories=300, meals=1)
+    assert not store.put(1, DAY, _totals(0, 0), generation)
+    assert store.get(1, DAY) is None
+
+
+def test_lru_cap_evicts_the_least_recently_used_day():
+    store = DailyTotalsStore(ttl=60, max_entries=2, enabled=True)
+    for user in (1, 2):
+        store.put(user, DAY, _totals(user), store.generation(user, DAY))
+    assert store.get(1, DAY) is not None       # user 1 is now the most recent
+    store.put(3, DAY, _totals(3), store.generation(3, DAY))
+
+    assert store.get(2, DAY) is None
+    assert store.get(1, DAY) is not None and store.get(3, DAY) is not None
+    assert store.stats()["evictions"] == 1
+
+
+def test_generation_of_an_evicted_key_never_matches_an_older_load():
+    store = DailyTotalsStore(ttl=60, max_entries=1, enabled=True)
+    generation = store.generation(1, DAY)
+    store.apply_delta(1, DAY, calories=100, meals=1)
+    store.apply_delta(2, DAY, calories=100, meals=1)    # evicts user 1's generation
+    assert not store.put(1, DAY, _totals(0), generation)
+
+
+def test_entries_expire_after_the_ttl():
+    store = DailyTotalsStore(ttl=0.05, max_entries=10, enabled=True)
+    store.put(1, DAY, _totals(500, 1), store.generation(1, DAY))
+    assert store.get(1, DAY) is not None
+    time.sleep(0.06)
+    assert store.get(1, DAY) is None
+    assert store.stats()["entries"] == 0
+
+
+def test_invalidate_drops_one_day_or_all_of_a_users_days():
+    store = DailyTotalsStore(ttl=60, max_entries=10, enabled=True)
+    for for_date in (DAY, "2026-01-31"):
+        store.put(1, for_date, _totals(for_date=for_date), store.generation(1, for_date))
+    store.put(2, DAY, _totals(), store.generation(2, DAY))
+
+    store.invalidate(1, DAY)
+    assert store.get(1, DAY) is None and store.get(1, "2026-01-31") is not None
+    store.invalidate("1")                        # user ids from JSON may be strings
+    assert store.get(1, "2026-01-31") is None
+    assert store.get(2, DAY) is not None
+
+
+def test_disabled_store_keeps_nothing():
+    store = DailyTotalsStore(ttl=60, max_entries=10, enabled=False)
+    assert not store.put(1, DAY, _totals(500, 1), store.generation(1, DAY))
+    assert store.get(1, DAY) is None
+    assert store.get_range(1, [DAY]) is None
+
+
+def test_running_totals_match_a_fresh_aggregate(cached_db, standin):
+    today = date.today().isoformat()
+    before = cached_db.get_daily_totals(2, today)
+    assert cached_db.totals_store.get(2, today) is not None
+
+    assert cached_db.insert_meal_plan(2, 5, today)
+    assert cached_db.insert_meal_plan(2, 6, date.today())    # a date object keys the same day
+    totals = cached_db.get_daily_totals(2, today)
+    assert totals["MealCount"] == before["MealCount"] + 2
+    assert {k: totals[k] for k in ("TotalCalories", "MealCount")} == _aggregate(standin, 2, today)
+    assert cached_db.totals_store.stats()["hits"] >= 1
+
+
+def test_status_change_adjusts_the_running_totals(cached_db, standin):
+    today = date.today().isoformat()
+    assert cached_db.insert_meal_plan(3, 7, today)
+    with sqlite3.connect(standin.path) as conn:
+        plan_id = conn.execute("SELECT MAX(PlanID) FROM MealPlans WHERE UserID = 3").fetchone()[0]
+    cached_db.get_daily_totals(3, today)
+
+    for status in ("Skipped", "Accepted", "Completed"):
+        assert cached_db.update_meal_plan_status(plan_id, status)["Status"] == status
+        totals = cached_db.get_daily_totals(3, today)
+        assert {k: totals[k] for k in ("TotalCalories", "MealCount")} == _aggregate(standin, 3, today)
+
+
+def test_default_config_reads_another_workers_write(db, standin):
+    assert not db.totals_store.enabled
+    today = date.today().isoformat()
+    before = db.get_daily_totals(1, today)
+
+    with sqlite3.connect(standin.path) as conn:
+        conn.execute("INSERT INTO MealPlans (UserID, MealID, PlannedDate, MealTime, Status) "
+                     "VALUES (1, 5, ?, 'Lunch', 'Pending')", (today,))
+    assert db.get_daily_totals(1, today)["MealCount"] == before["MealCount"] + 1
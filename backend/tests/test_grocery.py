@@ -0,0 +1,112 @@
+"""
+File: tests/test_grocery.py
+Version: 1.0.0
+
+Description:
+- /api/grocery-list against the SQLite stand-in: cached lists are
+  rebuilt after a meal-plan write through the API and after one made
+  directly in the database (as another worker would), and reused while
+  the plans are unchanged
+- parse_quantity / build_grocery_list unit handling
+"""
+import sqlite3
+from datetime import date
+
+import pytest
+
+import config
+from bench.standin_db import StandInDatabase
+from grocery import build_grocery_list, parse_quantity
+
+
+@pytest.fixture
+def app_db(monkeypatch):
+    monkeypatch.setattr(config, "DB_WARMUP_ON_START", False)
+    monkeypatch.setattr(config, "DB_READ_REPLICAS", "")
+    import routes
+    from app import create_app
+
+    database = StandInDatabase()
+    database.seed(meals=60, users=5, history_days=0)
+    routes.db.use_connector(database.connect)
+    routes.db.procedures.refresh()
+    monkeypatch.setattr(routes, "grocery_cache", routes.GroceryListCache(ttl=600))
+    yield create_app().test_client(), database, routes
+    database.remove()
+
+
+def _url(user_id):
+    today = date.today().isoformat()
+    return f"/api/grocery-list/{user_id}?from={today}&to={today}"
+
+
+def _item_count(response):
+    assert response.status_code == 200
+    return sum(len(group["Items"]) for group in response.get_json()["Groups"])
+
+
+def _meal_with_ingredients(database):
+    with sqlite3.connect(database.path) as conn:
+        return conn.execute("SELECT MealID FROM MealIngredients LIMIT 1").fetchone()[0]
+
+
+def test_plan_added_through_the_api_rebuilds_the_list(app_db):
+    client, database, routes = app_db
+    meal_id = _meal_with_ingredients(database)
+    assert _item_count(client.get(_url(3))) == 0
+
+    response = client.post("/api/meal-plans/add", json={
+        "userId": 3, "mealId": meal_id, "plannedDate": date.today().isoformat()})
+    assert response.status_code in (200, 201)
+    assert _item_count(client.get(_url(3))) > 0
+
+
+def test_plan_written_by_another_worker_rebuilds_the_list(app_db):
+    client, database, routes = app_db
+    meal_id = _meal_with_ingredients(database)
+    assert _item_count(client.get(_url(4))) == 0
+
+    # Not through this process, so no in-process counter is bumped
+    with sqlite3.connect(database.path) as conn:
+        conn.execute("INSERT INTO MealPlans (UserID, MealID, PlannedDate, MealTime, Status) "
+                     "VALUES (4, ?, ?, 'Dinner', 'Pending')", (meal_id, date.today().isoformat()))
+    assert _item_count(client.get(_url(4))) > 0
+
+    with sqlite3.connect(database.path) as conn:
+        conn.execute("UPDATE MealPlans SET Status = 'Skipped' WHERE UserID = 4")
+    assert _item_count(client.get(_url(4))) == 0
+
+
+def test_unchanged_plans_reuse_the_cached_list(app_db, monkeypatch):
+    client, database, routes = app_db
+    meal_id = _meal_with_ingredients(database)
+    client.post("/api/meal-plans/add", json={
+        "userId": 2, "mealId": meal_id, "plannedDate": date.today().isoformat()})
+
+    calls = []
+    original = routes.db.get_planned_ingredients
+    monkeypatch.setattr(routes.db, "get_planned_ingredients",
+                        lambda *args: calls.append(args) or original(*args))
+    first = client.get(_url(2)).get_json()
+    second = client.get(_url(2)).get_json()
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_quantities_are_summed_in_canonical_units():
+    assert parse_quantity("1 1/2 cups") == pytest.approx((354.882, "volume", "ml"))
+    assert parse_quantity("2 cloves") == (2.0, "count", "clove")
+    assert parse_quantity("to taste") is None
+
+    groups = build_grocery_list([
+        ("Garlic", "2 cloves", "Produce", 1),
+        ("garlic", "1 clove", "Produce", 2),
+        ("Flour", "500 g", "Pantry", 1),
+        ("Flour", "1 kg", "Pantry", 3),
+        ("Salt", "to taste", "Pantry", 1),
+    ])
+    items = {(g["SmartGroup"], i["IngredientName"].lower()): i for g in groups for i in g["Items"]}
+    assert items[("Produce", "garlic")]["Quantity"] == "3 clove"
+    assert items[("Produce", "garlic")]["MealCount"] == 2
+    assert items[("Pantry", "flour")]["Quantity"] == "1.5 kg"
+    assert items[("Pantry", "salt")]["Quantity"] == "to taste"
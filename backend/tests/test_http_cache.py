@@ -0,0 +1,60 @@
+"""
+File: tests/test_http_cache.py
+Version: 1.0.0
+
+Description:
+- Conditional GETs through the Flask app against the SQLite stand-in
+  (bench/standin_db.py) in the default config (content-hash ETags): an
+  unchanged resource answers 304, a meal-plan write makes it 200 again
+"""
+from datetime import date
+
+import pytest
+
+import config
+from bench.standin_db import StandInDatabase
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(config, "DB_WARMUP_ON_START", False)
+    monkeypatch.setattr(config, "DB_READ_REPLICAS", "")
+    monkeypatch.setattr(config, "HTTP_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "HTTP_CACHE_VERSIONED_ETAGS", False)
+    import routes
+    from app import create_app
+
+    database = StandInDatabase()
+    database.seed(meals=60, users=5, history_days=3)
+    routes.db.use_connector(database.connect)
+    routes.db.procedures.refresh()
+    yield create_app().test_client()
+    database.remove()
+
+
+def _add_plan(client, user_id, meal_id=5):
+    response = client.post("/api/meal-plans/add", json={
+        "userId": user_id, "mealId": meal_id, "plannedDate": date.today().isoformat()})
+    assert response.status_code in (200, 201)
+
+
+def test_weekly_plan_has_a_content_etag_by_default(client):
+    first = client.get("/api/meal-plans/week/2")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('"h-')
+
+    again = client.get("/api/meal-plans/week/2", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    _add_plan(client, 2)
+    changed = client.get("/api/meal-plans/week/2", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_weekly_plan_etag_depends_on_the_week(client):
+    today = client.get("/api/meal-plans/week/2").headers["ETag"]
+    later = client.get("/api/meal-plans/week/2?start=2031-01-06")
+    assert later.status_code == 200
+    assert later.headers["ETag"] != today
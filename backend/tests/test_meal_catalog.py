@@ -0,0 +1,105 @@
+"""
+File: tests/test_meal_catalog.py
+Version: 1.0.0
+
+Description:
+- MealCatalog reload behaviour: an invalidate() during a reload forces the
+  next one, failed reloads back off, and shared mode serves without waiting
+  while another worker holds the refresh lease
+"""
+import threading
+import time
+
+import config
+from meal_catalog import MealCatalog
+
+
+def _meals(name="Omelette"):
+    return [{"MealID": 1, "MealName": name, "DietCategory": "Keto", "Calories": 400,
+             "ProteinGrams": 30, "FatGrams": 25, "CarbGrams": 5, "ImageURL": None, "ingredients": []}]
+
+
+class Loader:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+
+def test_invalidate_during_reload_forces_another_reload():
+    started, release = threading.Event(), threading.Event()
+    names = iter(["Old", "New"])
+
+    def slow_loader():
+        name = next(names)
+        if name == "Old":
+            started.set()
+            release.wait(2)
+        return _meals(name)
+
+    catalog = MealCatalog(slow_loader, ttl=600)
+    reader = threading.Thread(target=catalog.snapshot)
+    reader.start()
+    started.wait(2)
+    catalog.invalidate()    # the meals changed while "Old" was being read
+    release.set()
+    reader.join(2)
+
+    assert catalog.snapshot().by_id[1]["MealName"] == "New"
+
+
+def test_failed_reload_backs_off(monkeypatch):
+    monkeypatch.setattr(config, "MEAL_CATALOG_RETRY_BACKOFF", 0.2)
+    monkeypatch.setattr(config, "MEAL_CATALOG_RETRY_BACKOFF_MAX", 10.0)
+    loader = Loader([None, None, _meals()])
+    catalog = MealCatalog(loader, ttl=600)
+
+    for _ in range(5):
+        assert catalog.snapshot() is None
+    assert loader.calls == 1
+
+    time.sleep(0.25)
+    assert catalog.snapshot() is None
+    assert loader.calls == 2     # second failure: the wait doubles to 0.4s
+    time.sleep(0.25)
+    assert catalog.snapshot() is None
+    assert loader.calls == 2
+
+    time.sleep(0.2)
+    assert catalog.snapshot() is not None
+    assert loader.calls == 3
+    assert catalog.stats()["reload_failures"] == 0
+
+
+def test_failed_reload_keeps_serving_the_previous_snapshot(monkeypatch):
+    monkeypatch.setattr(config, "MEAL_CATALOG_RETRY_BACKOFF", 60.0)
+    loader = Loader([_meals(), None])
+    catalog = MealCatalog(loader, ttl=600)
+    first = catalog.snapshot()
+
+    catalog.invalidate()
+    assert catalog.snapshot() is first
+    assert catalog.snapshot() is first
+    assert loader.calls == 2
+
+
+def test_shared_mode_does_not_wait_for_another_workers_reload(tmp_path):
+    loader = Loader([_meals()])
+    holder = MealCatalog(loader, ttl=600, shared_dir=str(tmp_path))
+    waiting = MealCatalog(loader, ttl=600, shared_dir=str(tmp_path))
+
+    assert holder._shared.try_lease()    # another worker is mid-reload
+    started = time.monotonic()
+    assert waiting.snapshot() is None
+    assert time.monotonic() - started < 1.0
+    assert loader.calls == 0
+
+    holder._shared.release_lease()
+    published = holder.snapshot()
+    assert published is not None
+    waiting._shared._next_poll = 0.0
+    assert waiting.snapshot().meal_count == 1
+    assert loader.calls == 1
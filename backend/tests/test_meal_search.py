@@ -0,0 +1,164 @@
+"""
+File: tests/test_meal_search.py
+Version: 1.0.0
+
+Description:
+- tokenize() folding, and MealSearch over a MealCatalog: name, ingredient
+  and smart-group matches, prefixes, ranking, diet filters, exclusions by
+  whole word and plural, paging
+- The index follows catalog reloads incrementally, keeps earlier indexes
+  intact for in-flight queries, and works on shared (memory-mapped)
+  snapshots
+"""
+import pytest
+
+from meal_catalog import MealCatalog
+from meal_search import MealSearch, tokenize
+
+
+def _meal(meal_id, name, diet="Keto", ingredients=()):
+    return {"MealID": meal_id, "MealName": name, "DietCategory": diet, "Calories": 400,
+            "ProteinGrams": 30, "FatGrams": 25, "CarbGrams": 5, "ImageURL": None,
+            "ingredients": [{"IngredientName": ingredient, "SmartGroup": group} for ingredient, group in ingredients]}
+
+
+MEALS = [
+    _meal(1, "Grilled Salmon", ingredients=[("Salmon Fillet", "Seafood"), ("Lemon", "Produce")]),
+    _meal(2, "Salmon Rice Bowl", ingredients=[("Salmon", "Seafood"), ("Brown Rice", "Grains")]),
+    _meal(3, "Spinach Omelette", ingredients=[("Eggs", "Dairy & Eggs"), ("Spinach", "Produce")]),
+    _meal(4, "Roasted Eggplant", "Vegan", ingredients=[("Eggplant", "Produce"), ("Olive Oil", "Pantry")]),
+    _meal(5, "Tofu Stir Fry", "Vegan", ingredients=[("Tofu", "Protein"), ("Brown Rice", "Grains")]),
+    _meal(6, "Salmagundi Salad", "Paleo", ingredients=[("Chicken", "Meat"), ("Egg", "Dairy & Eggs")]),
+]
+
+
+class Loader:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+
+@pytest.fixture
+def search():
+    return MealSearch(MealCatalog(Loader(MEALS), ttl=600))
+
+
+def _ids(result):
+    return [meal["MealID"] for meal in result["Meals"]]
+
+
+def test_tokenize_folds_case_accents_and_punctuation():
+    assert tokenize("Crème Fraîche") == ["creme", "fraiche"]
+    assert tokenize("Mac & Cheese (v2)") == ["mac", "cheese", "v2"]
+    assert tokenize("") == [] and tokenize(None) == []
+
+
+def test_prefix_matches_whole_tokens(search):
+    assert sorted(_ids(search.search("salm"))) == [1, 2, 6]
+    assert _ids(search.search("almon")) == []
+
+
+def test_every_term_must_match(search):
+    assert _ids(search.search("salmon rice")) == [2]
+    assert _ids(search.search("salmon tofu")) == []
+
+
+def test_ingredients_and_smart_groups_are_searchable(search):
+    assert _ids(search.search("spinach")) == [3]
+    assert sorted(_ids(search.search("seafood"))) == [1, 2]
+
+
+def test_name_and_exact_matches_rank_first(search):
+    result = search.search("salmon")
+    # Both score an exact name token (3 + 1); "Salmagundi" is not a prefix match
+    assert _ids(result) in ([1, 2], [2, 1])
+    assert {meal["Score"] for meal in result["Meals"]} == {4}
+
+    result = search.search("egg")
+    # Prefix of the name token "eggplant" (3) outranks ingredient "eggs" (2)
+    # and the exact ingredient "egg" (2 + 1 = 3) ties with it
+    scores = {meal["MealID"]: meal["Score"] for meal in result["Meals"]}
+    assert scores == {4: 3, 3: 2, 6: 3}
+
+
+def test_diet_filter_is_case_insensitive(search):
+    assert sorted(_ids(search.search("rice", diet="vegan"))) == [5]
+    assert _ids(search.search("rice", diet=" KETO ")) == [2]
+    assert _ids(search.search("rice", diet="Unknown")) == []
+
+
+def test_empty_query_lists_a_diet(search):
+    assert sorted(_ids(search.search("", diet="Vegan"))) == [4, 5]
+    assert search.search("")["Total"] == 0
+
+
+def test_exclusions_match_whole_words_and_plurals(search):
+    # "egg" drops "Eggs" and "Egg" but not "Eggplant"
+    assert sorted(_ids(search.search("", diet="Keto", exclude=["egg"]))) == [1, 2]
+    assert sorted(_ids(search.search("", diet="Vegan", exclude=["eggs"]))) == [4, 5]
+    # Every word of a phrase must match
+    assert _ids(search.search("rice", exclude=["brown rice"])) == []
+    assert sorted(_ids(search.search("rice", exclude=["white rice"]))) == [2, 5]
+
+
+def test_paging(search):
+    first = search.search("", diet="Keto", page=1, page_size=2)
+    second = search.search("", diet="Keto", page=2, page_size=2)
+
+    assert first["Total"] == second["Total"] == 3
+    assert len(first["Meals"]) == 2 and len(second["Meals"]) == 1
+    assert set(_ids(first)) | set(_ids(second)) == {1, 2, 3}
+
+
+def test_results_are_copies(search):
+    meal = search.search("spinach")["Meals"][0]
+    meal["MealName"] = "Changed"
+    meal["ingredients"].clear()
+
+    again = search.search("spinach")["Meals"][0]
+    assert again["MealName"] == "Spinach Omelette"
+    assert len(again["ingredients"]) == 2
+
+
+def test_catalog_reload_updates_the_index_incrementally():
+    renamed = [dict(meal) for meal in MEALS if meal["MealID"] != 6]
+    renamed[0] = _meal(1, "Smoked Trout", ingredients=[("Trout", "Seafood")])
+    renamed.append(_meal(7, "Salmon Tacos", "Paleo", ingredients=[("Salmon", "Seafood")]))
+    catalog = MealCatalog(Loader(MEALS, renamed), ttl=600)
+    search = MealSearch(catalog)
+
+    before = search.index()
+    assert sorted(_ids(search.search("salm"))) == [1, 2, 6]
+
+    catalog.invalidate()
+    assert sorted(_ids(search.search("salm"))) == [2, 7]
+    assert _ids(search.search("trout")) == [1]
+    stats = search.stats()
+    assert (stats["meals"], stats["reused"], stats["reindexed"], stats["removed"]) == (6, 4, 2, 1)
+
+    # Queries still holding the previous index see the old catalog
+    assert sorted(meal_id for _, meal_id in before.search("salm")[1]) == [1, 2, 6]
+    assert before.search("trout") == (0, [])
+
+
+def test_unchanged_snapshot_reuses_the_index(search):
+    index = search.index()
+    search.search("salmon")
+    assert search.index() is index
+
+
+def test_unloadable_catalog_returns_none():
+    search = MealSearch(MealCatalog(Loader(None), ttl=600))
+    assert search.search("salmon") is None
+    assert search.stats() == {"built": False}
+
+
+def test_shared_snapshots_are_searchable(tmp_path):
+    search = MealSearch(MealCatalog(Loader(MEALS), ttl=600, shared_dir=str(tmp_path)))
+    assert _ids(search.search("salmon rice")) == [2]
+    assert sorted(_ids(search.search("", diet="Keto", exclude=["egg"]))) == [1, 2]
+    assert search.search("spinach")["Meals"][0]["ingredients"][1]["IngredientName"] == "Spinach"
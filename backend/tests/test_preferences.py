@@ -0,0 +1,132 @@
+"""
+File: tests/test_preferences.py
+Version: 1.0.0
+
+Description:
+- PreferenceCache: write-through, failed and overlapping writes, loads that
+  raced a write, LRU eviction and expiry
+- Two DatabaseManagers on one SQLite stand-in act as two workers: a write
+  made by one reaches the other's cached preference once it expires
+"""
+import time
+
+import pytest
+
+import config
+from bench.standin_db import StandInDatabase
+from database_manager import DatabaseManager
+from preferences import MISSING, PreferenceCache
+
+KETO = {"ActiveDietName": "Keto", "CaloriesGoal": 2000, "Allergies": ""}
+VEGAN = {"ActiveDietName": "Vegan", "CaloriesGoal": 1800, "Allergies": "nuts"}
+
+
+def test_write_through_caches_the_written_preference():
+    cache = PreferenceCache(max_entries=10, ttl=60)
+    cache.put(1, KETO, cache.generation(1))
+
+    token = cache.begin_write(1)
+    assert cache.get(1) is MISSING
+    assert cache.commit_write(1, VEGAN, token)
+    assert cache.get(1) == VEGAN
+
+
+def test_failed_write_leaves_the_entry_dropped():
+    cache = PreferenceCache(max_entries=10, ttl=60)
+    cache.put(1, KETO, cache.generation(1))
+
+    token = cache.begin_write(1)
+    assert not cache.commit_write(1, None, token)
+    assert cache.get(1) is MISSING
+
+
+def test_overlapping_writes_drop_the_entry():
+    cache = PreferenceCache(max_entries=10, ttl=60)
+    first = cache.begin_write(1)
+    second = cache.begin_write(1)
+
+    assert not cache.commit_write(1, KETO, first)
+    assert not cache.commit_write(1, VEGAN, second)
+    assert cache.get(1) is MISSING
+
+
+def test_load_that_raced_a_write_is_not_cached():
+    cache = PreferenceCache(max_entries=10, ttl=60)
+    generation = cache.generation(1)
+    cache.commit_write(1, VEGAN, cache.begin_write(1))
+
+    assert not cache.put(1, KETO, generation)
+    assert cache.get(1) == VEGAN
+
+
+def test_users_without_a_preference_are_cached():
+    cache = PreferenceCache(max_entries=10, ttl=60)
+    cache.put(1, None, cache.generation(1))
+    assert cache.get(1) is None
+
+
+def test_returned_preferences_are_copies():
+    cache = PreferenceCache(max_entries=10, ttl=60)
+    cache.put(1, KETO, cache.generation(1))
+    cache.get(1)["ActiveDietName"] = "Mutated"
+    assert cache.get(1) == KETO
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PreferenceCache(max_entries=2, ttl=60)
+    cache.put(1, KETO, cache.generation(1))
+    cache.put(2, KETO, cache.generation(2))
+    cache.get(1)
+    cache.put(3, VEGAN, cache.generation(3))
+
+    assert cache.get(2) is MISSING
+    assert cache.get(1) == KETO and cache.get(3) == VEGAN
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    cache = PreferenceCache(max_entries=10, ttl=0.05)
+    cache.put(1, KETO, cache.generation(1))
+    assert cache.get(1) == KETO
+
+    time.sleep(0.06)
+    assert cache.get(1) is MISSING
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def standin():
+    database = StandInDatabase()
+    database.seed(meals=20, users=3, history_days=1)
+    yield database
+    database.remove()
+
+
+def _worker(standin):
+    manager = DatabaseManager()
+    manager.use_connector(standin.connect)
+    return manager
+
+
+def test_write_on_one_worker_reaches_another_after_the_ttl(standin, monkeypatch):
+    monkeypatch.setattr(config, "PREFERENCE_CACHE_TTL", 0.2)
+    reader, writer = _worker(standin), _worker(standin)
+    before = reader.get_user_preference(1)["ActiveDietName"]
+    new_diet = "Vegan" if before != "Vegan" else "Keto"
+
+    assert writer.update_user_preferences(1, new_diet, 1800, "nuts")
+    assert writer.get_user_preference(1)["ActiveDietName"] == new_diet
+    # The reader's own copy is only per process...
+    assert reader.get_user_preference(1)["ActiveDietName"] == before
+
+    time.sleep(0.25)
+    assert reader.get_user_preference(1) == {"ActiveDietName": new_diet, "CaloriesGoal": 1800, "Allergies": "nuts"}
+
+
+def test_writer_reads_its_own_write_from_the_cache(standin):
+    manager = _worker(standin)
+    assert manager.update_user_preferences(2, "Paleo", 2200, "")
+
+    assert manager.get_user_preference(2) == {"ActiveDietName": "Paleo", "CaloriesGoal": 2200, "Allergies": ""}
+    stats = manager.preference_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 0)
@@ -0,0 +1,170 @@
+"""
+File: tests/test_procedures.py
+Version: 1.0.0
+
+Description:
+- ProcedureRegistry against fake_pyodbc cursors: the sys.procedures probe,
+  inline SQL fallbacks for missing procedures, an unreadable catalog,
+  re-probing after the TTL and after refresh(), and the immediate re-probe
+  when a call fails with "could not find stored procedure"
+- DatabaseManager against the SQLite stand-in: a procedure deployed while
+  the app runs is used after refresh_procedures()
+"""
+import time
+
+import pyodbc
+import pytest
+
+from bench import standin_db
+from bench.standin_db import StandInDatabase
+from database_manager import DatabaseManager, ProcedureRegistry, ProcedureUnavailable, default_procedures
+from tests.fake_pyodbc import FakeDatabase
+
+DIET_PLANS = "dbo.usp_GetDietPlans"
+DAILY_TOTALS = "dbo.usp_GetUserDailyTotals"
+FALLBACK = ("SELECT fallback", ())
+
+
+def _not_found(name):
+    return pyodbc.ProgrammingError("42000", f"[42000] Could not find stored procedure '{name}'. (2812)")
+
+
+@pytest.fixture
+def database():
+    database = FakeDatabase()
+    database.results["sys.procedures"] = [("dbo", "usp_GetDietPlans")]
+    return database
+
+
+@pytest.fixture
+def cursor(database):
+    return database.connect("fake").cursor()
+
+
+def _calls(database):
+    return [sql for sql in database.statements if sql.startswith("{CALL")]
+
+
+def _probes(database):
+    return [sql for sql in database.statements if sql == ProcedureRegistry.PROBE_SQL]
+
+
+def test_probe_reads_the_catalog_once(database, cursor):
+    registry = default_procedures()
+    for _ in range(3):
+        registry.execute(cursor, DIET_PLANS)
+
+    assert _calls(database) == ["{CALL dbo.usp_GetDietPlans}"] * 3
+    assert len(_probes(database)) == 1
+    procedures = registry.stats()["procedures"]
+    assert procedures[DIET_PLANS] is True
+    assert procedures[DAILY_TOTALS] is False
+
+
+def test_missing_procedure_goes_straight_to_the_fallback(database, cursor):
+    registry = default_procedures()
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+
+    assert _calls(database) == []
+    assert database.statements[-1] == "SELECT fallback"
+
+
+def test_missing_procedure_without_a_fallback_raises(cursor):
+    with pytest.raises(ProcedureUnavailable):
+        default_procedures().execute(cursor, DAILY_TOTALS, (1, "2026-01-30"))
+
+
+def test_unreadable_catalog_assumes_procedures_exist(database, cursor):
+    database.errors["sys.procedures"] = pyodbc.ProgrammingError("42000", "[42000] VIEW DEFINITION permission denied")
+    registry = default_procedures()
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+
+    assert _calls(database) == ["{CALL dbo.usp_GetUserDailyTotals (?, ?)}"]
+    assert registry.stats()["catalog_readable"] is False
+
+
+def test_catalog_is_probed_again_after_the_ttl(database, cursor):
+    registry = default_procedures()
+    registry.ttl = 0.05
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+
+    database.results["sys.procedures"].append(("dbo", "usp_GetUserDailyTotals"))   # deployed
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+    assert _calls(database) == []
+
+    time.sleep(0.06)
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+    assert _calls(database) == ["{CALL dbo.usp_GetUserDailyTotals (?, ?)}"]
+    assert registry.stats()["probes"] == 2
+
+
+def test_refresh_re_probes_on_the_next_call(database, cursor):
+    registry = default_procedures()
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+    database.results["sys.procedures"].append(("dbo", "usp_GetUserDailyTotals"))
+
+    registry.refresh()
+    assert registry.stats()["procedures"][DAILY_TOTALS] is None
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+    assert _calls(database) == ["{CALL dbo.usp_GetUserDailyTotals (?, ?)}"]
+
+
+def test_could_not_find_re_probes_and_falls_back(database, cursor):
+    database.results["sys.procedures"] = [("dbo", "usp_GetDietPlans"), ("dbo", "usp_GetUserDailyTotals")]
+    registry = default_procedures()
+    registry.execute(cursor, DIET_PLANS)
+
+    # Both procedures dropped; the catalog read is stale until the failed call
+    database.results["sys.procedures"] = []
+    database.errors["usp_GetUserDailyTotals"] = _not_found("dbo.usp_GetUserDailyTotals")
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+
+    assert database.statements[-1] == "SELECT fallback"
+    assert len(_probes(database)) == 2
+    procedures = registry.stats()["procedures"]
+    assert procedures[DAILY_TOTALS] is False
+    assert procedures[DIET_PLANS] is False
+
+    # No more failed round trips
+    calls = len(_calls(database))
+    registry.execute(cursor, DAILY_TOTALS, (1, "2026-01-30"), fallback=FALLBACK)
+    assert len(_calls(database)) == calls
+
+
+def test_could_not_find_wins_over_a_catalog_that_lists_the_procedure(database, cursor):
+    # e.g. the procedure exists but in a schema the login cannot execute
+    database.errors["usp_GetDietPlans"] = _not_found("dbo.usp_GetDietPlans")
+    registry = default_procedures()
+
+    with pytest.raises(ProcedureUnavailable):
+        registry.execute(cursor, DIET_PLANS)
+    assert registry.stats()["procedures"][DIET_PLANS] is False
+
+
+def test_other_programming_errors_propagate(database, cursor):
+    database.errors["usp_GetDietPlans"] = pyodbc.ProgrammingError("42000", "[42000] Invalid object name 'DietPlans'.")
+    registry = default_procedures()
+
+    with pytest.raises(pyodbc.ProgrammingError):
+        registry.execute(cursor, DIET_PLANS)
+    assert registry.stats()["procedures"][DIET_PLANS] is True
+
+
+def test_procedure_deployed_while_running_is_used_after_refresh(monkeypatch):
+    standin = StandInDatabase()
+    standin.seed(meals=20, users=2, history_days=2)
+    try:
+        deployed = standin_db.PROCEDURES["usp_getuserdailytotals"]
+        monkeypatch.delitem(standin_db.PROCEDURES, "usp_getuserdailytotals")
+        manager = DatabaseManager()
+        manager.use_connector(standin.connect)
+
+        before = manager.get_daily_totals(1)
+        assert before is not None
+        assert manager.procedures.stats()["procedures"][DAILY_TOTALS] is False
+
+        monkeypatch.setitem(standin_db.PROCEDURES, "usp_getuserdailytotals", deployed)
+        assert manager.refresh_procedures()["procedures"][DAILY_TOTALS] is True
+        assert manager.get_daily_totals(1) == before
+    finally:
+        standin.remove()
@@ -0,0 +1,218 @@
+"""
+File: tests/test_read_replicas.py
+Version: 1.1.0
+
+CHANGES FROM 1.0.0:
+- The primary retry is exercised with a dropped replica connection; schema
+  errors (a missing table or procedure) stay on the replica and reach the
+  method's own fallback
+
+Description:
+- DatabaseManager read/write routing against two SQLite stand-in databases
+  (bench/standin_db.py), one as the primary and one as a read replica.
+  Writes are not copied to the replica, so where a read was served is
+  visible in its result
+- Covers replica reads, writes on the primary, read-your-writes pinning and
+  its expiry, fallback to the primary when no replica is healthy, the
+  primary retry after a replica connection drops (and none after a schema
+  error), and replica setup while the primary is down
+"""
+import sqlite3
+import time
+from datetime import date
+
+import pyodbc
+import pytest
+
+import config
+from bench.standin_db import StandInDatabase
+from database_manager import DatabaseManager
+
+
+@pytest.fixture
+def primary():
+    database = StandInDatabase()
+    database.seed(meals=60, users=5, history_days=3)
+    yield database
+    database.remove()
+
+
+@pytest.fixture
+def replica():
+    database = StandInDatabase()
+    database.seed(meals=60, users=5, history_days=3)
+    with sqlite3.connect(database.path) as conn:
+        conn.execute("UPDATE DietPlans SET Description = 'replica'")
+        conn.execute("UPDATE UserPreferences SET ActiveDietName = 'ReplicaDiet'")
+    yield database
+    database.remove()
+
+
+@pytest.fixture
+def db(primary, replica, monkeypatch):
+    monkeypatch.setattr(config, "DB_READ_YOUR_WRITES_WINDOW", 0.3)
+    monkeypatch.setattr(config, "DB_BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(config, "DB_BREAKER_RESET_TIMEOUT", 30.0)
+    manager = DatabaseManager()
+    manager.use_connector(primary.connect)
+    manager.use_replica_connectors([replica.connect])
+    return manager
+
+
+def _descriptions(plans):
+    return {plan["Description"] for plan in plans}
+
+
+class _FailingCursor:
+    """Stand-in cursor that raises `error` for statements containing `fragment`."""
+
+    def __init__(self, cursor, fragment, error):
+        self._cursor = cursor
+        self._fragment = fragment
+        self._error = error
+
+    def execute(self, sql, *params):
+        if self._fragment in sql:
+            raise self._error
+        return self._cursor.execute(sql, *params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _failing_connector(database, fragment, error):
+    def connect(conn_str=None, timeout=None, **kwargs):
+        conn = database.connect(conn_str, timeout)
+        cursor = conn.cursor
+        conn.cursor = lambda: _FailingCursor(cursor(), fragment, error)
+        return conn
+    return connect
+
+
+def _plan_count(database, user_id):
+    with sqlite3.connect(database.path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM MealPlans WHERE UserID = ?", (user_id,)).fetchone()[0]
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(db, primary, replica):
+    assert _descriptions(db.get_diet_plans()) == {"replica"}
+    assert db.get_user_preference(1)["ActiveDietName"] == "ReplicaDiet"
+    assert db.get_random_meal_by_diet("Keto") is not None
+    assert db.get_daily_totals(1) is not None
+
+    before = (_plan_count(primary, 2), _plan_count(replica, 2))
+    assert db.insert_meal_plan(2, 5, date.today().isoformat())
+    assert (_plan_count(primary, 2), _plan_count(replica, 2)) == (before[0] + 1, before[1])
+
+    stats = db.replication_stats()
+    assert stats["replicas"][0]["reads"] == 4
+    assert stats["fallbacks"] == 0
+
+
+def test_user_reads_stick_to_the_primary_after_a_write(db):
+    assert db.update_user_preferences(3, "Keto", 2100, "")
+    db.preference_cache.invalidate(3)
+    assert db.get_user_preference(3)["ActiveDietName"] == "Keto"
+    # Other users still read from the replica
+    assert db.get_user_preference(4)["ActiveDietName"] == "ReplicaDiet"
+
+    stats = db.replication_stats()
+    assert stats["sticky_reads"] == 1
+    assert stats["pinned_users"] == 1
+
+
+def test_stickiness_expires_after_the_window(db):
+    assert db.update_user_preferences(3, "Keto", 2100, "")
+    time.sleep(config.DB_READ_YOUR_WRITES_WINDOW + 0.05)
+    db.preference_cache.invalidate(3)
+    assert db.get_user_preference(3)["ActiveDietName"] == "ReplicaDiet"
+    assert db.replication_stats()["pinned_users"] == 0
+
+
+def test_meal_plan_write_pins_daily_totals_to_the_primary(db, primary):
+    today = date.today().isoformat()
+    replica_totals = db.get_daily_totals(2, today)
+    assert db.insert_meal_plan(2, 7, today)
+    db.totals_store.invalidate(2)
+    primary_totals = db.get_daily_totals(2, today)
+    assert primary_totals["MealCount"] == replica_totals["MealCount"] + 1
+
+
+def test_reads_fall_back_to_the_primary_when_no_replica_is_healthy(db):
+    def unreachable(conn_str, timeout=None, **kwargs):
+        raise ConnectionError("replica unreachable")
+
+    db.use_replica_connectors([unreachable])
+    for _ in range(3):
+        assert _descriptions(db.get_diet_plans()) != {"replica"}
+
+    stats = db.replication_stats()
+    assert stats["fallbacks"] == 3
+    assert stats["replicas"][0]["breaker"]["state"] == "open"
+    # Once open, the replica is skipped without another connect attempt
+    assert stats["replicas"][0]["breaker"]["rejected"] == 1
+
+
+def test_healthy_replica_serves_when_another_is_down(db, replica):
+    def unreachable(conn_str, timeout=None, **kwargs):
+        raise ConnectionError("replica unreachable")
+
+    db.use_replica_connectors([unreachable, replica.connect])
+    for _ in range(4):
+        assert _descriptions(db.get_diet_plans()) == {"replica"}
+    assert db.replication_stats()["fallbacks"] == 0
+
+
+def test_dropped_replica_connection_is_retried_on_the_primary(db, replica):
+    dropped = pyodbc.OperationalError("08S01", "[08S01] Communication link failure")
+    db.use_replica_connectors([_failing_connector(replica, "usp_GetDietPlans", dropped)])
+
+    plans = db.get_diet_plans()
+    assert plans and _descriptions(plans) != {"replica"}
+    assert db.replication_stats()["retries"] == 1
+
+
+def test_replica_schema_error_is_not_retried_on_the_primary(db, replica):
+    with sqlite3.connect(replica.path) as conn:
+        conn.execute("DROP TABLE DietPlans")
+
+    # The stand-in reports a missing table as a ProgrammingError, like SQL Server
+    assert db.get_diet_plans() == []
+    stats = db.replication_stats()
+    assert stats["retries"] == 0
+    assert stats["replicas"][0]["reads"] == 1
+
+
+def test_missing_procedure_on_a_replica_uses_the_fallback_there(db, replica):
+    missing = pyodbc.ProgrammingError(
+        "42000", "[42000] Could not find stored procedure 'dbo.usp_GetUserDailyTotals'. (2812)"
+    )
+    db.use_replica_connectors([_failing_connector(replica, "usp_GetUserDailyTotals", missing)])
+    db.procedures.refresh()
+
+    assert db.get_daily_totals(1) is not None
+    assert db.procedures.stats()["procedures"]["dbo.usp_GetUserDailyTotals"] is False
+    stats = db.replication_stats()
+    assert stats["retries"] == 0
+    assert stats["replicas"][0]["reads"] == 1
+
+
+def test_replicas_do_not_wait_on_a_down_primary(monkeypatch, tmp_path):
+    # Driver discovery probes the primary; replica reads must not trigger it
+    monkeypatch.setattr(config, "DB_READ_REPLICAS", "replica-a, replica-b/AmbleRead")
+    monkeypatch.setattr(config, "DB_DRIVER", "")
+    monkeypatch.setattr(config, "DB_DRIVER_CACHE_PATH", str(tmp_path / "drivers.json"))
+    manager = DatabaseManager()
+
+    def no_probe():
+        raise AssertionError("primary driver probe while building replicas")
+
+    monkeypatch.setattr(manager, "_resolve_driver", no_probe)
+    replicas = manager._ensure_replicas()
+
+    assert [r.name for r in replicas] == [f"replica-a/{config.DB_DATABASE}", "replica-b/AmbleRead"]
+    conn_str = replicas[1].pool.conn_str
+    assert "SERVER=replica-b;" in conn_str and "DATABASE=AmbleRead;" in conn_str
+    assert "ApplicationIntent=ReadOnly;" in conn_str
+    assert "DRIVER={" in conn_str
+    assert manager.pool is None
@@ -0,0 +1,173 @@
+"""
+File: tests/test_task_queue.py
+Version: 1.0.0
+
+Description:
+- TaskWriteBehind: updates to one task_id coalesce, close() flushes what
+  is still queued, a task the database keeps rejecting is retried alone
+  and dead-lettered without holding back the rest of its batch, and an
+  unreachable database re-queues without using up attempts
+"""
+import threading
+import time
+
+from database_manager import DatabaseManager
+from task_queue import TaskWriteBehind
+from tests.fake_pyodbc import FakeDatabase
+
+
+def _task(task_id, description="d"):
+    return {"task_id": task_id, "file_path": f"src/{task_id}.py", "file_name": f"{task_id}.py",
+            "description": description, "status": "Pending"}
+
+
+class Store:
+    """flush_fn stand-in: rejects any batch holding a task in `poison`."""
+
+    def __init__(self, poison=()):
+        self.poison = set(poison)
+        self.down = False
+        self.rows = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, tasks):
+        with self.lock:
+            self.calls.append([t["task_id"] for t in tasks])
+            if self.down:
+                return None
+            if any(t["task_id"] in self.poison for t in tasks):
+                return False
+            for t in tasks:
+                self.rows[t["task_id"]] = t
+            return True
+
+
+def make_queue(store, **overrides):
+    options = dict(flush_window=60.0, max_pending=100, batch_size=50, retry_delay=0.01, max_attempts=3)
+    options.update(overrides)
+    return TaskWriteBehind(store, **options)
+
+
+def test_updates_to_one_task_coalesce():
+    store = Store()
+    queue = make_queue(store)
+    assert queue.submit(_task("a", "v1")) == "queued"
+    assert queue.submit(_task("b")) == "queued"
+    assert queue.submit(_task("a", "v2")) == "coalesced"
+
+    assert queue.flush()
+    assert store.calls == [["a", "b"]]
+    assert store.rows["a"]["description"] == "v2"
+    stats = queue.stats()
+    assert (stats["submitted"], stats["coalesced"], stats["flushed_tasks"]) == (3, 1, 2)
+
+
+def test_full_queue_rejects_new_task_ids():
+    queue = make_queue(Store(), max_pending=2)
+    assert queue.submit(_task("a")) and queue.submit(_task("b"))
+    assert queue.submit(_task("c")) is None
+    assert queue.submit(_task("a", "v2")) == "coalesced"
+    assert queue.stats()["rejected"] == 1
+
+
+def test_close_flushes_the_remainder():
+    store = Store()
+    queue = make_queue(store).start()
+    for i in range(5):
+        queue.submit(_task(f"t{i}"))
+    # The flush window is far off, so only close() writes these
+    assert queue.close()
+    assert sorted(store.rows) == [f"t{i}" for i in range(5)]
+    assert queue.stats()["pending"] == 0
+
+
+def test_worker_flushes_after_the_window():
+    store = Store()
+    queue = make_queue(store, flush_window=0.05).start()
+    try:
+        queue.submit(_task("a"))
+        deadline = time.monotonic() + 2.0
+        while "a" not in store.rows and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "a" in store.rows
+    finally:
+        queue.close()
+
+
+def test_poison_task_is_retried_alone_and_dead_lettered():
+    store = Store(poison={"bad"})
+    queue = make_queue(store, max_attempts=3)
+    for task_id in ("a", "bad", "c"):
+        queue.submit(_task(task_id))
+
+    assert queue.flush()
+    # The good tasks are written on the first round; "bad" alone after that
+    assert sorted(store.rows) == ["a", "c"]
+    assert store.calls == [["a", "bad", "c"], ["a"], ["bad"], ["c"], ["bad"], ["bad"]]
+
+    stats = queue.stats()
+    assert (stats["pending"], stats["dead_lettered"], stats["retried_alone"]) == (0, 1, 1)
+    [dead] = queue.dead_letters()
+    assert dead["task"]["task_id"] == "bad" and dead["attempts"] == 3
+
+
+def test_poison_task_does_not_block_the_worker():
+    store = Store(poison={"bad"})
+    queue = make_queue(store, flush_window=0.01, retry_delay=0.01, max_attempts=2).start()
+    try:
+        queue.submit(_task("bad"))
+        for i in range(20):
+            queue.submit(_task(f"t{i}"))
+        deadline = time.monotonic() + 3.0
+        while queue.stats()["dead_lettered"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(store.rows) == 20
+        assert queue.stats()["dead_lettered"] == 1
+    finally:
+        queue.close()
+
+
+def test_newer_update_resets_the_attempts():
+    store = Store(poison={"bad"})
+    queue = make_queue(store, max_attempts=2)
+    queue.submit(_task("bad", "v1"))
+    assert queue.flush()
+    assert queue.stats()["dead_lettered"] == 1
+
+    queue.submit(_task("bad", "v2"))
+    store.poison.clear()
+    assert queue.flush()
+    assert store.rows["bad"]["description"] == "v2"
+
+
+def test_unreachable_database_keeps_tasks_queued():
+    store = Store()
+    store.down = True
+    queue = make_queue(store, max_attempts=2)
+    for task_id in ("a", "b"):
+        queue.submit(_task(task_id))
+
+    for _ in range(5):
+        assert not queue.flush()
+    stats = queue.stats()
+    assert (stats["pending"], stats["dead_lettered"]) == (2, 0)
+
+    store.down = False
+    assert queue.flush()
+    assert sorted(store.rows) == ["a", "b"]
+
+
+def test_upsert_tasks_tells_an_outage_from_a_rejected_batch():
+    database = FakeDatabase()
+    database.results["sys.procedures"] = [("dbo", "sp_UpsertTask")]
+    manager = DatabaseManager()
+    manager.use_connector(database.connect)
+    assert manager.upsert_tasks([_task("a")]) is True
+
+    database.connections[0].broken = True     # 08S01 mid-batch
+    assert manager.upsert_tasks([_task("a")]) is None
+
+    manager.pool.close_all()
+    database.down = True
+    assert manager.upsert_tasks([_task("a")]) is None
@@ -1,6 +1,10 @@
 /**
  * File: App.js
- * Version: 1.3.0
+ * Version: 1.4.0
+ * 
+ * CHANGES FROM 1.3.0:
+ * - Startup data (diet list, preference, today's totals) loaded from one
+ *   /api/bootstrap/2 call; falls back to the individual endpoints if it fails
  * 
  * CHANGES FROM 1.2.0:
  * - REMOVED: Logo from top-right header (moved to GroceryList component)
@@ -47,19 +51,46 @@ function App() {
   useEffect(() => {
     const timer = setInterval(() => setTime(new Date()), 1000);
     
+    const applyDietPlans = (diets) => {
+      // Ensure we handle both array of strings and array of objects
+      const formattedDiets = Array.isArray(diets) 
+        ? diets.map(d => typeof d === 'string' ? d : d.DietName)
+        : [];
+      setDietList(formattedDiets);
+    };
+
+    // One round trip: the backend reads all three sections concurrently.
+    // Returns false when the endpoint is unavailable so the caller can fall back.
+    const loadBootstrap = async () => {
+      const res = await fetch('http://localhost:5000/api/bootstrap/2');
+      if (!res.ok) return false;
+      const data = await res.json();
+      if (data.Errors && Object.keys(data.Errors).length > 0) {
+        console.warn('[App.js] Bootstrap partial results:', data.Errors);
+      }
+
+      if (data.DietPlans) applyDietPlans(data.DietPlans);
+      if (data.Preference && data.Preference.ActiveDietName) {
+        setDietMode(data.Preference.ActiveDietName);
+      }
+      if (data.DailyTotals) {
+        setDailyStats(prev => ({
+          ...prev,
+          calories: data.DailyTotals.TotalCalories || 0,
+          protein: data.DailyTotals.TotalProtein || 0
+        }));
+      }
+      return true;
+    };
+
     const initializeAppData = async () => {
       setIsLoading(true);
       try {
+        if (await loadBootstrap().catch(() => false)) return;
+
         // Fetch All Diet Plans from Local SQL Server
         const dietRes = await fetch('http://localhost:5000/api/diet-plans');
-        const diets = await dietRes.json();
-        
-        // Ensure we handle both array of strings and array of objects
-        const formattedDiets = Array.isArray(diets) 
-          ? diets.map(d => typeof d === 'string' ? d : d.DietName)
-          : [];
-          
-        setDietList(formattedDiets);
+        applyDietPlans(await dietRes.json());
 
         // DATA_01: Target UserID 2 (Dwayne) instead of 1
         const prefRes = await fetch('http://localhost:5000/api/user/preference/2');